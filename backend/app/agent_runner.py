@@ -6,34 +6,51 @@ Fixes:
 - Commands supported:
   add <title>
   list [all|pending|completed]
-  complete <id|title>
-  delete <id|title>
+  complete <id|title>   (also: complete 1,2,5 / complete all)
+  delete <id|title>     (also: delete 1,2,5)
+  clear completed
+  search <text>         (ranked, title + description)
+  update <id> <title>
+  due <id> <date>
   stats
   help
-- Per-user history (in-memory)
+- Table-driven dispatch: one keyword lookup per message (see register_command)
+- stream_user_chat(): SSE variant; commands arrive as one chunk, free text is
+  streamed from TodoAgent when OPENAI_API_KEY is set; an OpenAI failure
+  mid-stream propagates (StreamInterrupted) and is recorded as a failure
+- Per-user history (bounded near-cache, optionally shared across replicas
+  through a state store: see app/state.SharedHistory)
+- tasks go through the task repository (app/repository.py), so chat, REST
+  and the MCP tools share one store; handlers are coroutines
+- list / stats / search replies are cached per user and task version
+  (see app/reply_cache.py)
 - ASCII-safe replies
 """
 
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Literal
-import re
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
-from app.tools.tasks import add_task, list_tasks, complete_task, delete_task
+from app.agents.agent import StreamInterrupted, TodoAgent
+from app.reply_cache import ReplyCache
+from app.repository import parse_due_date, tasks_repo
+from app.state import chat_history
 
-# user_id -> chat history (simple in-memory transcript)
-_USER_HISTORY: Dict[str, List[dict]] = {}
+# user_id -> chat history (bounded transcript; shared when STATE_BACKEND is set)
+_USER_HISTORY = chat_history
 
 
-def _get_history(user_id: str) -> List[dict]:
-    return _USER_HISTORY.setdefault(user_id, [])
+async def _get_history(user_id: str) -> List[dict]:
+    return await _USER_HISTORY.get(user_id)
 
 
-def _append(history: List[dict], role: str, content: str) -> None:
-    history.append({"role": role, "content": content})
+async def _record_turn(user_id: str, message: str, reply: str) -> None:
+    # one store write per turn: user message + reply together
+    await _USER_HISTORY.extend(user_id, [{"role": "user", "content": message}, {"role": "assistant", "content": reply}])
 
 
-def _format_tasks(tasks: List[dict]) -> str:
+def _format_tasks(tasks: Sequence[dict]) -> str:
     if not tasks:
         return "No tasks."
     lines: List[str] = []
@@ -43,126 +60,321 @@ def _format_tasks(tasks: List[dict]) -> str:
     return "\n".join(lines)
 
 
-def _find_task_id_by_title(user_id: str, title: str) -> Optional[int]:
-    title_norm = title.strip().lower()
-    if not title_norm:
+async def _find_task_id_by_title(user_id: str, title: str) -> Optional[int]:
+    t = await tasks_repo.find_by_title(user_id, title)
+    return int(t["id"]) if t else None
+
+
+def _parse_id_list(raw: str) -> Optional[List[int]]:
+    """ "1,2,5" / "1, 2 5" -> [1, 2, 5]; None unless it is two or more ids."""
+    parts = raw.replace(",", " ").split()
+    if len(parts) < 2 or not all(p.isdigit() for p in parts):
         return None
-    tasks = list_tasks(user_id, "all")  # type: ignore[arg-type]
-    for t in tasks:
-        if str(t.get("title", "")).strip().lower() == title_norm:
-            return int(t.get("id"))
-    return None
+    return [int(p) for p in parts]
+
+
+def _bulk_reply(verb: str, ids: Sequence[int], done: Sequence[dict]) -> str:
+    done_ids = {t["id"] for t in done}
+    reply = f"{verb} {len(done_ids)} task(s)"
+    reply += f": {', '.join(str(i) for i in ids if i in done_ids)}." if done_ids else "."
+    skipped = [str(i) for i in dict.fromkeys(ids) if i not in done_ids]
+    if skipped:
+        reply += f" Skipped (not found or unchanged): {', '.join(skipped)}."
+    return reply
+
+
+async def _not_found_reply(user_id: str, raw: str) -> str:
+    raw = raw.strip()
+    if not raw or raw.isdigit():
+        return "Task not found."
+    matches = await tasks_repo.suggest(user_id, raw)
+    if not matches:
+        return "Task not found."
+    names = ", ".join(f"({t['id']}) {t['title']}" for t in matches)
+    return f"Task not found. Did you mean: {names}?"
 
 
-def _parse_id_or_title(user_id: str, raw: str) -> Optional[int]:
+async def _parse_id_or_title(user_id: str, raw: str) -> Optional[int]:
     raw = raw.strip()
     if not raw:
         return None
     if raw.isdigit():
         return int(raw)
-    return _find_task_id_by_title(user_id, raw)
+    return await _find_task_id_by_title(user_id, raw)
+
+
+# -----------------------------
+# Command registry
+# -----------------------------
+# A handler is a coroutine: (user_id, arg) -> the reply, or None when the
+# argument does not fit the command (the message then falls through to the
+# help fallback, exactly like a non-matching regex used to).
+
+Handler = Callable[[str, str], Awaitable[Optional[str]]]
+
+ARG_NONE = "none"
+ARG_OPTIONAL = "optional"
+ARG_REQUIRED = "required"
+
+
+class Command(NamedTuple):
+    name: str
+    handler: Handler
+    arg: str
+    usage: str
+    examples: Tuple[str, ...]
+
+
+_COMMANDS: Dict[str, Command] = {}  # keyword (name or alias, lowercase) -> command
+_ORDER: List[Command] = []  # registration order, for help text
+_HELP_CACHE: Optional[str] = None
+
+
+def register_command(
+    name: str,
+    *aliases: str,
+    usage: str = "",
+    examples: Sequence[str] = (),
+    arg: str = ARG_REQUIRED,
+) -> Callable[[Handler], Handler]:
+    """
+    Register a chat command under its first word.
+
+        @register_command("search", usage="search <text>", examples=["search milk"])
+        async def _search(user_id: str, arg: str) -> Optional[str]:
+            ...
+    """
+
+    def decorator(fn: Handler) -> Handler:
+        global _HELP_CACHE
+        cmd = Command(name, fn, arg, usage or name, tuple(examples))
+        for keyword in (name, *aliases):
+            _COMMANDS[keyword.lower()] = cmd
+        _ORDER.append(cmd)
+        _HELP_CACHE = None
+        return fn
+
+    return decorator
+
+
+# rendered replies of read-only commands, valid while the user's tasks are unchanged
+_REPLY_CACHE = ReplyCache()
+
+
+def cached_reply(fn: Handler) -> Handler:
+    """
+    For read-only commands whose reply depends only on (user's tasks, arg).
+    Apply below @register_command; hits skip the handler entirely.
+    """
+
+    async def wrapper(user_id: str, arg: str) -> Optional[str]:
+        version = await tasks_repo.version(user_id)  # read before rendering (see reply_cache)
+        return await _REPLY_CACHE.get_or_render_async(
+            user_id, (fn.__name__, arg.lower()), version, lambda: fn(user_id, arg)
+        )
+
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+def reply_cache_stats() -> Dict[str, int]:
+    return _REPLY_CACHE.stats()
+
+
+def _classify(text: str) -> Tuple[Optional[Command], str]:
+    """Split off the first word and look it up once; no regex scanning."""
+    parts = text.split(None, 1)
+    if not parts:
+        return None, ""
+    cmd = _COMMANDS.get(parts[0].lower())
+    if cmd is None:
+        return None, ""
+    arg = parts[1].strip() if len(parts) > 1 else ""
+
+    if cmd.arg == ARG_NONE and arg:
+        return None, ""
+    if cmd.arg == ARG_REQUIRED and not arg:
+        return None, ""
+    return cmd, arg
 
 
 def _help_text() -> str:
-    return (
-        "Commands:\n"
-        "  add <title>\n"
-        "  list [all|pending|completed]\n"
-        "  complete <id|title>\n"
-        "  delete <id|title>\n"
-        "  stats\n"
-        "Examples:\n"
-        "  add milk\n"
-        "  list\n"
-        "  complete 1\n"
-        "  complete milk\n"
-        "  delete 1\n"
-    )
+    global _HELP_CACHE
+    if _HELP_CACHE is None:
+        lines = ["Commands:"]
+        lines += [f"  {c.usage}" for c in _ORDER if c.name != "help"]
+        lines.append("Examples:")
+        lines += [f"  {e}" for c in _ORDER for e in c.examples]
+        _HELP_CACHE = "\n".join(lines) + "\n"
+    return _HELP_CACHE
+
+
+def _fallback_text() -> str:
+    return "I can only run todo commands right now.\n\n" + _help_text()
+
+
+# -----------------------------
+# Commands
+# -----------------------------
+
+@register_command("help", "?", arg=ARG_NONE)
+async def _cmd_help(user_id: str, arg: str) -> Optional[str]:
+    return _help_text()
+
+
+@register_command("add", usage="add <title>", examples=["add milk"])
+async def _cmd_add(user_id: str, arg: str) -> Optional[str]:
+    task = await tasks_repo.create(user_id, arg)
+    return f"Added task ({task['id']}): {task['title']}"
+
+
+@register_command("list", usage="list [all|pending|completed]", examples=["list"], arg=ARG_OPTIONAL)
+@cached_reply
+async def _cmd_list(user_id: str, arg: str) -> Optional[str]:
+    status = (arg or "all").lower()
+    if status not in ("all", "pending", "completed"):
+        return None
+    return _format_tasks(await tasks_repo.list(user_id, status))  # type: ignore[arg-type]
+
+
+@register_command(
+    "complete",
+    usage="complete <id|title|id,id,...|all>",
+    examples=["complete 1", "complete milk", "complete 1,2,5", "complete all"],
+)
+async def _cmd_complete(user_id: str, arg: str) -> Optional[str]:
+    if arg.lower() == "all":
+        done = await tasks_repo.set_completed_many(user_id, None, True)
+        return f"Completed {len(done)} pending task(s)."
+    ids = _parse_id_list(arg)
+    if ids is not None:
+        done = await tasks_repo.set_completed_many(user_id, ids, True)
+        return _bulk_reply("Completed", ids, done)
+
+    tid = await _parse_id_or_title(user_id, arg)
+    if tid is None:
+        return await _not_found_reply(user_id, arg)
+    t = await tasks_repo.set_completed(user_id, tid, True)
+    return f"Completed task ({tid})." if t else await _not_found_reply(user_id, arg)
+
+
+@register_command("delete", "remove", usage="delete <id|title|id,id,...>", examples=["delete 1", "delete 3,4"])
+async def _cmd_delete(user_id: str, arg: str) -> Optional[str]:
+    ids = _parse_id_list(arg)
+    if ids is not None:
+        removed = await tasks_repo.delete_many(user_id, ids)
+        return _bulk_reply("Deleted", ids, removed)
+
+    tid = await _parse_id_or_title(user_id, arg)
+    if tid is None:
+        return await _not_found_reply(user_id, arg)
+    ok = await tasks_repo.delete(user_id, tid)
+    return "Task deleted." if ok else await _not_found_reply(user_id, arg)
+
+
+@register_command("clear", usage="clear completed", examples=["clear completed"])
+async def _cmd_clear(user_id: str, arg: str) -> Optional[str]:
+    if arg.lower() not in ("completed", "done"):
+        return "Usage: clear completed"
+    removed = await tasks_repo.clear_completed(user_id)
+    return f"Cleared {len(removed)} completed task(s)."
+
+
+SEARCH_REPLY_LIMIT = 20
+
+
+@register_command("search", "find", usage="search <text>", examples=["search milk"])
+@cached_reply
+async def _cmd_search(user_id: str, arg: str) -> Optional[str]:
+    found, total = await tasks_repo.search(user_id, arg, SEARCH_REPLY_LIMIT)
+    if not found:
+        return f"No tasks match '{arg}'."
+    reply = _format_tasks(found)
+    if total > len(found):
+        reply += f"\n(showing {len(found)} of {total} matches)"
+    return reply
+
+
+@register_command("update", "rename", usage="update <id> <title>", examples=["update 1 oat milk"])
+async def _cmd_update(user_id: str, arg: str) -> Optional[str]:
+    parts = arg.split(None, 1)
+    if len(parts) < 2 or not parts[0].isdigit():
+        return "Usage: update <id> <title>"
+    t = await tasks_repo.update(user_id, int(parts[0]), title=parts[1])
+    return f"Updated task ({t['id']}): {t['title']}" if t else "Task not found."
+
+
+@register_command("due", usage="due <id> <date>", examples=["due 1 2025-01-31"])
+async def _cmd_due(user_id: str, arg: str) -> Optional[str]:
+    parts = arg.split(None, 1)
+    if len(parts) < 2 or not parts[0].isdigit():
+        return "Usage: due <id> <date>"
+    try:
+        # parsed here, so the memory and SQL stores accept exactly the same dates
+        due = parse_due_date(parts[1])
+    except ValueError:
+        return "Usage: due <id> <date>  (date as YYYY-MM-DD)"
+    t = await tasks_repo.update(user_id, int(parts[0]), due_date=due)
+    return f"Task ({t['id']}) due {t['due_date']}." if t else "Task not found."
+
+
+@register_command("stats", usage="stats", arg=ARG_NONE)
+@cached_reply
+async def _cmd_stats(user_id: str, arg: str) -> Optional[str]:
+    total = len(await tasks_repo.list(user_id, "all"))
+    done = len(await tasks_repo.list(user_id, "completed"))
+    pending = total - done
+    return f"Total: {total}\nPending: {pending}\nCompleted: {done}"
 
 
 async def run_user_chat(user_id: str, message: str) -> str:
-    history = _get_history(user_id)
-    _append(history, "user", message)
-
-    text = (message or "").strip()
-
-    # ---- HELP ----
-    if re.match(r"^(help|\?)$", text, re.I):
-        reply = _help_text()
-        _append(history, "assistant", reply)
-        return reply
-
-    # ---- ADD TASK ----
-    m = re.match(r"^add\s+(.+)$", text, re.I)
-    if m:
-        title = m.group(1).strip()
-        if not title:
-            reply = "Please provide a title. Example: add milk"
-            _append(history, "assistant", reply)
-            return reply
-
-        task = add_task(user_id, title)
-        reply = f"Added task ({task['id']}): {task['title']}"
-        _append(history, "assistant", reply)
-        return reply
-
-    # ---- LIST TASKS ----
-    m = re.match(r"^list(?:\s+(all|pending|completed))?$", text, re.I)
-    if m:
-        status = (m.group(1) or "all").lower()
-        if status not in ("all", "pending", "completed"):
-            status = "all"
-        tasks = list_tasks(user_id, status)  # type: ignore[arg-type]
-        reply = _format_tasks(tasks)
-        _append(history, "assistant", reply)
-        return reply
-
-    # ---- STATS ----
-    if re.match(r"^stats$", text, re.I):
-        tasks = list_tasks(user_id, "all")  # type: ignore[arg-type]
-        total = len(tasks)
-        done = len([t for t in tasks if bool(t.get("completed"))])
-        pending = total - done
-        reply = f"Total: {total}\nPending: {pending}\nCompleted: {done}"
-        _append(history, "assistant", reply)
-        return reply
-
-    # ---- COMPLETE TASK (id OR title) ----
-    m = re.match(r"^complete\s+(.+)$", text, re.I)
-    if m:
-        raw = m.group(1).strip()
-        tid = _parse_id_or_title(user_id, raw)
-        if tid is None:
-            reply = "Task not found."
-            _append(history, "assistant", reply)
-            return reply
-
-        t = complete_task(user_id, tid, True)
-        reply = f"Completed task ({tid})." if t else "Task not found."
-        _append(history, "assistant", reply)
-        return reply
-
-    # ---- DELETE TASK (id OR title) ----
-    m = re.match(r"^(delete|remove)\s+(.+)$", text, re.I)
-    if m:
-        raw = m.group(2).strip()
-        tid = _parse_id_or_title(user_id, raw)
-        if tid is None:
-            reply = "Task not found."
-            _append(history, "assistant", reply)
-            return reply
-
-        ok = delete_task(user_id, tid)
-        reply = "Task deleted." if ok else "Task not found."
-        _append(history, "assistant", reply)
-        return reply
+    cmd, arg = _classify((message or "").strip())
+    reply = await cmd.handler(user_id, arg) if cmd is not None else None
 
     # ---- FALLBACK (NO AI) ----
-    reply = "I can only run todo commands right now.\n\n" + _help_text()
-    _append(history, "assistant", reply)
+    if reply is None:
+        reply = _fallback_text()
+
+    await _record_turn(user_id, message, reply)
     return reply
 
 
+_agent = TodoAgent()
+
+
+async def stream_user_chat(user_id: str, message: str) -> AsyncIterator[str]:
+    """
+    Streaming run_user_chat. The user message and the final reply are
+    appended to history exactly once, together, even if the client
+    disconnects early.
+    """
+    history = await _get_history(user_id)  # copy, before this turn
+
+    cmd, arg = _classify((message or "").strip())
+    reply = await cmd.handler(user_id, arg) if cmd is not None else None
+
+    if reply is not None or not os.getenv("OPENAI_API_KEY"):
+        reply = reply if reply is not None else _fallback_text()
+        try:
+            yield reply
+        finally:
+            await _record_turn(user_id, message, reply)
+        return
+
+    parts: List[str] = []
+    failed: Optional[str] = None
+    try:
+        async for delta in _agent.run_stream(message, history=history):
+            parts.append(delta)
+            yield delta
+    except StreamInterrupted as exc:
+        failed = exc.reply  # the client has a partial reply; history gets the failure, not the fragment
+        raise
+    finally:
+        await _record_turn(user_id, message, failed or "".join(parts).strip() or "OK.")
+
+
 # Backwards-compat alias for routers/chat.py import
 async def run_todo_agent(user_id: str, message: str) -> str:
     return await run_user_chat(user_id=user_id, message=message)
@@ -1,26 +1,54 @@
 """
 Phase 5 - TodoAgent (no circular imports)
 
-- Real OpenAI call (Chat Completions via httpx)
+- Real OpenAI call (Chat Completions via the shared pooled client)
+- run_stream(): token-by-token replies for the SSE chat endpoint; a failure
+  after the first token raises StreamInterrupted instead of passing the
+  partial reply off as a finished one
+- context is packed into a token budget (app/agents/context.py)
+- latency, outcome and reported tokens go to /metrics (app/metrics.py)
 - Keeps our history list (passed from runner) intact
 """
 
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 import os
+import time
 
-import httpx
 from dotenv import load_dotenv
 
+from app.agents import openai_client
+from app.agents.context import ContextBuilder, context_builder
 from app.agents.memory import ConversationMemory
+from app.metrics import LLM_FIRST_TOKEN, observe_llm
 
 load_dotenv()
 
 
+class StreamInterrupted(RuntimeError):
+    """OpenAI failed mid-stream; `partial` is the text the caller already received."""
+
+    def __init__(self, partial: str, cause: BaseException):
+        super().__init__(f"stream interrupted: {type(cause).__name__}")
+        self.partial = partial
+        self.cause = cause
+
+    @property
+    def reply(self) -> str:
+        """What goes into history for this turn (the partial text is not a reply)."""
+        return f"OpenAI call failed: {type(self.cause).__name__}"
+
+
 class TodoAgent:
-    def __init__(self):
+    def __init__(self, context: Optional[ContextBuilder] = None):
         self.base_system_prompt = (
             "You are a helpful AI Todo assistant. Keep replies short and clear."
         )
+        # shared builder: its token cache and prompt-token stats are process-wide
+        self.context = context or context_builder
+
+    def _build_messages(self, mem: ConversationMemory) -> List[Dict[str, str]]:
+        messages, _prompt_tokens = self.context.build(self.base_system_prompt, mem.get_history())
+        return messages
 
     async def run(
         self,
@@ -42,34 +70,96 @@ class TodoAgent:
             return reply
 
         model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+        messages = self._build_messages(mem)
 
-        messages = [{"role": "system", "content": self.base_system_prompt}]
-        for m in mem.get_history()[-12:]:
-            role = m.get("role", "user")
-            content = m.get("content", "")
-            if role == "assistant":
-                messages.append({"role": "assistant", "content": content})
-            else:
-                messages.append({"role": "user", "content": content})
-
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={
-                        "model": model,
-                        "messages": messages,
-                        "temperature": 0.3,
-                    },
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                reply = (data["choices"][0]["message"]["content"] or "").strip() or "OK."
+            resp = await openai_client.post_json(
+                "/chat/completions",
+                {
+                    "model": model,
+                    "messages": messages,
+                    "temperature": 0.3,
+                },
+                api_key=api_key,
+            )
+            data = resp.json()
+            self.context.record_usage(data.get("usage"))
+            reply = (data["choices"][0]["message"]["content"] or "").strip() or "OK."
         except Exception as e:
+            observe_llm(model, "blocking", "error", time.perf_counter() - start)
             reply = f"OpenAI call failed: {type(e).__name__}"
             mem.add_assistant_message(reply)
             return reply
+        observe_llm(model, "blocking", "ok", time.perf_counter() - start, data.get("usage"))
 
         mem.add_assistant_message(reply)
         return reply
+
+    async def run_stream(
+        self,
+        message: str,
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Same as run(), but yields reply text as OpenAI streams it (stream=true).
+        The full reply is appended to history once, when the stream ends
+        (or is cut short by the client going away). If OpenAI fails after
+        text was already yielded, raises StreamInterrupted.
+        """
+        mem = ConversationMemory()
+        if history is not None:
+            mem.messages = history
+
+        mem.add_user_message(message)
+
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            reply = "OPENAI_API_KEY missing. Add key to enable real AI."
+            mem.add_assistant_message(reply)
+            yield reply
+            return
+
+        model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+        messages = self._build_messages(mem)
+
+        parts: List[str] = []
+        interrupted: Optional[StreamInterrupted] = None
+        outcome, usage = "cancelled", None  # stays "cancelled" if the client goes away mid-stream
+        start = time.perf_counter()
+        try:
+            async for chunk in openai_client.stream_json(
+                "/chat/completions",
+                {
+                    "model": model,
+                    "messages": messages,
+                    "temperature": 0.3,
+                    "stream": True,
+                },
+                api_key=api_key,
+            ):
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    if not parts:
+                        LLM_FIRST_TOKEN.labels(model).observe(time.perf_counter() - start)
+                    parts.append(delta)
+                    yield delta
+            outcome = "ok"
+        except Exception as e:
+            outcome = "error"
+            if parts:
+                interrupted = StreamInterrupted("".join(parts), e)
+            else:
+                failed = f"OpenAI call failed: {type(e).__name__}"
+                parts.append(failed)
+                yield failed
+        finally:
+            observe_llm(model, "stream", outcome, time.perf_counter() - start, usage)
+            if interrupted is not None:
+                mem.add_assistant_message(interrupted.reply)
+            else:
+                mem.add_assistant_message("".join(parts).strip() or "OK.")
+        if interrupted is not None:
+            raise interrupted
@@ -0,0 +1,261 @@
+"""
+Phase 5 - Token-budgeted context window for TodoAgent
+
+- counts tokens locally with tiktoken (CHAT_TOKENIZER, default o200k_base);
+  the encoding is loaded once at startup (warm(), from the app lifespan)
+  from TIKTOKEN_CACHE_DIR, which the Docker image fills at build time, so no
+  chat turn ever downloads or reads BPE files. If it cannot be loaded, a
+  fast offline estimate is used (logged once)
+- packs the NEWEST messages into CHAT_CONTEXT_TOKENS (system prompt and the
+  current user message always go in)
+- an older huge message (pasted list) is cut to CHAT_CONTEXT_MAX_MESSAGE_TOKENS;
+  the current one only to what the budget leaves
+- turns that no longer fit are folded into one short summary line per turn,
+  capped at CHAT_CONTEXT_SUMMARY_TOKENS (no extra model call)
+- per-message token counts are cached (LRU keyed by content), so each turn
+  only tokenizes the new messages
+- stats(): prompt tokens per turn (last / avg / max, and OpenAI's own
+  usage.prompt_tokens when the response reports it)
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# chat format overhead per message (role + separators) and per reply priming
+_MSG_OVERHEAD = 4
+_REPLY_PRIMING = 3
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+# -----------------------------
+# Tokenizer
+# -----------------------------
+class Tokenizer:
+    """tiktoken if it can load its encoding (it may need a download), else an estimate."""
+
+    def __init__(self, encoding: Optional[str] = None) -> None:
+        self.encoding_name = encoding or os.getenv("CHAT_TOKENIZER", "o200k_base")
+        self._enc = None
+        self._tried = False
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _encoding(self):
+        if not self._tried:
+            with self._lock:
+                if not self._tried:
+                    try:
+                        import tiktoken
+
+                        self._enc = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as exc:
+                        self._enc = None  # not installed / offline: estimate instead
+                        self._error = f"{type(exc).__name__}: {str(exc)[:200]}"
+                    self._tried = True
+        return self._enc
+
+    def warm(self) -> bool:
+        """Load the encoding now (blocking: call it off the event loop); True if counts are exact."""
+        if self._encoding() is None:
+            logger.warning(
+                "tokenizer %s unavailable (%s); using the token estimate", self.encoding_name, self._error
+            )
+            return False
+        return True
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding() is not None
+
+    def count(self, text: str) -> int:
+        enc = self._encoding()
+        if enc is not None:
+            return len(enc.encode(text, disallowed_special=()))
+        # BPE lands between "one per word/punct" and "one per 4 chars"
+        return max(len(_WORDS.findall(text)), (len(text) + 3) // 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        enc = self._encoding()
+        if enc is not None:
+            ids = enc.encode(text, disallowed_special=())
+            return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+        if self.count(text) <= max_tokens:
+            return text
+        # estimate: shrink by characters until it fits
+        cut = max_tokens * 4
+        while cut > 0 and self.count(text[:cut]) > max_tokens:
+            cut = int(cut * 0.85)
+        return text[:cut]
+
+
+# -----------------------------
+# Builder
+# -----------------------------
+class ContextBuilder:
+    def __init__(
+        self,
+        budget_tokens: Optional[int] = None,
+        max_message_tokens: Optional[int] = None,
+        summary_tokens: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        tokenizer: Optional[Tokenizer] = None,
+    ) -> None:
+        self.budget = budget_tokens or _env_int("CHAT_CONTEXT_TOKENS", 3000)
+        self.max_message_tokens = max_message_tokens or _env_int("CHAT_CONTEXT_MAX_MESSAGE_TOKENS", 800)
+        self.summary_tokens = summary_tokens if summary_tokens is not None else _env_int("CHAT_CONTEXT_SUMMARY_TOKENS", 200)
+        self.cache_size = cache_size or _env_int("CHAT_CONTEXT_TOKEN_CACHE", 20000)
+        self.tokenizer = tokenizer or Tokenizer()
+
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.turns = 0
+        self.prompt_tokens_last = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+        self.reported_tokens_last = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.truncated = 0
+        self.summarized = 0
+
+    # ---- token counts (cached per message content) ----
+
+    def tokens(self, text: str) -> int:
+        with self._lock:
+            n = self._counts.get(text)
+            if n is not None:
+                self._counts.move_to_end(text)
+                self.cache_hits += 1
+                return n
+        n = self.tokenizer.count(text)
+        with self._lock:
+            self.cache_misses += 1
+            self._counts[text] = n
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return n
+
+    def _fit(self, content: str, limit: int) -> Tuple[str, int]:
+        n = self.tokens(content)
+        if n <= limit:
+            return content, n
+        self.truncated += 1
+        cut = self.tokenizer.truncate(content, max(1, limit - 6)) + " …[truncated]"
+        return cut, self.tokens(cut)
+
+    # ---- summary of turns that did not fit ----
+
+    def _summarize(self, dropped: Sequence[Dict[str, str]], limit: int) -> Optional[Tuple[str, int]]:
+        if not dropped or limit <= _MSG_OVERHEAD + 8:
+            return None
+        lines: List[str] = []
+        for m in dropped:
+            who = "Assistant" if m.get("role") == "assistant" else "User"
+            words = (m.get("content") or "").split()
+            lines.append(f"- {who}: {' '.join(words[:16])}{' …' if len(words) > 16 else ''}")
+        head = f"Earlier in this chat ({len(dropped)} older messages, condensed):"
+        # keep the most recent of the dropped lines that fit the summary budget
+        kept: List[str] = []
+        used = self.tokens(head) + _MSG_OVERHEAD
+        for line in reversed(lines):
+            n = self.tokens(line) + 1
+            if used + n > limit:
+                break
+            kept.append(line)
+            used += n
+        if not kept:
+            return None
+        self.summarized += 1
+        return head + "\n" + "\n".join(reversed(kept)), used
+
+    # ---- packing ----
+
+    def build(self, system_prompt: str, history: Sequence[Dict[str, str]]) -> Tuple[List[Dict[str, str]], int]:
+        """
+        OpenAI chat messages for `history` (oldest first, current user message
+        last) within the token budget; returns (messages, prompt_tokens).
+        """
+        system_tokens = self.tokens(system_prompt) + _MSG_OVERHEAD
+        remaining = self.budget - system_tokens - _REPLY_PRIMING
+        reserve = self.summary_tokens if len(history) > 1 else 0
+
+        packed: List[Dict[str, str]] = []
+        cut_at = 0  # history[:cut_at] did not fit
+        for i in range(len(history) - 1, -1, -1):
+            m = history[i]
+            role = "assistant" if m.get("role") == "assistant" else "user"
+            newest = i == len(history) - 1
+            room = remaining - reserve - _MSG_OVERHEAD
+            raw = m.get("content") or ""
+            if room <= 0 or (not newest and min(self.tokens(raw), self.max_message_tokens) > room):
+                # this and everything older goes into the summary
+                cut_at = i + 1
+                break
+            # the current message may use the whole room; older ones are capped per message
+            content, n = self._fit(raw, room if newest else min(self.max_message_tokens, room))
+            packed.append({"role": role, "content": content})
+            remaining -= n + _MSG_OVERHEAD
+
+        messages = [{"role": "system", "content": system_prompt}]
+        used = system_tokens + _REPLY_PRIMING
+        summary = self._summarize(history[:cut_at], min(self.summary_tokens, remaining + reserve))
+        if summary is not None:
+            messages.append({"role": "system", "content": summary[0]})
+            used += summary[1]
+        packed.reverse()
+        messages.extend(packed)
+        used += sum(self.tokens(m["content"]) + _MSG_OVERHEAD for m in packed)
+
+        self._record(used)
+        return messages, used
+
+    # ---- metrics ----
+
+    def _record(self, prompt_tokens: int) -> None:
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens_last = prompt_tokens
+            self.prompt_tokens_total += prompt_tokens
+            self.prompt_tokens_max = max(self.prompt_tokens_max, prompt_tokens)
+        logger.debug("chat prompt tokens=%d budget=%d", prompt_tokens, self.budget)
+
+    def record_usage(self, usage: Optional[Dict[str, int]]) -> None:
+        """OpenAI's own count for the turn (response "usage"), when it is reported."""
+        if usage and usage.get("prompt_tokens") is not None:
+            self.reported_tokens_last = int(usage["prompt_tokens"])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "prompt_tokens_last": self.prompt_tokens_last,
+                "prompt_tokens_avg": self.prompt_tokens_total // self.turns if self.turns else 0,
+                "prompt_tokens_max": self.prompt_tokens_max,
+                "prompt_tokens_reported_last": self.reported_tokens_last,
+                "budget": self.budget,
+                "token_cache_size": len(self._counts),
+                "token_cache_hits": self.cache_hits,
+                "token_cache_misses": self.cache_misses,
+                "truncated_messages": self.truncated,
+                "summaries": self.summarized,
+                "exact_tokenizer": int(self.tokenizer.exact),
+            }
+
+
+context_builder = ContextBuilder()
@@ -30,3 +30,8 @@ class ConversationMemory:
 
     def get(self) -> List[Dict]:
         return self.messages
+
+    # Names used by TodoAgent
+    add_user_message = add_user
+    add_assistant_message = add_assistant
+    get_history = get
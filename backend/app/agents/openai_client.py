@@ -0,0 +1,175 @@
+"""
+Phase 5 - Shared OpenAI HTTP client
+
+- One pooled httpx.AsyncClient per process (keep-alive, HTTP/2 when h2 is installed)
+- Created and closed in the app lifespan (app/main.py); created lazily otherwise
+- Retries 429/5xx with jittered exponential backoff, honouring Retry-After
+- stream_json(): Server-Sent Events chunks for stream=true requests
+- Everything is tunable from env (OPENAI_BASE_URL points it at a fake server)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("OPENAI_HTTP2", "1").strip().lower() in ("0", "false", "no"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_client() -> httpx.AsyncClient:
+    timeout = httpx.Timeout(
+        _env_float("OPENAI_TIMEOUT", 30.0),
+        connect=_env_float("OPENAI_CONNECT_TIMEOUT", 5.0),
+    )
+    limits = httpx.Limits(
+        max_connections=_env_int("OPENAI_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE", 10),
+        keepalive_expiry=_env_float("OPENAI_KEEPALIVE_EXPIRY", 60.0),
+    )
+    return httpx.AsyncClient(
+        base_url=OPENAI_BASE_URL,
+        timeout=timeout,
+        limits=limits,
+        http2=_http2_enabled(),
+    )
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+async def startup() -> None:
+    global _client
+    if _client is None:
+        _client = build_client()
+
+
+async def shutdown() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    """The shared client; created on first use when no lifespan ran (scripts, tests)."""
+    global _client
+    if _client is None:
+        _client = build_client()
+    return _client
+
+
+def _backoff_delay(attempt: int, resp: Optional[httpx.Response]) -> float:
+    if resp is not None:
+        retry_after = resp.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+    base = _env_float("OPENAI_BACKOFF_BASE", 0.5)
+    cap = _env_float("OPENAI_BACKOFF_MAX", 8.0)
+    # "full jitter": uniform in [0, base * 2^attempt], capped
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def post_json(
+    path: str,
+    payload: Dict[str, Any],
+    api_key: str,
+    client: Optional[httpx.AsyncClient] = None,
+) -> httpx.Response:
+    """
+    POST to the OpenAI API with retries on 429/5xx and transport errors.
+    Returns the final response; raises httpx.HTTPStatusError if it is not 2xx.
+    """
+    client = client or get_client()
+    retries = _env_int("OPENAI_MAX_RETRIES", 3)
+    headers = {"Authorization": f"Bearer {api_key}"}
+
+    attempt = 0
+    while True:
+        resp: Optional[httpx.Response] = None
+        try:
+            resp = await client.post(path, headers=headers, json=payload)
+            if resp.status_code not in RETRY_STATUS or attempt >= retries:
+                resp.raise_for_status()
+                return resp
+        except httpx.TransportError:
+            if attempt >= retries:
+                raise
+        await asyncio.sleep(_backoff_delay(attempt, resp))
+        attempt += 1
+
+
+async def stream_json(
+    path: str,
+    payload: Dict[str, Any],
+    api_key: str,
+    client: Optional[httpx.AsyncClient] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    POST a stream=true request and yield each SSE `data:` chunk as a dict.
+    Retries like post_json(), but only until the first chunk arrives -
+    after that a failure is raised so the caller never sees text twice.
+    """
+    client = client or get_client()
+    retries = _env_int("OPENAI_MAX_RETRIES", 3)
+    headers = {"Authorization": f"Bearer {api_key}", "Accept": "text/event-stream"}
+
+    attempt = 0
+    started = False
+    while True:
+        retry_resp: Optional[httpx.Response] = None
+        try:
+            async with client.stream("POST", path, headers=headers, json=payload) as resp:
+                if resp.status_code in RETRY_STATUS and attempt < retries:
+                    retry_resp = resp
+                else:
+                    if resp.is_error:
+                        await resp.aread()
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        started = True
+                        yield json.loads(data)
+                    return
+        except httpx.TransportError:
+            if started or attempt >= retries:
+                raise
+        await asyncio.sleep(_backoff_delay(attempt, retry_resp))
+        attempt += 1
@@ -9,19 +9,18 @@ No DB yet, no tools yet.
 """
 
 from app.agents.agent import TodoAgent
-from app.agents.store import get_history, set_history
+from app.state import chat_history
 
 agent = TodoAgent()
 
 
 async def run_user_chat(user_id: str, message: str) -> str:
-    history = get_history(user_id)
+    # get() hands back a private copy, so the agent can append to it freely
+    history = await chat_history.get(user_id)
+    seen = len(history)
     reply = await agent.run(message, history=history)
 
-    # Agent returns reply, and we want to keep updated history.
-    # Agent currently returns only reply, so we rebuild expected history shape:
-    # The history list is the same object agent used (mem.messages) if provided.
-    # Since we passed 'history' (a list), it gets appended in agent.
-    set_history(user_id, history)
+    # Only the messages the agent added this turn go back into the (shared) store
+    await chat_history.extend(user_id, history[seen:])
 
     return reply
@@ -1,17 +1,188 @@
 """
 Phase 5 - In-memory conversation store (per user)
 No DB yet.
+
+Bounded so a long-running pod cannot grow without limit:
+- per-user ring buffer (last N messages)
+- idle-user TTL (users not seen for a while are dropped)
+- global byte budget with LRU eviction across users
+- stats() for metrics: users tracked, messages held, bytes estimated
 """
 
-from typing import Dict, List
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+
+# rough per-message cost of the dict + its small strings, on top of content
+_MSG_OVERHEAD_BYTES = 240
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _estimate_bytes(msg: dict) -> int:
+    return _MSG_OVERHEAD_BYTES + sum(len(str(v)) for v in msg.values())
+
+
+class _UserHistory:
+    __slots__ = ("messages", "sizes", "bytes", "last_seen")
+
+    def __init__(self, now: float) -> None:
+        self.messages: Deque[dict] = deque()
+        self.sizes: Deque[int] = deque()
+        self.bytes = 0
+        self.last_seen = now
+
+    def push(self, msg: dict, max_messages: int) -> int:
+        """Append one message; returns the byte delta (may be negative)."""
+        size = _estimate_bytes(msg)
+        delta = size
+        while len(self.messages) >= max_messages:
+            delta -= self.pop_oldest()
+        self.messages.append(msg)
+        self.sizes.append(size)
+        self.bytes += size
+        return delta
+
+    def pop_oldest(self) -> int:
+        self.messages.popleft()
+        size = self.sizes.popleft()
+        self.bytes -= size
+        return size
+
+
+class HistoryStore:
+    """
+    Thread-safe, bounded user_id -> message list store.
+
+    get() returns a copy (oldest first), so callers can hand it to an agent
+    without holding the lock; new messages go back in via append()/extend().
+    """
+
+    def __init__(
+        self,
+        max_messages: Optional[int] = None,
+        idle_ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_messages = max(1, max_messages or _env_int("CHAT_HISTORY_MAX_MESSAGES", 100))
+        self.idle_ttl = float(idle_ttl_seconds or _env_int("CHAT_HISTORY_IDLE_TTL_SECONDS", 6 * 3600))
+        self.max_bytes = max_bytes or _env_int("CHAT_HISTORY_MAX_BYTES", 64 * 1024 * 1024)
+        self._clock = clock
+        self._users: "OrderedDict[str, _UserHistory]" = OrderedDict()  # LRU order, oldest first
+        self._bytes = 0
+        self._messages = 0
+        self._evicted_users = 0
+        self._lock = threading.Lock()
+
+    # ---- internals (caller holds the lock) ----
+
+    def _drop(self, user_id: str, evicted: bool = True) -> None:
+        h = self._users.pop(user_id)
+        self._bytes -= h.bytes
+        self._messages -= len(h.messages)
+        if evicted:
+            self._evicted_users += 1
+
+    def _expire(self, now: float) -> None:
+        # LRU order == last_seen order, so expired users are all at the front
+        cutoff = now - self.idle_ttl
+        while self._users:
+            user_id, h = next(iter(self._users.items()))
+            if h.last_seen >= cutoff:
+                break
+            self._drop(user_id)
+
+    def _touch(self, user_id: str, now: float, create: bool) -> Optional[_UserHistory]:
+        self._expire(now)
+        h = self._users.get(user_id)
+        if h is None:
+            if not create:
+                return None
+            h = self._users[user_id] = _UserHistory(now)
+        else:
+            self._users.move_to_end(user_id)
+        h.last_seen = now
+        return h
+
+    def _enforce_budget(self, current: _UserHistory) -> None:
+        # evict least-recently-used users first, never the one being written
+        while self._bytes > self.max_bytes and len(self._users) > 1:
+            self._drop(next(iter(self._users)))
+        # a single user over budget loses their oldest messages instead
+        while self._bytes > self.max_bytes and len(current.messages) > 1:
+            self._bytes -= current.pop_oldest()
+            self._messages -= 1
+
+    def _push(self, h: _UserHistory, msg: dict) -> None:
+        before = len(h.messages)
+        # the store keeps its own copy: callers may reuse theirs, and memory
+        # profiles (app/profiling.py) attribute it to this module
+        self._bytes += h.push(dict(msg), self.max_messages)
+        self._messages += len(h.messages) - before
+
+    # ---- public API ----
+
+    def get(self, user_id: str) -> List[dict]:
+        with self._lock:
+            h = self._touch(user_id, self._clock(), create=False)
+            return list(h.messages) if h is not None else []
+
+    def peek(self, user_id: str) -> Optional[List[dict]]:
+        """Like get(), but None when the user is not held at all (never seen, expired or evicted)."""
+        with self._lock:
+            h = self._touch(user_id, self._clock(), create=False)
+            return list(h.messages) if h is not None else None
+
+    def append(self, user_id: str, role: str, content: str) -> None:
+        self.extend(user_id, [{"role": role, "content": content}])
+
+    def extend(self, user_id: str, messages: Iterable[dict]) -> None:
+        with self._lock:
+            h = self._touch(user_id, self._clock(), create=True)
+            assert h is not None
+            for msg in messages:
+                self._push(h, msg)
+            self._enforce_budget(h)
+
+    def replace(self, user_id: str, messages: Iterable[dict]) -> None:
+        with self._lock:
+            if user_id in self._users:
+                self._drop(user_id, evicted=False)
+        self.extend(user_id, messages)
+
+    def clear(self, user_id: str) -> None:
+        with self._lock:
+            if user_id in self._users:
+                self._drop(user_id, evicted=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._expire(self._clock())
+            return {
+                "users": len(self._users),
+                "messages": self._messages,
+                "bytes": self._bytes,
+                "evicted_users": self._evicted_users,
+            }
+
 
 # user_id -> list of messages [{role, content}]
-USER_HISTORY: Dict[str, List[dict]] = {}
+USER_HISTORY = HistoryStore()
 
 
 def get_history(user_id: str) -> List[dict]:
-    return USER_HISTORY.get(user_id, [])
+    return USER_HISTORY.get(user_id)
 
 
 def set_history(user_id: str, history: List[dict]) -> None:
-    USER_HISTORY[user_id] = history
+    USER_HISTORY.replace(user_id, history)
@@ -0,0 +1,82 @@
+"""
+Phase 5 - Cross-replica cache invalidation over Dapr pub/sub
+
+- every replica keeps near-caches (task repository, chat history); after a
+  write this replica publishes {event_type: kind, user_id, origin} to
+  CACHE_INVALIDATION_TOPIC, batched through a DaprPublisher
+- every replica subscribes (GET /dapr/subscribe, app/routers/dapr.py) and
+  runs the handler registered for the kind, e.g. tasks_repo.invalidate;
+  messages a replica sent itself are skipped by origin
+- fan-out needs one consumer group per pod: the pub/sub component is
+  dapr-components/kafka-pubsub-broadcast.yaml (same brokers as kafka-pubsub,
+  consumerID "{podName}"); the task-events consumers keep their shared group
+- CACHE_INVALIDATION=dapr turns it on; off by default (single replica)
+- delivery is best effort, so the bus is only the fast path: the task
+  repository re-checks each cached user's task_versions row at most every
+  TASK_CACHE_MAX_AGE_MS, which bounds how long a lost message can leave a
+  replica stale
+"""
+
+from __future__ import annotations
+
+import os
+import uuid
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from app.dapr_publish import DaprPublisher
+
+INVALIDATION_PUBSUB = os.getenv("CACHE_INVALIDATION_PUBSUB", "kafka-pubsub-broadcast")
+INVALIDATION_TOPIC = os.getenv("CACHE_INVALIDATION_TOPIC", "cache-invalidation")
+# pod name in Kubernetes; anything unique per process elsewhere
+REPLICA_ID = os.getenv("HOSTNAME") or uuid.uuid4().hex[:12]
+
+
+class CacheBus:
+    def __init__(self, enabled: bool = False, publisher: Optional[DaprPublisher] = None) -> None:
+        self.enabled = enabled
+        # invalidations are tiny and latency matters more than batch size
+        self.publisher = publisher or DaprPublisher(pubsub=INVALIDATION_PUBSUB, topic=INVALIDATION_TOPIC, linger_ms=5)
+        self._handlers: Dict[str, Callable[[str], None]] = {}
+        self.received = 0
+        self.applied = 0
+        self.ignored = 0
+
+    def on(self, kind: str, handler: Callable[[str], None]) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        if self.enabled:
+            await self.publisher.start()
+
+    async def stop(self) -> None:
+        await self.publisher.stop()
+
+    def publish(self, kind: str, user_id: str) -> None:
+        """Tell the other replicas `user_id`'s `kind` changed; never blocks, no-op when disabled."""
+        if self.enabled:
+            self.publisher.send({"id": uuid.uuid4().hex, "event_type": kind, "user_id": user_id, "origin": REPLICA_ID})
+
+    def handle(self, envelope: Mapping[str, Any]) -> bool:
+        """One delivered message (CloudEvent or bare event); True if a cache was invalidated."""
+        self.received += 1
+        event = envelope.get("data", envelope)
+        if not isinstance(event, Mapping) or event.get("origin") == REPLICA_ID:
+            self.ignored += 1
+            return False
+        handler = self._handlers.get(str(event.get("event_type")))
+        user_id = event.get("user_id")
+        if handler is None or not isinstance(user_id, str):
+            self.ignored += 1
+            return False
+        handler(user_id)
+        self.applied += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"enabled": self.enabled, "replica": REPLICA_ID}
+        out.update(self.publisher.stats())
+        out.update(received=self.received, applied=self.applied, ignored=self.ignored)
+        return out
+
+
+cache_bus = CacheBus(enabled=os.getenv("CACHE_INVALIDATION", "").strip().lower() in ("dapr", "1", "true", "on"))
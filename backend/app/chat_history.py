@@ -1,43 +1,14 @@
 # backend/app/chat_history.py
 from __future__ import annotations
 
-from datetime import datetime
 from typing import List, Optional, Tuple
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
-from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
+from sqlalchemy.orm import Session
 
-from .db import Base
+from . import message_writer
 
-
-class Conversation(Base):
-    __tablename__ = "conversations"
-
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    user_id: Mapped[str] = mapped_column(String(128), index=True, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
-    )
-
-    messages: Mapped[List["Message"]] = relationship(
-        "Message", back_populates="conversation", cascade="all, delete-orphan"
-    )
-
-
-class Message(Base):
-    __tablename__ = "messages"
-
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    conversation_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("conversations.id", ondelete="CASCADE"), index=True, nullable=False
-    )
-    role: Mapped[str] = mapped_column(String(32), nullable=False)  # "user" | "assistant"
-    content: Mapped[str] = mapped_column(Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
-    )
-
-    conversation: Mapped["Conversation"] = relationship("Conversation", back_populates="messages")
+# one chat schema for the whole app (see app/models.py)
+from .models import Conversation, Message
 
 
 def get_or_create_conversation(session: Session, user_id: str, conversation_id: Optional[int]) -> Conversation:
@@ -54,14 +25,14 @@ def get_or_create_conversation(session: Session, user_id: str, conversation_id:
 
 
 def add_message(session: Session, conversation_id: int, role: str, content: str) -> None:
-    msg = Message(conversation_id=conversation_id, role=role, content=content)
-    session.add(msg)
-    session.commit()
+    message_writer.save(session, conversation_id, role, content)
 
 
 def get_last_messages(session: Session, conversation_id: int, limit: int = 20) -> List[Tuple[str, str]]:
+    # read-your-writes: messages still in the write-behind buffer go out first
+    message_writer.ensure_visible(session.get_bind(), conversation_id)
     rows = (
-        session.query(Message)
+        session.query(Message.role, Message.content)
         .filter(Message.conversation_id == conversation_id)
         .order_by(Message.id.desc())
         .limit(limit)
@@ -1,11 +1,15 @@
+from typing import Dict, List
+
 from sqlalchemy.orm import Session
+from . import message_writer
 from .models import Conversation, Message
 
 def get_or_create_conversation(db: Session, user_id: str) -> Conversation:
+    # newest conversation by id (ids only grow); messages are NOT loaded here
     convo = (
         db.query(Conversation)
         .filter(Conversation.user_id == user_id)
-        .order_by(Conversation.created_at.desc())
+        .order_by(Conversation.id.desc())
         .first()
     )
     if not convo:
@@ -16,20 +20,22 @@ def get_or_create_conversation(db: Session, user_id: str) -> Conversation:
     return convo
 
 def save_message(db: Session, conversation_id: int, role: str, content: str):
-    msg = Message(
-        conversation_id=conversation_id,
-        role=role,
-        content=content,
-    )
-    db.add(msg)
-    db.commit()
+    message_writer.save(db, conversation_id, role, content)
 
-def load_history(db: Session, conversation_id: int, limit: int = 20):
-    msgs = (
-        db.query(Message)
+def load_history(db: Session, conversation_id: int, limit: int = 20) -> List[Dict[str, str]]:
+    """
+    The newest `limit` messages, returned oldest-first (ready for the model).
+    Seeks ix_messages_conversation_id_id backwards and reads only role/content,
+    so cost depends on `limit`, not on how long the conversation is.
+    """
+    # read-your-writes: messages still in the write-behind buffer go out first
+    message_writer.ensure_visible(db.get_bind(), conversation_id)
+    rows = (
+        db.query(Message.role, Message.content)
         .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.asc())
+        .order_by(Message.id.desc())
         .limit(limit)
         .all()
     )
-    return [{"role": m.role, "content": m.content} for m in msgs]
+    rows.reverse()
+    return [{"role": r.role, "content": r.content} for r in rows]
@@ -1,28 +1,275 @@
+"""
+Task events -> Dapr Pub/Sub (batched, non-blocking)
+
+- publish_task_event*() only enqueue; task writes never wait on the sidecar
+- a background worker (started in the app lifespan) drains a bounded queue
+  and flushes batches over one pooled connection using Dapr bulk publish,
+  when a batch is full or the linger time has passed
+- queue full -> drop policy ("drop_oldest" or "drop_newest")
+- counters for published / dropped / failed events (see stats()); each
+  bulk call's latency and outcome also go to /metrics (app/metrics.py)
+- if Dapr is not running the app keeps working; failures are only counted
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
 import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
 import httpx
-from typing import Any, Dict
+
+from app.metrics import DAPR_EVENTS, DAPR_LATENCY
 
 DAPR_HTTP_PORT = os.getenv("DAPR_HTTP_PORT", "3500")
 PUBSUB_NAME = os.getenv("DAPR_PUBSUB_NAME", "kafka-pubsub")
 TOPIC_NAME = os.getenv("DAPR_TOPIC_NAME", "task-events")
 
+logger = logging.getLogger(__name__)
 
-async def publish_task_event(event_type: str, task: Dict[str, Any]):
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def bulk_url(pubsub: str = PUBSUB_NAME, topic: str = TOPIC_NAME) -> str:
+    return f"/v1.0-alpha1/publish/bulk/{pubsub}/{topic}"
+
+
+async def bulk_publish(
+    client: httpx.AsyncClient,
+    events: List[Dict[str, Any]],
+    pubsub: str = PUBSUB_NAME,
+    topic: str = TOPIC_NAME,
+    errors: Optional[Dict[str, str]] = None,
+) -> Set[str]:
     """
-    Publish task events to Dapr Pub/Sub.
-    If Dapr is not running or unreachable, fail silently (no crash).
+    Send events (each carrying a unique "id") in one Dapr bulk publish call.
+    Returns the ids that were NOT accepted; never raises. If `errors` is
+    given, it is filled with id -> reason for each rejected event.
     """
-    url = f"http://localhost:{DAPR_HTTP_PORT}/v1.0/publish/{PUBSUB_NAME}/{TOPIC_NAME}"
-
-    payload = {
-        "event_type": event_type,
-        "task": task,
-    }
+    if not events:
+        return set()
+    entries = [
+        {"entryId": e["id"], "event": e, "contentType": "application/json"}
+        for e in events
+    ]
+    all_ids = {e["id"] for e in events}
+    start = time.perf_counter()
+    try:
+        resp = await client.post(bulk_url(pubsub, topic), json=entries)
+    except Exception as exc:
+        # Dapr optional / infra-level feature: report it, never crash
+        logger.debug("dapr bulk publish failed: %s", type(exc).__name__)
+        _observe(topic, "unreachable", start, 0, len(all_ids))
+        if errors is not None:
+            errors.update(dict.fromkeys(all_ids, f"unreachable: {type(exc).__name__}"))
+        return all_ids
 
+    if resp.status_code < 300:
+        _observe(topic, "ok", start, len(all_ids), 0)
+        return set()
     try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            await client.post(url, json=payload)
+        reasons = {f.get("entryId"): str(f.get("error") or "") for f in resp.json().get("failedEntries") or []}
     except Exception:
-        # Dapr optional / infra-level feature
-        # App should NOT crash if Dapr is down
-        pass
+        reasons = {}
+    failed = (set(reasons) & all_ids) or all_ids
+    if errors is not None:
+        for key in failed:
+            errors[key] = reasons.get(key) or f"HTTP {resp.status_code}"
+    _observe(topic, "partial" if len(failed) < len(all_ids) else "error", start, len(all_ids) - len(failed), len(failed))
+    return failed
+
+
+def _observe(topic: str, outcome: str, start: float, ok: int, failed: int) -> None:
+    DAPR_LATENCY.labels(topic, outcome).observe(time.perf_counter() - start)
+    if ok:
+        DAPR_EVENTS.labels(topic, "ok").inc(ok)
+    if failed:
+        DAPR_EVENTS.labels(topic, "failed").inc(failed)
+
+
+class DaprPublisher:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        pubsub: str = PUBSUB_NAME,
+        topic: str = TOPIC_NAME,
+        queue_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        linger_ms: Optional[int] = None,
+        drop_policy: Optional[str] = None,
+    ) -> None:
+        self.base_url = base_url or f"http://localhost:{DAPR_HTTP_PORT}"
+        self.pubsub = pubsub
+        self.topic = topic
+        self.queue_size = queue_size or _env_int("DAPR_PUBLISH_QUEUE_SIZE", 10000)
+        self.batch_size = batch_size or _env_int("DAPR_PUBLISH_BATCH_SIZE", 100)
+        self.linger = (linger_ms if linger_ms is not None else _env_int("DAPR_PUBLISH_LINGER_MS", 50)) / 1000.0
+        self.drop_policy = (drop_policy or os.getenv("DAPR_PUBLISH_DROP_POLICY", "drop_oldest")).strip().lower()
+
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._unsent: List[Dict[str, Any]] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self._counter_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ---- lifecycle ----
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(3.0),
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=1),
+        )
+        self._task = asyncio.create_task(self._run(), name="dapr-publisher")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Flush what is queued (up to `timeout` seconds), then close."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # finish the batch that was on the wire, then whatever was gathered or queued
+        if self._inflight is not None:
+            await self._inflight
+        unsent, self._unsent = self._unsent, []
+        await self._flush(unsent)
+
+        deadline = time.monotonic() + timeout
+        while self._queue is not None and not self._queue.empty() and time.monotonic() < deadline:
+            await self._flush(self._take_batch())
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---- enqueue (never blocks) ----
+
+    def _count(self, field: str, n: int = 1) -> None:
+        with self._counter_lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def _enqueue(self, event: Dict[str, Any]) -> None:
+        q = self._queue
+        if q is None:
+            self._count("dropped")
+            return
+        if q.full():
+            if self.drop_policy == "drop_newest":
+                self._count("dropped")
+                return
+            try:
+                q.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self._count("dropped")
+        q.put_nowait(event)
+
+    def publish(self, event_type: str, task: Dict[str, Any]) -> None:
+        """Enqueue from any thread; drops (and counts) if the publisher is not running."""
+        self.send({"id": uuid.uuid4().hex, "event_type": event_type, "task": dict(task)})
+
+    def send(self, event: Dict[str, Any]) -> None:
+        """Enqueue a prepared event (it must carry a unique "id"); same rules as publish()."""
+        loop = self._loop
+        if loop is None or not self.running:
+            self._count("dropped")
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._enqueue(event)
+        else:
+            loop.call_soon_threadsafe(self._enqueue, event)
+
+    # ---- worker ----
+
+    def _take_batch(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        assert self._queue is not None
+        limit = self.batch_size if limit is None else limit
+        batch: List[Dict[str, Any]] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        batch: List[Dict[str, Any]] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                # linger so a burst of writes leaves in one request, unless a batch is already full
+                if self.linger > 0 and self._queue.qsize() < self.batch_size - 1:
+                    await asyncio.sleep(self.linger)
+                batch += self._take_batch(self.batch_size - 1)
+                # shielded so stop() can let an in-flight batch finish
+                self._inflight = asyncio.ensure_future(self._flush(batch))
+                batch = []
+                await asyncio.shield(self._inflight)
+                self._inflight = None
+        except asyncio.CancelledError:
+            self._unsent = batch
+            raise
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch or self._client is None:
+            return
+        failed = await bulk_publish(self._client, batch, self.pubsub, self.topic)
+        self._count("failed", len(failed))
+        self._count("published", len(batch) - len(failed))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "published": self.published,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+publisher = DaprPublisher()
+
+
+def publish_task_event_nowait(event_type: str, task: Dict[str, Any]) -> None:
+    """Thread-safe, non-blocking: usable from sync route handlers."""
+    publisher.publish(event_type, task)
+
+
+async def publish_task_event(event_type: str, task: Dict[str, Any]):
+    """
+    Publish task events to Dapr Pub/Sub.
+    Only enqueues; the background publisher does the network I/O.
+    """
+    publisher.publish(event_type, task)
@@ -1,12 +1,60 @@
 ﻿# backend/app/main.py
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers.tasks import router as tasks_router
+from app import metrics, profiling
+from app.agent_runner import reply_cache_stats
+from app.agents import openai_client
+from app.agents.context import context_builder
+from app.dapr_publish import publisher as dapr_publisher
+from app import message_writer
+from app.cache_bus import cache_bus
+from app.db import dispose_async_engine, init_db
+from app.outbox import relay as outbox_relay
+from app.repository import tasks_repo
+from app.state import chat_history, state_backend
+from app.routers.tasks import NEXT_CURSOR_HEADER, NEXT_OFFSET_HEADER, TOTAL_COUNT_HEADER, router as tasks_router
 from app.routers.chat import router as chat_router
+from app.routers.dapr import router as dapr_router
+from app.routers.profiling import router as profiling_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # schema version check before anything touches the tables: an empty DB is
+    # migrated, a DB that is behind stops startup (SchemaError), see init_db
+    await asyncio.to_thread(init_db)
+    # tiktoken loads its BPE file here, not under a lock on the first chat turn
+    await asyncio.to_thread(context_builder.tokenizer.warm)
+    # one pooled OpenAI client for the whole process
+    await openai_client.startup()
+    # background batch publisher for task events (Dapr sidecar optional)
+    await dapr_publisher.start()
+    # relays DB-committed task events (outbox table) to kafka-pubsub
+    await outbox_relay.start()
+    # replicas > 1: drop near-cached users another replica wrote to
+    cache_bus.on("tasks", lambda user_id: tasks_repo.invalidate(user_id, broadcast=False))
+    cache_bus.on("history", chat_history.forget)
+    await cache_bus.start()
+    try:
+        yield
+    finally:
+        await cache_bus.stop()
+        if state_backend is not None:
+            await state_backend.close()
+        await outbox_relay.stop()
+        await dapr_publisher.stop()
+        await openai_client.shutdown()
+        # buffered chat messages must reach the DB before the pool closes
+        await asyncio.to_thread(message_writer.close_all)
+        await dispose_async_engine()
 
-app = FastAPI(title="Todo Backend", version="0.1.0")
+
+app = FastAPI(title="Todo Backend", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,12 +62,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # let the dashboard read the pagination cursors, search totals and the list ETag
+    expose_headers=[NEXT_CURSOR_HEADER, NEXT_OFFSET_HEADER, TOTAL_COUNT_HEADER, "ETag"],
 )
 
+# X-Profile: 1 (+ admin token) or PROFILE_SAMPLE_RATE; a no-op without either
+app.add_middleware(profiling.ProfilingMiddleware)
+
+if metrics.METRICS_ENABLED:
+    # added last = outermost, so the latency includes CORS and every other middleware
+    app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(tasks_router)
 app.include_router(chat_router)
+app.include_router(dapr_router)
+app.include_router(profiling_router)
 
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+# in-memory stores and background workers, read when /metrics is scraped
+metrics.registry.register_stats("chat_history", "Chat history near-cache and state store", chat_history.stats)
+metrics.registry.register_stats("reply_cache", "Rendered chat reply cache", reply_cache_stats)
+metrics.registry.register_stats("task_cache", "Task repository cache", tasks_repo.stats)
+metrics.registry.register_stats("chat_context", "Prompt packing and token counts", context_builder.stats)
+metrics.registry.register_stats("message_writer", "Write-behind chat message buffer", message_writer.stats)
+metrics.registry.register_stats("dapr_publisher", "Task event publisher", dapr_publisher.stats)
+metrics.registry.register_stats("outbox_relay", "Outbox relay", outbox_relay.stats)
+metrics.registry.register_stats("cache_bus", "Cross-replica cache invalidation", cache_bus.stats)
+
+# live counts reported next to every memory snapshot
+profiling.memory.track("chat_history", chat_history.stats)
+profiling.memory.track("task_cache", tasks_repo.stats)
+profiling.memory.track("reply_cache", reply_cache_stats)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -3,102 +3,108 @@ from __future__ import annotations
 
 from typing import List, Optional
 
-from sqlalchemy.orm import Session
-
 from agents import function_tool
 
-from .db import SessionLocal
-from .models import Task
+from .repository import tasks_repo
+from .tools.tasks import Task
+
+# Tools are async and share the task repository with REST and chat: reads
+# come from its per-user cache, writes are awaited DB transactions.
 
 
-def _db() -> Session:
-    return SessionLocal()
+async def _best_match(user_id: str, title: str) -> Optional[Task]:
+    """Exact title, else the top full-text hit; a substring scan is only the fallback for mid-word text."""
+    t = await tasks_repo.find_by_title(user_id, title)
+    if t is not None:
+        return t
+    found, _total = await tasks_repo.search(user_id, title, 1)
+    if found:
+        return found[0]
+    needle = title.lower()
+    return next((t for t in reversed(await tasks_repo.list(user_id)) if needle in t["title"].lower()), None)
 
 
 @function_tool
-def list_tasks(user_id: str) -> str:
+async def list_tasks(user_id: str) -> str:
     """List all tasks for a user."""
-    db = _db()
-    try:
-        tasks: List[Task] = (
-            db.query(Task).filter(Task.user_id == user_id).order_by(Task.id.asc()).all()
-        )
-        if not tasks:
-            return "No tasks found."
-        lines = []
-        for t in tasks:
-            status = "✅" if t.completed else "⏳"
-            lines.append(f"{status} {t.title} (id={t.id})")
-        return "\n".join(lines)
-    finally:
-        db.close()
+    tasks = await tasks_repo.list(user_id)
+    if not tasks:
+        return "No tasks found."
+    lines = []
+    for t in reversed(tasks):  # oldest first
+        status = "✅" if t["completed"] else "⏳"
+        lines.append(f"{status} {t['title']} (id={t['id']})")
+    return "\n".join(lines)
 
 
 @function_tool
-def add_task(user_id: str, title: str, description: Optional[str] = None) -> str:
+async def add_task(user_id: str, title: str, description: Optional[str] = None) -> str:
     """Add a new task for a user."""
     title = (title or "").strip()
     if not title:
         return "Task title is required."
-
-    db = _db()
-    try:
-        t = Task(user_id=user_id, title=title, description=description, completed=False)
-        db.add(t)
-        db.commit()
-        db.refresh(t)
-        return f"Added: {t.title} (id={t.id})"
-    finally:
-        db.close()
+    t = await tasks_repo.create(user_id, title, description)
+    return f"Added: {t['title']} (id={t['id']})"
 
 
 @function_tool
-def complete_task(user_id: str, title: str) -> str:
+async def complete_task(user_id: str, title: str) -> str:
     """Mark first matching task as completed."""
     title = (title or "").strip()
     if not title:
         return "Task title is required."
-
-    db = _db()
-    try:
-        t: Optional[Task] = (
-            db.query(Task)
-            .filter(Task.user_id == user_id, Task.title.ilike(f"%{title}%"))
-            .order_by(Task.id.asc())
-            .first()
-        )
-        if not t:
-            return f"No task matched: {title}"
-        t.completed = True
-        db.commit()
-        return f"Completed: {t.title} (id={t.id})"
-    finally:
-        db.close()
+    t = await _best_match(user_id, title)
+    if not t:
+        return f"No task matched: {title}"
+    t = await tasks_repo.set_completed(user_id, t["id"], True)
+    if not t:
+        return f"No task matched: {title}"
+    return f"Completed: {t['title']} (id={t['id']})"
 
 
 @function_tool
-def delete_task(user_id: str, title: str) -> str:
+async def delete_task(user_id: str, title: str) -> str:
     """Delete first matching task."""
     title = (title or "").strip()
     if not title:
         return "Task title is required."
+    t = await _best_match(user_id, title)
+    if not t:
+        return f"No task matched: {title}"
+    t = await tasks_repo.delete(user_id, t["id"])
+    if not t:
+        return f"No task matched: {title}"
+    return f"Deleted: {t['title']} (id={t['id']})"
+
+
+@function_tool
+async def search_tasks(user_id: str, query: str, limit: int = 10, offset: int = 0) -> str:
+    """Search a user's tasks by words in the title or description, best match first."""
+    found, total = await tasks_repo.search(user_id, query, max(1, min(limit, 50)), max(0, offset))
+    if not found:
+        return f"No tasks matched: {query}"
+    lines = [f"{'✅' if t['completed'] else '⏳'} {t['title']} (id={t['id']})" for t in found]
+    shown = offset + len(lines)
+    if shown < total:
+        lines.append(f"... {total - shown} more (offset={shown})")
+    return "\n".join(lines)
+
+
+@function_tool
+async def complete_tasks(user_id: str, task_ids: List[int]) -> str:
+    """Mark several tasks completed by id, in one update."""
+    done = await tasks_repo.set_completed_many(user_id, task_ids, True)
+    if not done:
+        return "No matching pending tasks."
+    return f"Completed {len(done)}: " + ", ".join(f"{t['title']} (id={t['id']})" for t in done)
+
 
-    db = _db()
-    try:
-        t: Optional[Task] = (
-            db.query(Task)
-            .filter(Task.user_id == user_id, Task.title.ilike(f"%{title}%"))
-            .order_by(Task.id.asc())
-            .first()
-        )
-        if not t:
-            return f"No task matched: {title}"
-        db.delete(t)
-        db.commit()
-        return f"Deleted: {t.title} (id={t.id})"
-    finally:
-        db.close()
+@function_tool
+async def clear_completed(user_id: str) -> str:
+    """Delete all completed tasks for a user."""
+    removed = await tasks_repo.clear_completed(user_id)
+    return f"Cleared {len(removed)} completed task(s)."
 
 
 # IMPORTANT: Agent ko Tool objects chahiye (functions nahi)
-tools = [list_tasks, add_task, complete_task, delete_task]
+tools = [list_tasks, add_task, complete_task, delete_task, search_tasks, complete_tasks, clear_completed]
@@ -0,0 +1,344 @@
+"""
+Write-behind buffer for chat message inserts
+
+- save_message / add_message only append a row here; a background thread
+  flushes every CHAT_WRITE_LINGER_MS as ONE transaction with one multi-row
+  INSERT per table (instead of a commit per message)
+- read-your-writes: history readers call ensure_visible(conversation_id)
+  first, which flushes synchronously only if that conversation still has
+  unflushed rows (normally the linger flush already happened)
+- flushes are serialized and in order. A batch that fails on the
+  connection (DB down) is put back in front and retried with backoff
+  (1s doubling to 30s; history reads do not retry during the backoff).
+  Each row gets CHAT_WRITE_MAX_RETRIES tries, then it is logged and
+  dropped. A batch that fails on its data is written row by row, so one
+  bad row is dropped on its own and does not hold up everyone else's
+- the buffer is bounded (CHAT_WRITE_MAX_PENDING rows): when it is full the
+  caller flushes synchronously, and gets WriterFull if that does not make
+  room (during a DB outage it fails right away)
+- close_all() flushes everything (app shutdown and interpreter exit)
+- CHAT_WRITE_BEHIND=0 turns it off (callers insert + commit directly)
+- CHAT_MESSAGE_COUNTER=1 also keeps conversations.message_count, in the same
+  transaction as the inserts (one UPDATE per conversation per flush)
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Table, bindparam
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() not in ("", "0", "false", "no", "off")
+
+
+WRITE_BEHIND = _env_flag("CHAT_WRITE_BEHIND", "1")
+COUNT_MESSAGES = _env_flag("CHAT_MESSAGE_COUNTER", "0")
+
+
+def _messages_table() -> Table:
+    from .models import Message
+
+    return Message.__table__
+
+
+def bump_message_counts(conn: Connection, rows: List[Dict[str, Any]]) -> None:
+    """conversations.message_count += n, one executemany for the whole batch."""
+    from .models import Conversation
+
+    counts = Counter(r["conversation_id"] for r in rows)
+    convos = Conversation.__table__
+    conn.execute(
+        convos.update()
+        .where(convos.c.id == bindparam("cid"))
+        .values(message_count=convos.c.message_count + bindparam("n")),
+        [{"cid": cid, "n": n} for cid, n in sorted(counts.items())],  # fixed order: no deadlocks
+    )
+
+
+# (seq, table, row, failed attempts)
+_Pending = Tuple[int, Table, Dict[str, Any], int]
+
+_MAX_BACKOFF = 30.0
+
+
+class WriterFull(RuntimeError):
+    """The buffer is at CHAT_WRITE_MAX_PENDING and a synchronous flush did not make room."""
+
+
+def _transient(exc: BaseException) -> bool:
+    """Connection-level failure (worth retrying the same rows) vs. a problem with the rows."""
+    if isinstance(exc, (OperationalError, DisconnectionError)):
+        return True
+    return isinstance(exc, DBAPIError) and exc.connection_invalidated
+
+
+class MessageWriter:
+    def __init__(
+        self,
+        bind: Engine,
+        linger_ms: Optional[int] = None,
+        max_batch: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ) -> None:
+        self.bind = bind
+        self.linger = (linger_ms if linger_ms is not None else _env_int("CHAT_WRITE_LINGER_MS", 25)) / 1000.0
+        self.max_batch = max_batch or _env_int("CHAT_WRITE_MAX_BATCH", 500)
+        self.max_pending = max(1, max_pending or _env_int("CHAT_WRITE_MAX_PENDING", 10000))
+        self.max_retries = max(1, max_retries or _env_int("CHAT_WRITE_MAX_RETRIES", 10))
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # one flush at a time, in seq order
+        self._pending: List[_Pending] = []
+        self._seq = 0
+        self._committed = 0
+        self._last_seq: Dict[int, int] = {}  # conversation_id -> newest seq buffered
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._backoff = 0.0
+        self._retry_at = 0.0  # monotonic; no flush before this after a connection failure
+
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+    # ---- producers ----
+
+    def add(self, table: Table, row: Dict[str, Any]) -> None:
+        for attempt in range(2):
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("message writer is closed")
+                if len(self._pending) < self.max_pending:
+                    self._seq += 1
+                    self._pending.append((self._seq, table, row, 0))
+                    self._last_seq[row["conversation_id"]] = self._seq
+                    if self._thread is None:
+                        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+                        self._thread.start()
+                    if len(self._pending) >= self.max_batch:
+                        self._wake.notify()
+                    return
+            if attempt == 0:
+                # full: the caller pays for the backlog (backpressure, order kept);
+                # a no-op while backing off from a DB outage, so that fails fast
+                self.flush()
+        raise WriterFull(f"{self.max_pending} chat messages waiting for the database")
+
+    # ---- readers ----
+
+    def ensure_visible(self, conversation_id: int) -> None:
+        """Make every message buffered so far for this conversation readable from the DB."""
+        with self._lock:
+            target = self._last_seq.get(conversation_id, 0)
+            if target <= self._committed:
+                return
+        self.flush()
+
+    # ---- flushing ----
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Write everything buffered right now; returns rows written. Inside the
+        backoff after a connection failure this is a no-op unless `force`.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not force and time.monotonic() < self._retry_at:
+                    return 0
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+                kept: List[_Pending] = []
+                written = len(batch)
+            except Exception as exc:
+                if _transient(exc):
+                    kept = self._retry_later(batch, exc)
+                    written = 0
+                else:
+                    # a bad row: find it, write the rest, keep going
+                    kept, written = self._write_each(batch, exc)
+            with self._lock:
+                self._pending[:0] = kept  # in front: keep order for the retry
+                if not kept:
+                    self._backoff, self._retry_at = 0.0, 0.0
+                first_kept = kept[0][0] if kept else self._seq + 1
+                self._committed = max(self._committed, min(first_kept - 1, batch[-1][0]))
+                for cid, seq in list(self._last_seq.items()):
+                    if seq <= self._committed:
+                        del self._last_seq[cid]
+                self.written += written
+                self.flushes += 1 if written else 0
+            return written
+
+    def _retry_later(self, batch: List[_Pending], exc: BaseException) -> List[_Pending]:
+        """Connection trouble: every row keeps its place, one try used; rows out of tries are dropped."""
+        kept = [(seq, table, row, tries + 1) for seq, table, row, tries in batch]
+        out_of_tries = [p for p in kept if p[3] >= self.max_retries]
+        if out_of_tries:
+            kept = [p for p in kept if p[3] < self.max_retries]
+            self._drop(out_of_tries, exc)
+        with self._lock:
+            self.failures += 1
+            self._backoff = min(max(self._backoff * 2, 1.0), _MAX_BACKOFF)
+            self._retry_at = time.monotonic() + self._backoff
+        logger.warning(
+            "chat message flush failed (%d rows kept, retry in %.0fs): %s",
+            len(kept), self._backoff, type(exc).__name__,
+        )
+        return kept
+
+    def _write_each(self, batch: List[_Pending], exc: BaseException) -> Tuple[List[_Pending], int]:
+        """The batch failed on its data: one transaction per row, drop the rows that fail."""
+        with self._lock:
+            self.failures += 1
+        written = 0
+        for i, pending in enumerate(batch):
+            try:
+                self._write([pending])
+                written += 1
+            except Exception as row_exc:
+                if _transient(row_exc):
+                    return self._retry_later(batch[i:], row_exc), written
+                self._drop([pending], row_exc)
+        return [], written
+
+    def _drop(self, rows: List[_Pending], exc: BaseException) -> None:
+        with self._lock:
+            self.dropped += len(rows)
+        conversations = sorted({row.get("conversation_id") for _seq, _table, row, _tries in rows})
+        logger.error(
+            "dropped %d chat message(s) after %d tries (conversations %s): %s",
+            len(rows), max(rows[0][3], 1), conversations[:20], exc,
+        )
+
+    def _write(self, batch: List[_Pending]) -> None:
+        by_table: Dict[Table, List[Dict[str, Any]]] = {}
+        for _seq, table, row, _tries in batch:
+            by_table.setdefault(table, []).append(row)
+        # executemany -> SQLAlchemy's insertmanyvalues: INSERT ... VALUES (...), (...), ...
+        with self.bind.begin() as conn:
+            for table, rows in by_table.items():
+                conn.execute(table.insert(), rows)
+                if COUNT_MESSAGES:
+                    bump_message_counts(conn, rows)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wake.wait()
+                if self._closed and not self._pending:
+                    return
+                if len(self._pending) < self.max_batch and not self._closed:
+                    # linger so concurrent turns share one transaction
+                    self._wake.wait(self.linger)
+                wait = self._retry_at - time.monotonic()
+                if wait > 0 and not self._closed:
+                    self._wake.wait(wait)  # DB trouble: back off
+                if self._closed:
+                    return  # close() makes the last attempt
+            self.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._wake.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5.0)
+        self.flush(force=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+# -----------------------------
+# One writer per engine
+# -----------------------------
+_WRITERS: Dict[int, MessageWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def writer_for(bind: Engine) -> MessageWriter:
+    w = _WRITERS.get(id(bind))
+    if w is None:
+        with _WRITERS_LOCK:
+            w = _WRITERS.get(id(bind))
+            if w is None:
+                w = MessageWriter(bind)
+                _WRITERS[id(bind)] = w
+    return w
+
+
+def save(session: Session, conversation_id: int, role: str, content: str) -> None:
+    """Store one chat message: buffered (default) or inserted and committed right away."""
+    row = {"conversation_id": conversation_id, "role": role, "content": content}
+    if WRITE_BEHIND:
+        writer_for(session.get_bind()).add(_messages_table(), row)
+        return
+    conn = session.connection()
+    conn.execute(_messages_table().insert(), [row])
+    if COUNT_MESSAGES:
+        bump_message_counts(conn, [row])
+    session.commit()
+
+
+def ensure_visible(bind: Engine, conversation_id: int) -> None:
+    w = _WRITERS.get(id(bind))
+    if w is not None:
+        w.ensure_visible(conversation_id)
+
+
+def stats() -> Dict[str, int]:
+    """Summed over every engine's writer (for /metrics)."""
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+    out = {"pending": 0, "written": 0, "flushes": 0, "failures": 0, "dropped": 0}
+    for w in writers:
+        for k, v in w.stats().items():
+            out[k] += v
+    return out
+
+
+def close_all() -> None:
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+        _WRITERS.clear()
+    for w in writers:
+        w.close()
+
+
+atexit.register(close_all)
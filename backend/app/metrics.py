@@ -0,0 +1,339 @@
+"""
+Phase 5 - Prometheus metrics (GET /metrics, text exposition format 0.0.4)
+
+- dependency-free Counter / Gauge / Histogram with labels; a labelled child
+  is looked up once per label set, observe() is a bisect + two adds under a
+  lock (about a microsecond), so the hot paths can afford it
+- MetricsMiddleware: per-route latency histogram (route template, not the
+  raw path, so user ids do not explode the label set) + in-flight gauge
+- instrument_engine(): SQLAlchemy cursor timing by statement kind
+- OpenAI (app/agents/agent.py) and Dapr publish (app/dapr_publish.py)
+  latency / outcome are observed where the calls are made
+- store sizes are not pushed on every write: register_stats() reads each
+  component's stats() at scrape time, so they cost nothing in between
+- METRICS_ENABLED=0 turns the middleware and engine hooks off
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "off", "no")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; HTTP/DB/LLM latencies all fall in here
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# -----------------------------
+# Metric types
+# -----------------------------
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self) -> Any:
+        """A fresh child for one label set."""
+
+    def labels(self, *values: str) -> Any:
+        """The child for one label set (create on first use); keep it around on hot paths."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self) -> Any:
+        return self.labels()
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(sample name, rendered labels, value) for every child."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_fmt(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, child in list(self._children.items()):
+            yield self.name, _labels(self.labelnames, key), child.value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            running = 0
+            for bound, n in zip(self.bounds + (math.inf,), counts):
+                running += n
+                yield f"{self.name}_bucket", _labels(self.labelnames, key, f'le="{_fmt(bound)}"'), running
+            yield f"{self.name}_sum", _labels(self.labelnames, key), total
+            yield f"{self.name}_count", _labels(self.labelnames, key), running
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats: List[Tuple[str, str, Callable[[], Mapping[str, Any]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.setdefault(metric.name, metric)
+        return self._metrics[metric.name]
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def register_stats(self, component: str, help: str, stats: Callable[[], Mapping[str, Any]]) -> None:
+        """Expose every numeric field of `stats()` as todo_<component>_<field>, read at scrape time."""
+        self._stats = [s for s in self._stats if s[0] != component]
+        self._stats.append((component, help, stats))
+
+    def _stats_lines(self) -> List[str]:
+        lines: List[str] = []
+        for component, help, stats in self._stats:
+            try:
+                values = stats()
+            except Exception:
+                continue  # a broken component must not take /metrics down
+            for field, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                name = f"todo_{component}_{field}"
+                lines.append(f"# HELP {name} {help} ({field})")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_fmt(value)}")
+        return lines
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        lines.extend(self._stats_lines())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_LATENCY = registry.histogram(
+    "todo_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = registry.gauge("todo_http_requests_in_flight", "HTTP requests being served", ("method",))
+DB_LATENCY = registry.histogram("todo_db_query_duration_seconds", "SQL statement latency", ("engine", "statement"))
+DB_ERRORS = registry.counter("todo_db_query_errors_total", "SQL statements that raised", ("engine", "statement"))
+LLM_LATENCY = registry.histogram(
+    "todo_openai_request_duration_seconds",
+    "OpenAI chat completion latency (streams: until the last token)",
+    ("model", "mode", "outcome"),
+)
+LLM_FIRST_TOKEN = registry.histogram("todo_openai_first_token_seconds", "Streaming: time to the first token", ("model",))
+LLM_TOKENS = registry.counter("todo_openai_tokens_total", "Tokens reported by OpenAI usage", ("model", "kind"))
+DAPR_LATENCY = registry.histogram(
+    "todo_dapr_publish_duration_seconds", "Dapr bulk publish call latency", ("topic", "outcome")
+)
+DAPR_EVENTS = registry.counter("todo_dapr_publish_events_total", "Events handed to Dapr by outcome", ("topic", "outcome"))
+
+
+# -----------------------------
+# HTTP middleware
+# -----------------------------
+
+
+class MetricsMiddleware:
+    """Pure ASGI (no BaseHTTPMiddleware): streaming responses pass straight through."""
+
+    def __init__(self, app: Any, skip: Sequence[str] = ("/metrics",)) -> None:
+        self.app = app
+        self.skip = frozenset(skip)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["path"] in self.skip:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+
+        async def _send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.labels(method, template, str(status[0])).observe(time.perf_counter() - start)
+
+
+# -----------------------------
+# SQLAlchemy
+# -----------------------------
+
+_STATEMENT_KINDS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "PRAGMA")
+
+
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip()[:6].upper()
+    for kind in _STATEMENT_KINDS:
+        if head.startswith(kind[:6]):
+            return kind.lower()
+    return "other"
+
+
+def instrument_engine(engine: Any, name: str = "sync") -> None:
+    """Time every cursor execute on `engine` (a sync Engine; pass async_engine.sync_engine)."""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_start"].pop()
+        DB_LATENCY.labels(name, _statement_kind(statement)).observe(time.perf_counter() - started)
+
+    def failed(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("metrics_start") if conn is not None else None
+        if stack:
+            stack.pop()
+        DB_ERRORS.labels(name, _statement_kind(exception_context.statement or "")).inc()
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", failed)
+
+
+def render() -> str:
+    return registry.render()
+
+
+def observe_llm(model: str, mode: str, outcome: str, seconds: float, usage: Optional[Mapping[str, Any]] = None) -> None:
+    LLM_LATENCY.labels(model, mode, outcome).observe(seconds)
+    if usage:
+        for kind in ("prompt_tokens", "completion_tokens"):
+            n = usage.get(kind)
+            if n:
+                LLM_TOKENS.labels(model, kind[: -len("_tokens")]).inc(n)
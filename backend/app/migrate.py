@@ -0,0 +1,328 @@
+"""
+Phase 5 - Schema migrations (no create_all at startup)
+
+Versioned, idempotent steps recorded in `schema_migrations`:
+- 001 base tables that do not exist yet (fresh DBs get the full schema here)
+- 002 task list / due-date composite indexes
+- 003 chat indexes (latest conversation per user, last N messages); drops
+      the single-column indexes they replace
+- 004 conversations.updated_at / message_count columns + batched backfill
+- 005 Postgres: chat columns created by the old chat_history models
+      (timestamptz + now() default, varchar(128) / varchar(32)) brought to
+      the unified types (timestamp, varchar); no-op elsewhere
+- 006 task full-text search: SQLite FTS5 table + triggers (batched backfill);
+      Postgres tsvector GIN index + pg_trgm title index (see app/search.py)
+- 007 outbox relay lease: outbox_checkpoints.owner / lease_until
+- 008 task_versions: per-user change counter (list ETags, cache revalidation)
+
+Long locks are avoided on purpose:
+- Postgres indexes are built with CREATE INDEX CONCURRENTLY (autocommit)
+- new columns use constant defaults (no table rewrite)
+- backfills run in id-range batches, one short transaction each
+
+Usage:
+    python -m app.migrate              # apply pending steps
+    python -m app.migrate --status     # show applied / pending
+    python -m app.migrate --batch-size 500 --pause-ms 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from .db import Base, engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+
+class Step(NamedTuple):
+    version: str
+    description: str
+    apply: Callable[[Engine, "Options"], None]
+
+
+class Options(NamedTuple):
+    batch_size: int = 1000
+    pause: float = 0.0
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def _is_pg(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _create_index(
+    engine: Engine, name: str, table: str, columns: Sequence[str], include: Sequence[str] = ()
+) -> None:
+    cols = ", ".join(columns)
+    if _is_pg(engine):
+        extra = f" INCLUDE ({', '.join(include)})" if include else ""
+        sql = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols}){extra}"
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(sql))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+
+
+def _drop_index(engine: Engine, name: str) -> None:
+    if _is_pg(engine):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _columns(engine: Engine, table: str) -> List[str]:
+    return [c["name"] for c in inspect(engine).get_columns(table)]
+
+
+def _in_batches(engine: Engine, table: str, sql: str, opts: Options) -> int:
+    """Run `sql` (with :lo / :hi id bounds) over `table` in id-range batches; returns rows touched."""
+    with engine.connect() as conn:
+        hi = conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0
+    touched = 0
+    lo = 0
+    while lo < hi:
+        upper = lo + opts.batch_size
+        with engine.begin() as conn:
+            res = conn.execute(text(sql), {"lo": lo, "hi": upper})
+            touched += res.rowcount or 0
+        lo = upper
+        if opts.pause:
+            time.sleep(opts.pause)  # let app traffic in between batches
+    return touched
+
+
+def _backfill(engine: Engine, table: str, set_sql: str, opts: Options) -> int:
+    """UPDATE table SET ... in id-range batches; returns rows touched."""
+    return _in_batches(engine, table, f"UPDATE {table} SET {set_sql} WHERE id > :lo AND id <= :hi", opts)
+
+
+# -----------------------------
+# Steps
+# -----------------------------
+def _001_base(engine: Engine, opts: Options) -> None:
+    from . import models  # noqa: F401  (register tables on Base)
+
+    Base.metadata.create_all(bind=engine, checkfirst=True)
+
+
+def _002_task_indexes(engine: Engine, opts: Options) -> None:
+    _create_index(engine, "ix_tasks_user_completed_id", "tasks", ["user_id", "completed", "id"])
+    _create_index(engine, "ix_tasks_user_due_date", "tasks", ["user_id", "due_date"])
+
+
+def _003_chat_indexes(engine: Engine, opts: Options) -> None:
+    _create_index(engine, "ix_conversations_user_id_id", "conversations", ["user_id", "id"])
+    _create_index(engine, "ix_messages_conversation_id_id", "messages", ["conversation_id", "id"], include=["role"])
+    # superseded: the composites above lead with the same column
+    _drop_index(engine, "ix_conversations_user_id")
+    _drop_index(engine, "ix_messages_conversation_id")  # from the old chat_history models
+
+
+def _004_conversation_columns(engine: Engine, opts: Options) -> None:
+    cols = _columns(engine, "conversations")
+    # constant defaults: metadata-only on Postgres 11+, allowed by SQLite ADD COLUMN
+    with engine.begin() as conn:
+        if "updated_at" not in cols:
+            conn.execute(text(
+                "ALTER TABLE conversations ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT '1970-01-01 00:00:00'"
+            ))
+        if "message_count" not in cols:
+            conn.execute(text("ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0"))
+
+    if "updated_at" not in cols:
+        _backfill(engine, "conversations", "updated_at = created_at", opts)
+    if "message_count" not in cols:
+        # run with CHAT_MESSAGE_COUNTER off; switch it on once this is done
+        _backfill(
+            engine,
+            "conversations",
+            "message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id)",
+            opts,
+        )
+
+
+# (table, column, legacy type prefix, target type)
+_LEGACY_CHAT_COLUMNS = (
+    ("conversations", "user_id", "VARCHAR(", "VARCHAR"),
+    ("conversations", "created_at", "TIMESTAMP WITH TIME ZONE", "TIMESTAMP WITHOUT TIME ZONE"),
+    ("messages", "role", "VARCHAR(", "VARCHAR"),
+    ("messages", "created_at", "TIMESTAMP WITH TIME ZONE", "TIMESTAMP WITHOUT TIME ZONE"),
+)
+
+
+def _005_legacy_chat_types(engine: Engine, opts: Options) -> None:
+    if not _is_pg(engine):
+        return  # SQLite does not enforce these types
+    insp = inspect(engine)
+    for table, column, legacy, target in _LEGACY_CHAT_COLUMNS:
+        current = next((c for c in insp.get_columns(table) if c["name"] == column), None)
+        if current is None or not str(current["type"].compile(dialect=engine.dialect)).startswith(legacy):
+            continue
+        with engine.begin() as conn:
+            # fail fast instead of queueing behind long transactions
+            conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+            # the app writes naive UTC; with the session in UTC, timestamptz ->
+            # timestamp needs no table rewrite (PG 12+), nor does widening varchar
+            conn.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {target}"))
+            if column == "created_at":
+                # the models set created_at client-side (utcnow)
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT"))
+        logger.info("%s.%s: %s -> %s", table, column, current["type"], target)
+
+
+def _006_task_search(engine: Engine, opts: Options) -> None:
+    from .search import FTS_TABLE, PG_DOCUMENT
+
+    if _is_pg(engine):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_search ON tasks USING gin ({PG_DOCUMENT})"))
+            try:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            except Exception:
+                # managed roles may not create extensions; search still works without it
+                logger.warning("pg_trgm unavailable; skipping ix_tasks_title_trgm")
+                return
+            conn.execute(text(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_title_trgm ON tasks USING gin (title gin_trgm_ops)"
+            ))
+        return
+    if engine.dialect.name != "sqlite":
+        return  # app/search.py falls back to ILIKE
+
+    owner = "'u' || hex({row}.user_id)"
+    values = "{row}.id, " + owner + ", {row}.title, coalesce({row}.description, '')"
+    insert = f"INSERT INTO {FTS_TABLE}(rowid, owner, title, description) VALUES (" + values.format(row="new") + ");"
+    # contentless table: a delete must repeat exactly what was indexed
+    delete = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, owner, title, description) VALUES ('delete', "
+        + values.format(row="old") + ");"
+    )
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            # prefix index: the last query word matches as a prefix (search-as-you-type)
+            "owner, title, description, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN {insert} END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN {delete} END"))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF user_id, title, description ON tasks "
+            f"BEGIN {delete} {insert} END"
+        ))
+    # rows written since the triggers went in are already indexed; skip them
+    _in_batches(
+        engine,
+        "tasks",
+        f"INSERT INTO {FTS_TABLE}(rowid, owner, title, description) "
+        f"SELECT t.id, 'u' || hex(t.user_id), t.title, coalesce(t.description, '') FROM tasks t "
+        f"WHERE t.id > :lo AND t.id <= :hi "
+        f"AND t.id NOT IN (SELECT rowid FROM {FTS_TABLE} WHERE rowid > :lo AND rowid <= :hi)",
+        opts,
+    )
+
+
+def _007_outbox_lease(engine: Engine, opts: Options) -> None:
+    cols = _columns(engine, "outbox_checkpoints")
+    with engine.begin() as conn:
+        if "owner" not in cols:
+            conn.execute(text("ALTER TABLE outbox_checkpoints ADD COLUMN owner VARCHAR"))
+        if "lease_until" not in cols:
+            conn.execute(text("ALTER TABLE outbox_checkpoints ADD COLUMN lease_until TIMESTAMP"))
+
+
+def _008_task_versions(engine: Engine, opts: Options) -> None:
+    from .models import TaskVersion
+
+    TaskVersion.__table__.create(bind=engine, checkfirst=True)
+
+
+STEPS: List[Step] = [
+    Step("001", "base tables", _001_base),
+    Step("002", "task composite indexes", _002_task_indexes),
+    Step("003", "chat composite indexes", _003_chat_indexes),
+    Step("004", "conversation updated_at / message_count", _004_conversation_columns),
+    Step("005", "normalize legacy chat column types", _005_legacy_chat_types),
+    Step("006", "task full-text search", _006_task_search),
+    Step("007", "outbox relay lease", _007_outbox_lease),
+    Step("008", "task versions", _008_task_versions),
+]
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+def _ensure_table(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(32) PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine: Engine = default_engine) -> List[str]:
+    """Recorded versions; [] if the DB was never migrated. One query, no reflection."""
+    try:
+        with engine.connect() as conn:
+            return [r[0] for r in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+    except Exception:
+        return []
+
+
+def pending(engine: Engine = default_engine) -> List[Step]:
+    done = set(applied_versions(engine))
+    return [s for s in STEPS if s.version not in done]
+
+
+def migrate(engine: Engine = default_engine, opts: Optional[Options] = None) -> List[str]:
+    """Apply pending steps in order; returns the versions applied."""
+    opts = opts or Options()
+    _ensure_table(engine)
+    applied: List[str] = []
+    for step in pending(engine):
+        start = time.perf_counter()
+        step.apply(engine, opts)
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": step.version, "d": step.description, "t": datetime.utcnow()},
+            )
+        logger.info("migration %s (%s) applied in %.2fs", step.version, step.description, time.perf_counter() - start)
+        applied.append(step.version)
+    return applied
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="list applied and pending steps, change nothing")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per backfill transaction")
+    parser.add_argument("--pause-ms", type=float, default=0.0, help="sleep between backfill batches")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.status:
+        done = set(applied_versions())
+        for s in STEPS:
+            print(f"{s.version}  {'applied' if s.version in done else 'pending':8} {s.description}")
+        return
+
+    applied = migrate(opts=Options(batch_size=args.batch_size, pause=args.pause_ms / 1000.0))
+    print(f"applied: {', '.join(applied) if applied else 'nothing (up to date)'}")
+
+
+if __name__ == "__main__":
+    main()
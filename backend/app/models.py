@@ -3,10 +3,12 @@ from __future__ import annotations
 from datetime import datetime
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -24,6 +26,7 @@ class Task(Base):
 
     id = Column(Integer, primary_key=True, index=True)
 
+    # kept alongside the composites: serves status="all" ORDER BY id
     user_id = Column(String, index=True, nullable=False)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
@@ -45,16 +48,104 @@ class Task(Base):
         nullable=False,
     )
 
+    __table_args__ = (
+        # list / keyset pages: WHERE user_id [AND completed] [AND id < ?] ORDER BY id DESC
+        Index("ix_tasks_user_completed_id", "user_id", "completed", "id"),
+        # due-date views and reminders: WHERE user_id ORDER BY due_date
+        Index("ix_tasks_user_due_date", "user_id", "due_date"),
+        # ids are cursors (after_id) and client-side keys: SQLite must not hand
+        # a deleted newest id out again (Postgres sequences never do)
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TaskVersion(Base):
+    """Per-user change counter, bumped in the same transaction as every task write.
+
+    Replicas compare it to the version their cache was loaded at, and it is
+    the list ETag, so every replica hands out the same tag for the same rows.
+    """
+
+    __tablename__ = "task_versions"
+
+    user_id = Column(String, primary_key=True)
+    version = Column(BigInteger, default=0, nullable=False)
+
+
+# -------------------------
+# Outbox (task events -> Dapr/Kafka)
+# -------------------------
+# Rows are written in the same transaction as the Task change they describe;
+# app/outbox.py relays them in id order (per user) and marks them published.
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True)
+
+    # idempotency key: sent as the bulk entryId and event id, stable across retries
+    event_key = Column(String(64), unique=True, nullable=False)
+
+    topic = Column(String, nullable=False)
+    event_type = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+    task_id = Column(Integer, nullable=True)
+    payload = Column(Text, nullable=False)  # JSON
+
+    created_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        nullable=False,
+    )
+    published_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+
+    # dead letter: set once the relay gives up (OUTBOX_MAX_ATTEMPTS rejections);
+    # the relay skips these rows. Clear failed_at to requeue.
+    failed_at = Column(DateTime, nullable=True)
+    last_error = Column(String(500), nullable=True)
+
+    __table_args__ = (
+        # the relay only ever scans unpublished rows, oldest first
+        Index(
+            "ix_outbox_unpublished",
+            "id",
+            postgresql_where=published_at.is_(None),
+            sqlite_where=published_at.is_(None),
+        ),
+    )
+
+
+class OutboxCheckpoint(Base):
+    __tablename__ = "outbox_checkpoints"
+
+    name = Column(String, primary_key=True)  # relay name
+    last_event_id = Column(Integer, default=0, nullable=False)
+    published_total = Column(Integer, default=0, nullable=False)
+
+    # relay lease: with several replicas only the holder relays (and writes
+    # this row); the others take over once lease_until has passed
+    owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    updated_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False,
+    )
+
 
 # -------------------------
 # Conversation Model
 # -------------------------
+# The one chat schema (app/chat_history.py and app/conversation_store.py both
+# use it). Existing databases are brought here by `python -m app.migrate`.
 class Conversation(Base):
     __tablename__ = "conversations"
 
     id = Column(Integer, primary_key=True, index=True)
 
-    user_id = Column(String, index=True, nullable=False)
+    # indexed through ix_conversations_user_id_id below
+    user_id = Column(String, nullable=False)
 
     created_at = Column(
         DateTime,
@@ -68,11 +159,25 @@ class Conversation(Base):
         nullable=False,
     )
 
+    # optional counter (CHAT_MESSAGE_COUNTER=1), kept by app.message_writer;
+    # lets "how long is this chat" skip a COUNT(*) over messages
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
+
+    # loaded only on access: fetching a conversation must not pull every
+    # message body; history reads go through conversation_store.load_history.
+    # Deletes cascade in the database (ON DELETE CASCADE), not by loading rows.
     messages = relationship(
         "Message",
         back_populates="conversation",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="select",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # latest conversation per user: WHERE user_id = ? ORDER BY id DESC LIMIT 1
+        # (covering for the id lookup: answered from the index alone)
+        Index("ix_conversations_user_id_id", "user_id", "id"),
     )
 
 
@@ -103,3 +208,14 @@ class Message(Base):
         "Conversation",
         back_populates="messages",
     )
+
+    __table_args__ = (
+        # last N of a conversation: WHERE conversation_id = ? ORDER BY id DESC LIMIT N
+        # (role rides along in Postgres so counting/role scans stay index-only)
+        Index(
+            "ix_messages_conversation_id_id",
+            "conversation_id",
+            "id",
+            postgresql_include=["role"],
+        ),
+    )
@@ -0,0 +1,403 @@
+"""
+Transactional outbox for task events (Dapr / Kafka)
+
+- add_event(db, ...) stages an OutboxEvent in the caller's session, so it is
+  committed in the SAME transaction as the Task change (no lost events)
+- OutboxRelay (started in the app lifespan) drains unpublished rows in id
+  order, sends them with Dapr bulk publish to the kafka-pubsub component,
+  then marks them published and advances its checkpoint in one transaction
+- ordering is per user: bulk publish is not atomic, so no call carries
+  two unsent events of one user. A batch goes out in rounds, each offering
+  every user their next event; a rejected event holds back that user's
+  later events (never sent before it), other users' events go out. Calls
+  per batch = the longest per-user run in it
+- an event rejected OUTBOX_MAX_ATTEMPTS times is dead-lettered (failed_at +
+  last_error set) and stops blocking its user from the next batch; requeue
+  it by clearing failed_at. Rejections only count when the batch got other
+  events accepted: a sidecar or broker outage rejects everything and must
+  not dead-letter the backlog
+- with several replicas only one relays: the relay's checkpoint row doubles
+  as a lease (owner + lease_until, OUTBOX_LEASE_SECONDS), taken with one
+  conditional UPDATE and renewed at half-life; the others stand by, asking
+  at most once per lease period, and take over when it lapses (a crashed
+  pod) or is released (stop()). So rows are
+  never relayed by two pods at once and per-user order holds. Replica
+  clocks must agree to within a fraction of the lease (NTP)
+- delivery is at-least-once; event_key is the idempotency key consumers
+  dedupe on (sent as the bulk entryId and as the event "id")
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .dapr_publish import DAPR_HTTP_PORT, PUBSUB_NAME, TOPIC_NAME, bulk_publish
+from .db import SessionLocal
+from .models import OutboxCheckpoint, OutboxEvent, Task
+
+logger = logging.getLogger(__name__)
+
+# (outbox id, event_key, topic, user_id, attempts, event)
+Row = Tuple[int, str, str, str, int, Dict[str, Any]]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def task_payload(t: Task) -> Dict[str, Any]:
+    return {
+        "id": t.id,
+        "user_id": t.user_id,
+        "title": t.title,
+        "description": t.description,
+        "completed": bool(t.completed),
+        "due_date": t.due_date.isoformat() if t.due_date else None,
+    }
+
+
+def add_event(db: Session, event_type: str, task: Task, topic: str = TOPIC_NAME) -> OutboxEvent:
+    """Stage an event for `task` in the current transaction; the caller commits."""
+    if task.id is None:
+        db.flush()  # new task: get its id before we snapshot it
+    ev = OutboxEvent(
+        event_key=uuid.uuid4().hex,
+        topic=topic,
+        event_type=event_type,
+        user_id=task.user_id,
+        task_id=task.id,
+        payload=json.dumps(task_payload(task)),
+    )
+    db.add(ev)
+    return ev
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        base_url: Optional[str] = None,
+        pubsub: str = PUBSUB_NAME,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        name: str = "dapr",
+    ) -> None:
+        self.session_factory = session_factory
+        self.base_url = base_url or f"http://localhost:{DAPR_HTTP_PORT}"
+        self.pubsub = pubsub
+        self.batch_size = batch_size or int(_env_float("OUTBOX_BATCH_SIZE", 200))
+        self.poll_interval = poll_interval or _env_float("OUTBOX_POLL_INTERVAL", 1.0)
+        self.retention = timedelta(hours=_env_float("OUTBOX_RETENTION_HOURS", 24))
+        self.max_attempts = max(1, int(_env_float("OUTBOX_MAX_ATTEMPTS", 10)))
+        self.lease = max(1.0, _env_float("OUTBOX_LEASE_SECONDS", 15.0))
+        self.name = name
+        # pod name + a per-process suffix (a restarted pod must not inherit its old lease)
+        self.owner = f"{os.getenv('HOSTNAME') or 'relay'}-{uuid.uuid4().hex[:8]}"
+        self._lease_renew_at = 0.0  # monotonic; 0 = we do not hold the lease
+        self._lease_retry_at = 0.0  # monotonic; standby does not ask again before this
+
+        self.published = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.batches = 0
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        # checked every cycle as well: on 3.11 wait_for() can swallow the
+        # cancel from stop() when a notify() lands at the same moment
+        self._stopping = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ---- database (sync; run in a worker thread) ----
+
+    def _acquire(self) -> bool:
+        """Take or renew the lease (one conditional UPDATE); True if this relay holds it."""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            until = now + timedelta(seconds=self.lease)
+            taken = (
+                db.query(OutboxCheckpoint)
+                .filter(
+                    OutboxCheckpoint.name == self.name,
+                    or_(
+                        OutboxCheckpoint.owner == self.owner,
+                        OutboxCheckpoint.owner.is_(None),
+                        OutboxCheckpoint.lease_until.is_(None),
+                        OutboxCheckpoint.lease_until < now,
+                    ),
+                )
+                .update({OutboxCheckpoint.owner: self.owner, OutboxCheckpoint.lease_until: until}, synchronize_session=False)
+            )
+            if not taken and db.get(OutboxCheckpoint, self.name) is None:
+                # first relay ever: the row is the lease; a concurrent insert loses on the primary key
+                db.add(OutboxCheckpoint(
+                    name=self.name, last_event_id=0, published_total=0, owner=self.owner, lease_until=until,
+                ))
+                taken = 1
+            db.commit()
+            return bool(taken)
+        except IntegrityError:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def _release(self) -> None:
+        db = self.session_factory()
+        try:
+            db.query(OutboxCheckpoint).filter(
+                OutboxCheckpoint.name == self.name, OutboxCheckpoint.owner == self.owner
+            ).update({OutboxCheckpoint.lease_until: None}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _hold_lease(self) -> bool:
+        started = time.monotonic()
+        if self._lease_renew_at and started < self._lease_renew_at:
+            return True
+        if started < self._lease_retry_at:
+            return False  # standby: notify() fires on every commit, the lease row is asked once per period
+        if await asyncio.to_thread(self._acquire):
+            self._lease_renew_at = started + self.lease / 2
+            self._lease_retry_at = 0.0
+            return True
+        self._lease_renew_at = 0.0
+        self._lease_retry_at = started + self.lease
+        return False
+
+    def _fetch(self) -> List[Row]:
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(OutboxEvent.id, OutboxEvent.event_key, OutboxEvent.topic, OutboxEvent.event_type,
+                         OutboxEvent.user_id, OutboxEvent.attempts, OutboxEvent.payload, OutboxEvent.created_at)
+                .filter(OutboxEvent.published_at.is_(None), OutboxEvent.failed_at.is_(None))
+                .order_by(OutboxEvent.id.asc())
+                .limit(self.batch_size)
+                .all()
+            )
+            out = []
+            for r in rows:
+                event = {
+                    "id": r.event_key,
+                    "event_type": r.event_type,
+                    "task": json.loads(r.payload),
+                    "outbox_id": r.id,
+                    "created_at": r.created_at.isoformat() if r.created_at else None,
+                }
+                out.append((r.id, r.event_key, r.topic, r.user_id, r.attempts or 0, event))
+            return out
+        finally:
+            db.close()
+
+    def _checkpoint(
+        self, published_ids: List[int], failed: Dict[int, str], counted: List[int], dead_ids: List[int]
+    ) -> None:
+        """
+        `failed`: rejected id -> reason; `counted`: the rejections that count
+        as an attempt (not an outage); `dead_ids`: rejected for the last time.
+        """
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            if published_ids:
+                db.query(OutboxEvent).filter(OutboxEvent.id.in_(published_ids)).update(
+                    {OutboxEvent.published_at: now, OutboxEvent.attempts: OutboxEvent.attempts + 1},
+                    synchronize_session=False,
+                )
+                cp = db.get(OutboxCheckpoint, self.name)
+                if cp is None:
+                    cp = OutboxCheckpoint(name=self.name, last_event_id=0, published_total=0, owner=self.owner)
+                    db.add(cp)
+                if cp.owner in (None, self.owner):  # lost the lease mid-batch: the new holder keeps the counts
+                    cp.last_event_id = max(cp.last_event_id or 0, max(published_ids))
+                    cp.published_total = (cp.published_total or 0) + len(published_ids)
+            # one UPDATE per (reason, counted, dead): an outage is one statement, not one per row
+            groups: Dict[Tuple[str, bool, bool], List[int]] = {}
+            counted_set, dead_set = set(counted), set(dead_ids)
+            for event_id, reason in failed.items():
+                group = (reason[:500], event_id in counted_set, event_id in dead_set)
+                groups.setdefault(group, []).append(event_id)
+            for (reason, bump, dead), ids in groups.items():
+                values: Dict[Any, Any] = {OutboxEvent.last_error: reason}
+                if bump:
+                    values[OutboxEvent.attempts] = OutboxEvent.attempts + 1
+                if dead:
+                    values[OutboxEvent.failed_at] = now
+                db.query(OutboxEvent).filter(OutboxEvent.id.in_(ids)).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _purge(self) -> int:
+        db = self.session_factory()
+        try:
+            cutoff = datetime.utcnow() - self.retention
+            n = (
+                db.query(OutboxEvent)
+                .filter(OutboxEvent.published_at.isnot(None), OutboxEvent.published_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            return n
+        finally:
+            db.close()
+
+    # ---- relay ----
+
+    async def run_once(self) -> int:
+        """Relay one batch, in order per user; returns how many events were published (0 on standby)."""
+        if not await self._hold_lease():
+            return 0
+        rows = await asyncio.to_thread(self._fetch)
+        if not rows:
+            return 0
+
+        # rounds: each offers every unblocked (topic, user) its next event, one
+        # bulk call per topic. A rejected event drops its user from the rest of
+        # the batch, so nothing after it is sent before it is delivered.
+        queues: Dict[Tuple[str, str], Deque[Row]] = {}
+        for row in rows:
+            queues.setdefault((row[2], row[3]), deque()).append(row)
+        errors: Dict[str, str] = {}
+        published_ids: List[int] = []
+        rejected: List[Row] = []
+        assert self._client is not None
+        while queues:
+            heads: Dict[str, List[Row]] = {}
+            for (topic, _user), queue in queues.items():
+                heads.setdefault(topic, []).append(queue.popleft())
+            for topic, offered in heads.items():
+                failed_keys = await bulk_publish(self._client, [r[5] for r in offered], self.pubsub, topic, errors)
+                for row in offered:
+                    owner = (row[2], row[3])
+                    if row[1] in failed_keys:
+                        rejected.append(row)
+                        del queues[owner]
+                    else:
+                        published_ids.append(row[0])
+                        if not queues[owner]:
+                            del queues[owner]
+
+        # nothing accepted at all: the sidecar or broker is down, not these events
+        outage = not published_ids
+        failed: Dict[int, str] = {}
+        counted: List[int] = []
+        dead_ids: List[int] = []
+        for event_id, key, _topic, _user, attempts, _event in rejected:
+            failed[event_id] = errors.get(key) or "rejected"
+            if outage:
+                continue
+            counted.append(event_id)
+            if attempts + 1 >= self.max_attempts:
+                dead_ids.append(event_id)
+                logger.error(
+                    "outbox event %s (%s) dead-lettered after %d attempts: %s",
+                    event_id, key, attempts + 1, failed[event_id],
+                )
+
+        await asyncio.to_thread(self._checkpoint, published_ids, failed, counted, dead_ids)
+        self.batches += 1
+        self.published += len(published_ids)
+        self.failed += len(failed)
+        self.dead_lettered += len(dead_ids)
+        return len(published_ids)
+
+    async def _run(self) -> None:
+        assert self._wake is not None
+        backoff = self.poll_interval
+        cycles = 0
+        while not self._stopping:
+            try:
+                failed_before = self.failed
+                n = await self.run_once()
+                if n == 0 and self.failed > failed_before:
+                    backoff = min(backoff * 2, 30.0)  # sidecar rejecting: slow down
+                else:
+                    backoff = self.poll_interval
+                cycles += 1
+                if cycles % 600 == 0 and self._lease_renew_at:  # leader only
+                    await asyncio.to_thread(self._purge)
+                if n >= self.batch_size:
+                    continue  # more waiting: drain without sleeping
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # DB or sidecar trouble: back off, never crash the app
+                logger.warning("outbox relay error: %s", type(exc).__name__)
+                backoff = min(backoff * 2, 30.0)
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+
+    def notify(self) -> None:
+        """Thread-safe nudge after a commit, so events go out without waiting for the poll."""
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None:
+            loop.call_soon_threadsafe(wake.set)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(5.0),
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+        )
+        self._task = asyncio.create_task(self._run(), name=f"outbox-relay-{self.name}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping = True
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lease_renew_at:
+            self._lease_renew_at = 0.0
+            try:
+                await asyncio.to_thread(self._release)  # hand over now, not when the lease lapses
+            except Exception as exc:
+                logger.warning("outbox relay lease release failed: %s", type(exc).__name__)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "published": self.published,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "batches": self.batches,
+            "leader": int(bool(self._lease_renew_at)),
+        }
+
+
+relay = OutboxRelay()
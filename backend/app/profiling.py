@@ -0,0 +1,479 @@
+"""
+Phase 5 - On-demand CPU and memory profiling for a live pod
+
+- everything here is off until ADMIN_TOKEN is set; the endpoints
+  (app/routers/profiling.py) and the X-Profile header both need it
+- CPU: a sampling profiler (a thread reading sys._current_frames() every
+  PROFILE_INTERVAL_MS), output in the collapsed-stack format that
+  flamegraph.pl / speedscope / inferno read ("a;b;c 12" per line)
+  - per request: ProfilingMiddleware samples the event-loop thread while a
+    request runs, when it carries "X-Profile: 1" + the admin token, or at
+    random with PROFILE_SAMPLE_RATE (0..1, default 0); the response gets an
+    X-Profile-Id header, the profile is kept in a small ring buffer
+  - whole process: profile_threads(seconds) samples every thread, skipping
+    threads that are only waiting
+  - the loop thread runs every in-flight request, so under concurrency a
+    request profile also shows its neighbours
+- memory: tracemalloc snapshots and diffs; each allocation is attributed
+  to a component by the innermost frame in its traceback that belongs to
+  one (chat history stores, task dicts, SQLAlchemy identity maps, reply
+  cache), next to live counts from the components themselves
+- tracing starts on demand (POST .../memory/start) or from boot with
+  Python's own PYTHONTRACEMALLOC=<frames>; it costs CPU and memory while on
+"""
+
+from __future__ import annotations
+
+import collections
+import hmac
+import itertools
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+PROFILE_INTERVAL = max(1, _env_int("PROFILE_INTERVAL_MS", 5)) / 1000.0
+PROFILE_SAMPLE_RATE = min(1.0, max(0.0, _env_float("PROFILE_SAMPLE_RATE", 0.0)))
+PROFILE_KEEP = _env_int("PROFILE_KEEP", 50)
+MAX_SNAPSHOTS = _env_int("PROFILE_MAX_SNAPSHOTS", 4)
+TRACEMALLOC_FRAMES = _env_int("TRACEMALLOC_FRAMES", 10)  # writes run ~4x slower at 25
+
+# innermost matching frame wins, so ORM objects loaded for the repository
+# count as SQLAlchemy and task dicts built from them count as task store
+COMPONENTS: Dict[str, Tuple[str, ...]] = {
+    "chat_history": ("app/agents/store.py", "app/state.py", "app/agents/memory.py"),
+    "task_store": ("app/tools/tasks.py", "app/repository.py"),
+    "sqlalchemy_identity_map": ("sqlalchemy/orm/",),
+    "reply_cache": ("app/reply_cache.py",),
+}
+
+# leaf frames of a thread that is only waiting (not worth a sample)
+_IDLE_LEAVES = (
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("asyncio/runners.py", "run"),
+    ("concurrent/futures/thread.py", "_worker"),
+)
+
+
+_STDLIB = re.compile(r"/lib/python3\.\d+/")
+
+
+def admin_ok(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+# -----------------------------
+# CPU: stack sampling
+# -----------------------------
+
+
+def _short(path: str) -> str:
+    path = path.replace("\\", "/")
+    if "/site-packages/" in path:
+        return path.split("/site-packages/", 1)[1]
+    stdlib = _STDLIB.search(path)
+    if stdlib:
+        return path[stdlib.end():]
+    cwd = os.getcwd().replace("\\", "/") + "/"
+    return path[len(cwd):] if path.startswith(cwd) else path
+
+
+def _frame_name(code: Any, names: Dict[Any, str]) -> str:
+    name = names.get(code)
+    if name is None:
+        name = names[code] = f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})"
+    return name
+
+
+def _stack(frame: Any, names: Dict[Any, str]) -> List[str]:
+    out: List[str] = []
+    while frame is not None:
+        out.append(_frame_name(frame.f_code, names))
+        frame = frame.f_back
+    out.reverse()  # root first, as flamegraphs want
+    return out
+
+
+def _idle(frame: Any) -> bool:
+    path = frame.f_code.co_filename.replace("\\", "/")
+    return any(path.endswith(f) and frame.f_code.co_name == fn for f, fn in _IDLE_LEAVES)
+
+
+class StackSampler:
+    """Samples one thread (or all) on a background thread; counts collapsed stacks."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL, exclude: Sequence[int] = ()) -> None:
+        self.thread_id = thread_id  # None = every thread except this sampler and `exclude`
+        self.interval = interval
+        self.exclude = set(exclude)
+        self.counts: "collections.Counter[str]" = collections.Counter()
+        self.samples = 0
+        self._names: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def _take(self) -> None:
+        frames = sys._current_frames()
+        if self.thread_id is not None:
+            targets = [(self.thread_id, frames.get(self.thread_id))]
+        else:
+            skip = self.exclude | {threading.get_ident()}
+            names = {t.ident: t.name for t in threading.enumerate()}
+            targets = [(ident, f) for ident, f in frames.items() if ident not in skip and not _idle(f)]
+        for ident, frame in targets:
+            if frame is None:
+                continue
+            stack = _stack(frame, self._names)
+            if self.thread_id is None:
+                stack.insert(0, f"thread:{names.get(ident, ident)}")
+            self.counts[";".join(stack)] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._take()
+
+    def start(self) -> "StackSampler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common())
+
+
+class Profile:
+    __slots__ = ("id", "method", "path", "status", "seconds", "samples", "collapsed", "created")
+
+    def __init__(self, id: str, method: str, path: str) -> None:
+        self.id = id
+        self.method = method
+        self.path = path
+        self.status = 0
+        self.seconds = 0.0
+        self.samples = 0
+        self.collapsed = ""
+        self.created = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "seconds": round(self.seconds, 4),
+            "samples": self.samples,
+            "created": self.created,
+        }
+
+
+class ProfileStore:
+    """The last PROFILE_KEEP request profiles."""
+
+    def __init__(self, keep: int = PROFILE_KEEP) -> None:
+        self._items: Deque[Profile] = collections.deque(maxlen=max(1, keep))
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_id(self) -> str:
+        return f"p{next(self._ids)}-{int(time.time())}"
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._items.append(profile)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((p for p in self._items if p.id == profile_id), None)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [p.summary() for p in reversed(self._items)]
+
+
+profiles = ProfileStore()
+
+
+def profile_threads(seconds: float, interval: float = PROFILE_INTERVAL) -> Tuple[str, int]:
+    """Blocking: sample every busy thread for `seconds`; (collapsed stacks, samples). Run it off the loop."""
+    sampler = StackSampler(thread_id=None, interval=interval, exclude=[threading.get_ident()]).start()
+    time.sleep(seconds)
+    sampler.stop()
+    return sampler.collapsed(), sampler.samples
+
+
+class ProfilingMiddleware:
+    """Pure ASGI; with ADMIN_TOKEN unset and no sample rate it is a single branch per request."""
+
+    def __init__(self, app: Any, sample_rate: float = PROFILE_SAMPLE_RATE, skip_prefix: str = "/admin/") -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.skip_prefix = skip_prefix
+
+    def _wanted(self, scope: Dict[str, Any]) -> bool:
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_prefix):
+            return False
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if not ADMIN_TOKEN:
+            return False
+        headers = dict(scope.get("headers") or ())
+        if headers.get(PROFILE_HEADER.encode()) not in (b"1", b"true", b"on"):
+            return False
+        token = headers.get(ADMIN_TOKEN_HEADER.lower().encode())
+        return admin_ok(token.decode("latin-1") if token is not None else None)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if not (self.sample_rate or ADMIN_TOKEN) or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(profiles.new_id(), scope["method"], scope["path"])
+
+        async def _send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((PROFILE_ID_HEADER.lower().encode(), profile.id.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        sampler = StackSampler(thread_id=threading.get_ident()).start()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            sampler.stop()
+            profile.seconds = sampler.elapsed
+            profile.samples = sampler.samples
+            profile.collapsed = sampler.collapsed()
+            profiles.add(profile)
+
+
+# -----------------------------
+# Memory: tracemalloc snapshots
+# -----------------------------
+
+class _Summary:
+    """One pass over a snapshot's traces: bytes/blocks per component and per allocating line."""
+
+    __slots__ = ("components", "lines", "total")
+
+    def __init__(self, snapshot: tracemalloc.Snapshot) -> None:
+        # tracing is still on while this runs, and every new int or list is
+        # traced with its whole stack: collect the existing size objects in
+        # lists and let sum() add them up in C at the end
+        by_component: Dict[str, List[int]] = {name: [] for name in list(COMPONENTS) + ["other"]}
+        by_line: Dict[Tuple[str, int], List[int]] = {}
+        owner: Dict[str, Optional[str]] = {}  # filename -> component, memoised
+        seen: Dict[Tuple[Any, ...], Optional[str]] = {}  # traceback -> component (None: skipped)
+        for trace in _raw_traces(snapshot):
+            frames = trace[2]  # (domain, size, frames newest first, ...)
+            component = seen.get(frames, "")
+            if component == "":
+                component = seen[frames] = _classify(frames, owner)
+            if component is None:
+                continue
+            by_component[component].append(trace[1])
+            if frames:
+                sizes = by_line.get(frames[0])
+                if sizes is None:
+                    sizes = by_line[frames[0]] = []
+                sizes.append(trace[1])
+        self.components = {name: (sum(sizes), len(sizes)) for name, sizes in by_component.items()}
+        self.lines = {key: (sum(sizes), len(sizes)) for key, sizes in by_line.items()}
+        self.total = sum(b for b, _n in self.components.values())
+
+    def component_dict(self) -> Dict[str, Dict[str, int]]:
+        return {name: {"bytes": b, "blocks": n} for name, (b, n) in self.components.items()}
+
+
+# allocations made by tracemalloc / the import system are noise here
+_SKIP_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+
+def _classify(frames: Sequence[Tuple[str, int]], owner: Dict[str, Optional[str]]) -> Optional[str]:
+    if frames and frames[0][0] in _SKIP_FILES:
+        return None
+    for filename, _lineno in frames:
+        if filename not in owner:
+            owner[filename] = _owner(filename)
+        hit = owner[filename]
+        if hit is not None:
+            return hit
+    return "other"
+
+
+def _owner(filename: str) -> Optional[str]:
+    path = filename.replace("\\", "/")
+    for name, patterns in COMPONENTS.items():
+        if any(p in path for p in patterns):
+            return name
+    return None
+
+
+def _raw_traces(snapshot: tracemalloc.Snapshot) -> Sequence[Tuple[Any, ...]]:
+    # Snapshot.statistics() builds a Traceback object per trace and is far
+    # too slow on a big heap (with tracing still on); read the raw tuples
+    raw = getattr(snapshot.traces, "_traces", None)
+    if raw is not None:
+        return raw
+    return [(t.domain, t.size, tuple((f.filename, f.lineno) for f in reversed(t.traceback))) for t in snapshot.traces]
+
+
+def _where(key: Tuple[str, int]) -> str:
+    return f"{_short(key[0])}:{key[1]}"
+
+
+def sqlalchemy_sessions() -> Dict[str, int]:
+    """Live ORM sessions and the objects held in their identity maps."""
+    # no import here: importing the ORM under tracemalloc takes seconds, and
+    # if it is not loaded there are no sessions to count
+    module = sys.modules.get("sqlalchemy.orm.session")
+    registry = getattr(module, "_sessions", None)  # private; absent in some SQLAlchemy versions
+    if registry is None:
+        return {}
+    sessions = list(registry.values())
+    return {"sessions": len(sessions), "identity_map_objects": sum(len(s.identity_map) for s in sessions)}
+
+
+class MemoryProfiler:
+    def __init__(self, max_snapshots: int = MAX_SNAPSHOTS) -> None:
+        self.max_snapshots = max(1, max_snapshots)
+        # only the summaries are kept: a raw snapshot can be as big as the heap it describes
+        self._snapshots: "collections.OrderedDict[str, Tuple[float, _Summary]]" = collections.OrderedDict()
+        self._ids = itertools.count(1)
+        self._live: Dict[str, Callable[[], Mapping[str, Any]]] = {"sqlalchemy": sqlalchemy_sessions}
+        self._lock = threading.Lock()
+
+    def track(self, name: str, stats: Callable[[], Mapping[str, Any]]) -> None:
+        """Live counts reported next to every snapshot (e.g. chat_history.stats)."""
+        self._live[name] = stats
+
+    def live(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for name, stats in self._live.items():
+            try:
+                out[name] = {k: v for k, v in stats().items() if isinstance(v, (int, float, str, bool))}
+            except Exception as exc:
+                out[name] = {"error": type(exc).__name__}
+        return out
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = TRACEMALLOC_FRAMES) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+
+    def stop(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        with self._lock:
+            snaps = [{"id": sid, "taken": taken} for sid, (taken, _s) in self._snapshots.items()]
+        return {
+            "tracing": self.tracing,
+            "frames": tracemalloc.get_traceback_limit() if self.tracing else 0,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "snapshots": snaps,
+        }
+
+    def _take(self) -> tracemalloc.Snapshot:
+        if not self.tracing:
+            raise RuntimeError("tracemalloc is not running")
+        return tracemalloc.take_snapshot()
+
+    def snapshot(self, limit: int = 25) -> Dict[str, Any]:
+        """Blocking (one pass over every traced block): take and keep a snapshot, report where memory sits."""
+        summary = _Summary(self._take())
+        sid = f"s{next(self._ids)}"
+        with self._lock:
+            self._snapshots[sid] = (time.time(), summary)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        top = sorted(summary.lines.items(), key=lambda kv: kv[1][0], reverse=True)[: max(1, limit)]
+        return {
+            "id": sid,
+            "total_bytes": summary.total,
+            "components": summary.component_dict(),
+            "top": [{"where": _where(k), "bytes": b, "blocks": n} for k, (b, n) in top],
+            "live": self.live(),
+        }
+
+    def diff(self, base_id: str, target_id: Optional[str] = None, limit: int = 25) -> Dict[str, Any]:
+        """Growth from snapshot `base_id` to `target_id` (or to now); KeyError for an unknown id."""
+        with self._lock:
+            base = self._snapshots[base_id][1]
+            target = self._snapshots[target_id][1] if target_id else None
+        if target is None:
+            target = _Summary(self._take())
+        components = {
+            name: {
+                "bytes": b,
+                "bytes_diff": b - base.components[name][0],
+                "blocks_diff": n - base.components[name][1],
+            }
+            for name, (b, n) in target.components.items()
+        }
+        changes = []
+        for key in set(base.lines) | set(target.lines):
+            before, after = base.lines.get(key, (0, 0)), target.lines.get(key, (0, 0))
+            if after[0] != before[0]:
+                changes.append((abs(after[0] - before[0]), key, after[0] - before[0], after[1] - before[1], after[0]))
+        changes.sort(reverse=True)
+        growth = [
+            {"where": _where(key), "bytes_diff": d, "blocks_diff": nd, "bytes": b}
+            for _abs, key, d, nd, b in changes[: max(1, limit)]
+        ]
+        return {
+            "base": base_id,
+            "target": target_id or "now",
+            "total_bytes_diff": target.total - base.total,
+            "components": components,
+            "top": growth,
+            "live": self.live(),
+        }
+
+
+memory = MemoryProfiler()
@@ -0,0 +1,119 @@
+"""
+Phase 5 - Per-user cache of rendered read-only chat replies (list, stats, search)
+
+- entries are keyed by (command, arg) and tagged with the user's task
+  version (app/repository.tasks_repo.version); any add / complete / update /
+  delete bumps it, so a stale entry can never be served
+- a version is read BEFORE rendering: if a write lands mid-render the entry
+  is simply a miss next time, never a wrong hit
+- bounded: LRU over users with a byte budget (CHAT_REPLY_CACHE_MAX_BYTES)
+- stats(): hits / misses / evictions / users / bytes
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+Reply = Optional[str]  # None = the command rejected its argument (cached too)
+
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+class ReplyCache:
+    def __init__(self, max_bytes: Optional[int] = None, enabled: Optional[bool] = None) -> None:
+        self.max_bytes = max_bytes or _env_int("CHAT_REPLY_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+        if enabled is None:
+            enabled = os.getenv("CHAT_REPLY_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+        self.enabled = enabled
+
+        # user_id -> {(command, arg): (version, reply)}; LRU order, oldest first
+        self._users: "OrderedDict[str, Dict[Tuple[str, str], Tuple[int, Reply]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(key: Tuple[str, str], reply: Reply) -> int:
+        return _ENTRY_OVERHEAD_BYTES + len(key[0]) + len(key[1]) + len(reply or "")
+
+    def get_or_render(self, user_id: str, key: Tuple[str, str], version: int, render: Callable[[], Reply]) -> Reply:
+        if not self.enabled:
+            return render()
+        hit, reply = self._lookup(user_id, key, version)
+        if hit:
+            return reply
+        reply = render()  # outside the lock: formatting 5k tasks must not block other users
+        return self._store(user_id, key, version, reply)
+
+    async def get_or_render_async(
+        self, user_id: str, key: Tuple[str, str], version: int, render: Callable[[], Awaitable[Reply]]
+    ) -> Reply:
+        if not self.enabled:
+            return await render()
+        hit, reply = self._lookup(user_id, key, version)
+        if hit:
+            return reply
+        return self._store(user_id, key, version, await render())
+
+    def _lookup(self, user_id: str, key: Tuple[str, str], version: int) -> Tuple[bool, Reply]:
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is not None:
+                self._users.move_to_end(user_id)
+                hit = entries.get(key)
+                if hit is not None and hit[0] == version:
+                    self.hits += 1
+                    return True, hit[1]
+            self.misses += 1
+            return False, None
+
+    def _store(self, user_id: str, key: Tuple[str, str], version: int, reply: Reply) -> Reply:
+        with self._lock:
+            entries = self._users.setdefault(user_id, {})
+            self._users.move_to_end(user_id)
+            old = entries.get(key)
+            if old is not None:
+                if old[0] > version:
+                    return reply  # a newer render already landed
+                self._bytes -= self._size(key, old[1])
+            entries[key] = (version, reply)
+            self._bytes += self._size(key, reply)
+            # least-recently-used users first; the one being served is at the end
+            while self._bytes > self.max_bytes and len(self._users) > 1:
+                _victim, dropped = self._users.popitem(last=False)
+                self._bytes -= sum(self._size(k, v[1]) for k, v in dropped.items())
+                self.evictions += 1
+        return reply
+
+    def clear(self, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+                self._bytes = 0
+                return
+            dropped = self._users.pop(user_id, None)
+            if dropped:
+                self._bytes -= sum(self._size(k, v[1]) for k, v in dropped.items())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "users": len(self._users),
+                "bytes": self._bytes,
+            }
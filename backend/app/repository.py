@@ -0,0 +1,589 @@
+"""
+Phase 5 - Task repository: the one task API behind REST, chat, MCP tools and services
+
+- TASK_STORE=sql (default): the tasks table is the source of truth; every
+  write is one transaction (row change + outbox event, see app/outbox.py)
+  and the committed rows are then written through to an in-memory cache
+- the cache is the indexed per-user store in app/tools/tasks.py; a user's
+  rows are loaded on first access, after which list / get / title lookups /
+  search are served from memory
+- bounded by TASK_CACHE_MAX_TASKS cached tasks in total: least recently used
+  users are evicted whole and reload on their next read (a single user
+  larger than the bound still gets cached, alone)
+- every SQL write also bumps the user's row in task_versions inside the same
+  transaction. The cache remembers the version it holds, and a cached user
+  is re-checked against the DB at most every TASK_CACHE_MAX_AGE_MS (one
+  primary-key read) and reloaded if another replica moved it on. So a
+  replica that missed an invalidation is stale for at most that long. The
+  same version is the list ETag, identical on every replica
+- hits / misses / loads / evictions / revalidations in stats()
+- TASK_STORE=memory: the process-local store on its own (no DB, the old
+  behaviour; demos and the in-memory benchmarks); events go straight to
+  the Dapr publisher
+
+The cache lives in app/tools/tasks.py's module state, so there is one
+repository per process (tasks_repo below).
+Writes for one user are serialized (asyncio lock held across the SQL
+statement and the write-through), so the cache applies them in commit order.
+Code that changes the tasks table behind the repository's back bumps
+task_versions too (bump_version_stmt) or calls invalidate(user_id); the
+user is reloaded on their next read. With more than one replica every
+write is also announced on app/cache_bus.py so the other replicas drop
+their copy right away instead of at the next revalidation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Literal, Mapping, Optional, Tuple, Union
+
+from sqlalchemy import delete, select, update
+
+from app.cache_bus import cache_bus
+from app.dapr_publish import publish_task_event_nowait
+from app.db import async_session
+from app.models import Task as TaskRow
+from app.models import TaskVersion
+from app.outbox import add_event, relay, task_payload
+from app.search import load_stmt, order_by_ids, page_result, search_plan
+from app.tools import tasks as store
+from app.tools.tasks import STORE_EPOCH, ISODate, Task, TaskView
+
+logger = logging.getLogger(__name__)
+
+Status = Literal["all", "pending", "completed"]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+TASK_STORE = os.getenv("TASK_STORE", "sql").strip().lower()
+CACHE_MAX_TASKS = _env_int("TASK_CACHE_MAX_TASKS", 200_000)
+# how long a cached user is served before its task_versions row is re-read (0 = every read)
+CACHE_MAX_AGE_MS = _env_int("TASK_CACHE_MAX_AGE_MS", 2000)
+
+
+# -----------------------------
+# Shared SQL pieces
+# -----------------------------
+
+
+def unique_ids(task_ids: Iterable[int]) -> List[int]:
+    return list(dict.fromkeys(int(i) for i in task_ids))
+
+
+def parse_due_date(value: Optional[ISODate]) -> Optional[datetime]:
+    """ISO date / datetime (string or datetime) -> naive UTC datetime; ValueError if unreadable."""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        raw = str(value).strip()
+        if not raw:
+            return None
+        value = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        # the column is a naive timestamp (utcnow everywhere else)
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _clean(text: Optional[str]) -> Optional[str]:
+    return text.strip() if isinstance(text, str) else None
+
+
+def set_completed_stmt(user_id: str, task_ids: Optional[List[int]], completed: bool):
+    # one UPDATE ... RETURNING: only rows that actually change come back (and get events)
+    q = update(TaskRow).where(TaskRow.user_id == user_id, TaskRow.completed == (not completed))
+    if task_ids is not None:
+        q = q.where(TaskRow.id.in_(task_ids))
+    return q.values(completed=completed).returning(TaskRow)
+
+
+def delete_stmt(user_id: str, task_ids: Optional[List[int]], completed_only: bool = False):
+    q = delete(TaskRow).where(TaskRow.user_id == user_id)
+    if task_ids is not None:
+        q = q.where(TaskRow.id.in_(task_ids))
+    if completed_only:
+        q = q.where(TaskRow.completed == True)  # noqa: E712
+    return q.returning(TaskRow)
+
+
+def _toggle_stmt(user_id: str, task_id: int, completed: Optional[bool]):
+    # completed None => flip in SQL, so concurrent toggles never cancel out
+    value = ~TaskRow.completed if completed is None else bool(completed)
+    return (
+        update(TaskRow)
+        .where(TaskRow.user_id == user_id, TaskRow.id == task_id)
+        .values(completed=value)
+        .returning(TaskRow)
+    )
+
+
+def _edit_stmt(user_id: str, task_id: int, values: Dict[str, Any]):
+    return update(TaskRow).where(TaskRow.user_id == user_id, TaskRow.id == task_id).values(**values).returning(TaskRow)
+
+
+def bump_version_stmt(dialect: str, user_id: str):
+    """Upsert the user's task_versions row, returning the new version. Run it in the write's transaction."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    q = insert(TaskVersion).values(user_id=user_id, version=1)
+    return q.on_conflict_do_update(
+        index_elements=[TaskVersion.user_id], set_={"version": TaskVersion.version + 1}
+    ).returning(TaskVersion.version)
+
+
+def version_stmt(user_id: str):
+    return select(TaskVersion.version).where(TaskVersion.user_id == user_id)
+
+
+# bulk statements bypass the identity map; rows come straight from RETURNING
+BULK = {"synchronize_session": False}
+
+
+def _status_event(task: Task) -> str:
+    return "completed" if task["completed"] else "updated"
+
+
+# -----------------------------
+# Repository
+# -----------------------------
+
+
+class TaskRepository:
+    """
+    The task API every caller uses. This base class is the TASK_STORE=memory
+    backend: the in-memory store is the only copy. All methods are async so
+    the SQL backend can slot in underneath without touching callers.
+    Returned tasks are plain dicts (app/tools/tasks.Task).
+    """
+
+    name = "memory"
+
+    async def _ready(self, user_id: str) -> None:
+        """Make sure the user's tasks are in memory (nothing to do here)."""
+
+    # ---- reads ----
+
+    async def version(self, user_id: str) -> int:
+        """Equal versions mean identical task lists (reply cache, ETags)."""
+        await self._ready(user_id)
+        return store.task_version(user_id)
+
+    async def version_tag(self, user_id: str) -> str:
+        """version() as an ETag token; process-local versions restart, so the epoch goes in."""
+        return f"{STORE_EPOCH}-{await self.version(user_id)}"
+
+    async def list(self, user_id: str, status: Status = "all") -> TaskView:
+        await self._ready(user_id)
+        return store.list_tasks(user_id, status)
+
+    async def list_page(
+        self, user_id: str, status: Status = "all", limit: int = 50, after_id: Optional[int] = None
+    ) -> Tuple[List[Task], Optional[int]]:
+        await self._ready(user_id)
+        return store.list_tasks_page(user_id, status, limit, after_id)
+
+    async def get(self, user_id: str, task_id: int) -> Optional[Task]:
+        await self._ready(user_id)
+        return store.get_task(user_id, task_id)
+
+    async def find_by_title(self, user_id: str, title: str) -> Optional[Task]:
+        await self._ready(user_id)
+        return store.find_task_by_title(user_id, title)
+
+    async def suggest(self, user_id: str, title: str, limit: int = 3) -> List[Task]:
+        await self._ready(user_id)
+        return store.suggest_tasks(user_id, title, limit)
+
+    async def search(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[Task], int]:
+        await self._ready(user_id)
+        return store.search_tasks(user_id, query, limit, offset)
+
+    # ---- writes ----
+
+    def _publish(self, event_type: Union[str, Callable[[Task], str]], tasks: Iterable[Task]) -> None:
+        for t in tasks:
+            publish_task_event_nowait(event_type if isinstance(event_type, str) else event_type(t), t)
+
+    async def create(
+        self, user_id: str, title: str, description: Optional[str] = None, due_date: Optional[ISODate] = None
+    ) -> Task:
+        t = store.add_task(user_id, title, description, due_date)
+        self._publish("created", [t])
+        return t
+
+    async def create_many(self, user_id: str, items: Iterable[Mapping[str, Any]]) -> List[Task]:
+        """items: {"title", "description"?, "due_date"?} mappings."""
+        tasks = store.add_tasks(user_id, items)
+        self._publish("created", tasks)
+        return tasks
+
+    async def set_completed(self, user_id: str, task_id: int, completed: Optional[bool] = None) -> Optional[Task]:
+        """completed None => toggle."""
+        t = store.complete_task(user_id, task_id, completed)
+        if t is not None:
+            self._publish(_status_event, [t])
+        return t
+
+    async def set_completed_many(
+        self, user_id: str, task_ids: Optional[Iterable[int]] = None, completed: bool = True
+    ) -> List[Task]:
+        """task_ids=None: every task in the other state ("complete all pending"). Returns the changed tasks."""
+        changed = store.complete_tasks(user_id, task_ids, completed)
+        self._publish(_status_event, changed)
+        return changed
+
+    async def update(
+        self,
+        user_id: str,
+        task_id: int,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        due_date: Optional[ISODate] = None,
+    ) -> Optional[Task]:
+        t = store.update_task(user_id, task_id, title, description, due_date)
+        if t is not None:
+            self._publish("updated", [t])
+        return t
+
+    async def delete(self, user_id: str, task_id: int) -> Optional[Task]:
+        t = store.delete_task(user_id, task_id)
+        if t is not None:
+            self._publish("deleted", [t])
+        return t
+
+    async def delete_many(self, user_id: str, task_ids: Iterable[int]) -> List[Task]:
+        removed = store.delete_tasks(user_id, task_ids)
+        self._publish("deleted", removed)
+        return removed
+
+    async def clear_completed(self, user_id: str) -> List[Task]:
+        removed = store.clear_completed(user_id)
+        self._publish("deleted", removed)
+        return removed
+
+    # ---- cache control ----
+
+    def invalidate(self, user_id: str, broadcast: bool = True) -> None:
+        """The tasks table changed behind the repository's back (no-op: memory is the only copy)."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "users": store.loaded_users()}
+
+
+class SqlTaskRepository(TaskRepository):
+    """SQL source of truth + per-user write-through cache (TASK_STORE=sql)."""
+
+    name = "sql"
+
+    def __init__(self, max_tasks: int = CACHE_MAX_TASKS, max_age_ms: int = CACHE_MAX_AGE_MS) -> None:
+        self.max_tasks = max(1, max_tasks)
+        self.max_age = max(0, max_age_ms) / 1000
+        self._lru: "OrderedDict[str, int]" = OrderedDict()  # user -> cached task count, oldest first
+        self._cached_tasks = 0
+        self._stale: set = set()
+        # cached user -> task_versions.version the cache holds / when it was last checked (monotonic)
+        self._versions: Dict[str, int] = {}
+        self._checked: Dict[str, float] = {}
+        # user -> invalidations since their in-flight load began; a load that
+        # overlapped one is thrown away and redone. Only users being loaded
+        # have an entry, and only their own invalidations count.
+        self._generations: Dict[str, int] = {}
+        self._loading: Dict[str, int] = {}  # user -> loads in flight (one per event loop)
+        # per event loop, per user; entries vanish once no coroutine holds the lock
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, weakref.WeakValueDictionary]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self.refreshed = 0
+
+    def _lock(self, user_id: str) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        locks = self._locks.get(loop)
+        if locks is None:
+            locks = self._locks[loop] = weakref.WeakValueDictionary()
+        lock = locks.get(user_id)
+        if lock is None:
+            lock = locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _cached(self, user_id: str) -> bool:
+        return user_id in self._lru and user_id not in self._stale
+
+    # ---- warm / evict ----
+
+    async def _ready(self, user_id: str) -> None:
+        if self._cached(user_id) and (self._fresh(user_id) or await self._revalidate(user_id)):
+            self.hits += 1
+            self._lru.move_to_end(user_id)
+            return
+        self.misses += 1
+        async with self._lock(user_id):
+            self._loading[user_id] = self._loading.get(user_id, 0) + 1
+            try:
+                while not self._cached(user_id):
+                    generation = self._generations.setdefault(user_id, 0)
+                    self._stale.discard(user_id)
+                    checked = time.monotonic()
+                    async with async_session() as db:
+                        # version BEFORE the rows: a write in between leaves the
+                        # cache newer than its version, so the next check reloads
+                        version = (await db.scalar(version_stmt(user_id))) or 0
+                        rows = (
+                            await db.scalars(select(TaskRow).where(TaskRow.user_id == user_id).order_by(TaskRow.id))
+                        ).all()
+                        tasks = [task_payload(r) for r in rows]
+                    if generation == self._generations[user_id]:
+                        self._versions[user_id] = version
+                        self._checked[user_id] = checked
+                        self._admit(user_id, store.load_user(user_id, tasks))
+                        self.loads += 1
+            finally:
+                self._loading[user_id] -= 1
+                if not self._loading[user_id]:
+                    del self._loading[user_id]
+                    self._generations.pop(user_id, None)
+
+    def _fresh(self, user_id: str) -> bool:
+        return time.monotonic() - self._checked.get(user_id, 0.0) < self.max_age
+
+    async def _revalidate(self, user_id: str) -> bool:
+        """Re-read the user's version; True if the cache still holds it, else mark the user stale."""
+        self._checked[user_id] = time.monotonic()  # readers arriving meanwhile are served as is
+        self.revalidations += 1
+        async with async_session() as db:
+            version = (await db.scalar(version_stmt(user_id))) or 0
+        if self._cached(user_id) and self._versions.get(user_id) == version:
+            return True
+        self.refreshed += 1
+        self.invalidate(user_id, broadcast=False)
+        return False
+
+    def _admit(self, user_id: str, size: int) -> None:
+        self._cached_tasks += size - self._lru.pop(user_id, 0)
+        self._lru[user_id] = size
+        while self._cached_tasks > self.max_tasks and len(self._lru) > 1:
+            victim, n = self._lru.popitem(last=False)
+            store.drop_user(victim)
+            self._forget(victim)
+            self._cached_tasks -= n
+            self.evictions += 1
+
+    def _forget(self, user_id: str) -> None:
+        self._stale.discard(user_id)
+        self._versions.pop(user_id, None)
+        self._checked.pop(user_id, None)
+
+    def _write_through(
+        self, user_id: str, version: int, changed: Iterable[Task] = (), removed: Iterable[int] = ()
+    ) -> None:
+        if user_id not in self._lru:
+            return  # not cached: the next read loads the committed rows
+        if self._versions.get(user_id) != version - 1:
+            # another replica wrote in between: applying ours alone would
+            # label a cache missing theirs with the new version
+            self.invalidate(user_id, broadcast=False)
+            return
+        store.put_tasks(user_id, changed)
+        store.delete_tasks(user_id, removed)
+        self._versions[user_id] = version
+        self._admit(user_id, store.user_size(user_id))
+
+    # ---- writes: SQL first, then the cache, under the user's lock ----
+
+    async def _commit(self, user_id: str, stmt, event_type: Union[str, Callable[[Task], str]], removes: bool = False) -> List[Task]:
+        async with self._lock(user_id):
+            async with async_session() as db:
+                rows = (await db.scalars(stmt, execution_options=BULK)).all()
+                out = [task_payload(r) for r in rows]
+                for r, t in zip(rows, out):
+                    add_event(db, event_type if isinstance(event_type, str) else event_type(t), r)
+                if out:
+                    version = await db.scalar(bump_version_stmt(db.get_bind().dialect.name, user_id))
+                await db.commit()
+            if out:
+                relay.notify()
+                if removes:
+                    self._write_through(user_id, version, removed=[t["id"] for t in out])
+                else:
+                    self._write_through(user_id, version, changed=out)
+                cache_bus.publish("tasks", user_id)
+        return out
+
+    async def create(
+        self, user_id: str, title: str, description: Optional[str] = None, due_date: Optional[ISODate] = None
+    ) -> Task:
+        return (await self.create_many(user_id, [{"title": title, "description": description, "due_date": due_date}]))[0]
+
+    async def create_many(self, user_id: str, items: Iterable[Mapping[str, Any]]) -> List[Task]:
+        rows = [
+            TaskRow(
+                user_id=user_id,
+                title=str(item["title"]).strip(),
+                description=_clean(item.get("description")),
+                due_date=parse_due_date(item.get("due_date")),
+                completed=False,
+            )
+            for item in items
+        ]
+        if not rows:
+            return []
+        async with self._lock(user_id):
+            async with async_session() as db:
+                db.add_all(rows)
+                await db.flush()  # ids for the outbox rows
+                for r in rows:
+                    add_event(db, "created", r)
+                out = [task_payload(r) for r in rows]
+                version = await db.scalar(bump_version_stmt(db.get_bind().dialect.name, user_id))
+                await db.commit()
+            relay.notify()
+            self._write_through(user_id, version, changed=out)
+            cache_bus.publish("tasks", user_id)
+        return out
+
+    async def set_completed(self, user_id: str, task_id: int, completed: Optional[bool] = None) -> Optional[Task]:
+        out = await self._commit(user_id, _toggle_stmt(user_id, task_id, completed), _status_event)
+        return out[0] if out else None
+
+    async def set_completed_many(
+        self, user_id: str, task_ids: Optional[Iterable[int]] = None, completed: bool = True
+    ) -> List[Task]:
+        ids = None if task_ids is None else unique_ids(task_ids)
+        if ids == []:
+            return []
+        return await self._commit(user_id, set_completed_stmt(user_id, ids, completed), _status_event)
+
+    async def update(
+        self,
+        user_id: str,
+        task_id: int,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        due_date: Optional[ISODate] = None,
+    ) -> Optional[Task]:
+        values: Dict[str, Any] = {}
+        if title is not None:
+            values["title"] = title.strip()
+        if description is not None:
+            values["description"] = _clean(description)
+        if due_date is not None:
+            values["due_date"] = parse_due_date(due_date)
+        if not values:
+            return await self.get(user_id, task_id)
+        out = await self._commit(user_id, _edit_stmt(user_id, task_id, values), "updated")
+        return out[0] if out else None
+
+    async def delete(self, user_id: str, task_id: int) -> Optional[Task]:
+        out = await self._commit(user_id, delete_stmt(user_id, [task_id]), "deleted", removes=True)
+        return out[0] if out else None
+
+    async def delete_many(self, user_id: str, task_ids: Iterable[int]) -> List[Task]:
+        ids = unique_ids(task_ids)
+        if not ids:
+            return []
+        return await self._commit(user_id, delete_stmt(user_id, ids), "deleted", removes=True)
+
+    async def clear_completed(self, user_id: str) -> List[Task]:
+        return await self._commit(user_id, delete_stmt(user_id, None, completed_only=True), "deleted", removes=True)
+
+    async def version(self, user_id: str) -> int:
+        """The user's task_versions row (same on every replica); never loads the tasks themselves."""
+        if self._cached(user_id) and (self._fresh(user_id) or await self._revalidate(user_id)):
+            return self._versions.get(user_id, 0)
+        # cold (or just found stale): one primary-key lookup, the rows wait for a read that needs them
+        async with async_session() as db:
+            return (await db.scalar(version_stmt(user_id))) or 0
+
+    async def version_tag(self, user_id: str) -> str:
+        return f"v{await self.version(user_id)}"
+
+    # ---- search: a cold user is answered by the FTS index, not loaded for it ----
+
+    async def search(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[Task], int]:
+        if self._cached(user_id) and (self._fresh(user_id) or await self._revalidate(user_id)):
+            return await super().search(user_id, query, limit, offset)
+        self.misses += 1
+        async with async_session() as db:
+            plan = search_plan(db.get_bind().dialect.name, user_id, query, limit, offset)
+            if plan is None:
+                return [], 0
+            page_stmt, count_stmt, params = plan
+            ids, total = page_result(list((await db.execute(page_stmt, params)).all()))
+            if total is None:
+                total = ((await db.execute(count_stmt, params)).scalar() or 0) if offset else 0
+            rows = (await db.scalars(load_stmt(user_id, ids))).all() if ids else []
+            return [task_payload(r) for r in order_by_ids(list(rows), ids)], total
+
+    # ---- cache control ----
+
+    def invalidate(self, user_id: str, broadcast: bool = True) -> None:
+        """Reload `user_id` on next read; broadcast=False for invalidations that came from another replica."""
+        if user_id in self._generations:
+            self._generations[user_id] += 1  # a load in flight may have read the old rows
+        if user_id in self._lru:
+            self._stale.add(user_id)
+        if broadcast:
+            cache_bus.publish("tasks", user_id)
+
+    def clear(self) -> None:
+        """Drop every cached user (benchmarks, tests)."""
+        for user_id in self._generations:
+            self._generations[user_id] += 1
+        for user_id in list(self._lru):
+            store.drop_user(user_id)
+        self._lru.clear()
+        self._stale.clear()
+        self._versions.clear()
+        self._checked.clear()
+        self._cached_tasks = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "users": len(self._lru),
+            "tasks": self._cached_tasks,
+            "max_tasks": self.max_tasks,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+            "refreshed": self.refreshed,
+        }
+
+
+BACKENDS = {
+    "sql": SqlTaskRepository,
+    "memory": TaskRepository,
+}
+
+
+def build_repository(name: str = TASK_STORE) -> TaskRepository:
+    backend = BACKENDS.get(name)
+    if backend is None:
+        logger.warning("unknown TASK_STORE=%r, using sql", name)
+        backend = SqlTaskRepository
+    return backend()
+
+
+tasks_repo = build_repository()
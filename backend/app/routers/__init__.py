@@ -1,6 +1,8 @@
 # backend/app/routers/__init__.py
 
 from .chat import router as chat_router
+from .dapr import router as dapr_router
+from .profiling import router as profiling_router
 from .tasks import router as tasks_router
 
-__all__ = ["chat_router", "tasks_router"]
+__all__ = ["chat_router", "dapr_router", "profiling_router", "tasks_router"]
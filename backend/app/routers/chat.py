@@ -1,9 +1,13 @@
 ﻿from __future__ import annotations
 
+import json
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from app.agent_runner import run_todo_agent
+from app.agent_runner import run_todo_agent, stream_user_chat
+from app.agents.agent import StreamInterrupted
 
 router = APIRouter(prefix="/api/{user_id}", tags=["chat"])
 
@@ -16,3 +20,23 @@ class ChatPayload(BaseModel):
 async def chat(user_id: str, payload: ChatPayload):
     reply = await run_todo_agent(user_id=user_id, message=payload.message)
     return {"reply": reply}
+
+
+# Server-Sent Events variant: "data: {"delta": "..."}" per chunk, then "event: done",
+# or "event: error" if the model failed part-way (the deltas so far are not a reply)
+@router.post("/chat/stream")
+async def chat_stream(user_id: str, payload: ChatPayload):
+    async def events():
+        try:
+            async for delta in stream_user_chat(user_id, payload.message):
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+        except StreamInterrupted as exc:
+            yield f"event: error\ndata: {json.dumps({'error': exc.reply})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
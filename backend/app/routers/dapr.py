@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Request
+
+from app.cache_bus import INVALIDATION_PUBSUB, INVALIDATION_TOPIC, cache_bus
+
+# Dapr's side of the app contract: the sidecar asks which topics to deliver
+# (GET /dapr/subscribe) and POSTs each message as a CloudEvent to its route.
+router = APIRouter(prefix="/dapr", tags=["dapr"])
+
+INVALIDATION_ROUTE = "/dapr/cache-invalidation"
+
+
+@router.get("/subscribe")
+async def subscriptions() -> List[Dict[str, Any]]:
+    if not cache_bus.enabled:
+        return []
+    return [{"pubsubname": INVALIDATION_PUBSUB, "topic": INVALIDATION_TOPIC, "route": INVALIDATION_ROUTE}]
+
+
+@router.post("/cache-invalidation")
+async def cache_invalidation(request: Request) -> Dict[str, str]:
+    try:
+        envelope = await request.json()
+    except ValueError:
+        # malformed: DROP tells Dapr not to redeliver it
+        return {"status": "DROP"}
+    if isinstance(envelope, dict):
+        cache_bus.handle(envelope)
+    return {"status": "SUCCESS"}
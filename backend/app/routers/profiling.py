@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.profiling import ADMIN_TOKEN, TRACEMALLOC_FRAMES, admin_ok, memory, profile_threads, profiles
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    # no ADMIN_TOKEN configured: the surface does not exist
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not admin_ok(x_admin_token):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+router = APIRouter(prefix="/admin/profiling", tags=["admin"], dependencies=[Depends(require_admin)])
+
+COLLAPSED = "text/plain; charset=utf-8"
+
+
+# ---- CPU ----
+
+
+@router.get("/profiles")
+async def list_profiles() -> List[Dict[str, Any]]:
+    return profiles.list()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str) -> PlainTextResponse:
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.collapsed, media_type=COLLAPSED)
+
+
+@router.post("/cpu", response_class=PlainTextResponse)
+async def cpu_profile(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: int = Query(5, ge=1, le=1000),
+) -> PlainTextResponse:
+    # the sampler sleeps in a worker thread, so the loop keeps serving (and gets sampled)
+    collapsed, samples = await asyncio.to_thread(profile_threads, seconds, interval_ms / 1000.0)
+    return PlainTextResponse(collapsed, media_type=COLLAPSED, headers={"X-Profile-Samples": str(samples)})
+
+
+# ---- memory ----
+
+
+@router.get("/memory")
+async def memory_status() -> Dict[str, Any]:
+    return memory.status()
+
+
+@router.post("/memory/start")
+async def memory_start(frames: int = Query(TRACEMALLOC_FRAMES, ge=1, le=100)) -> Dict[str, Any]:
+    memory.start(frames)
+    return memory.status()
+
+
+@router.post("/memory/stop")
+async def memory_stop() -> Dict[str, Any]:
+    memory.stop()
+    return memory.status()
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(limit: int = Query(25, ge=1, le=500)) -> Dict[str, Any]:
+    if not memory.tracing:
+        raise HTTPException(status_code=409, detail="tracemalloc is not running; POST /admin/profiling/memory/start")
+    return await asyncio.to_thread(memory.snapshot, limit)
+
+
+@router.get("/memory/diff")
+async def memory_diff(
+    base: str = Query(..., description="snapshot id"),
+    target: Optional[str] = Query(None, description="snapshot id; default: a fresh snapshot"),
+    limit: int = Query(25, ge=1, le=500),
+) -> Dict[str, Any]:
+    if not memory.tracing:
+        raise HTTPException(status_code=409, detail="tracemalloc is not running; POST /admin/profiling/memory/start")
+    try:
+        return await asyncio.to_thread(memory.diff, base, target, limit)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"unknown snapshot {exc.args[0]}")
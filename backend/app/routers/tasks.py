@@ -1,14 +1,35 @@
 ﻿from __future__ import annotations
 
-from typing import List, Literal, Optional
+from typing import List, Literal, Optional, Sequence
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from pydantic import BaseModel, Field
 
-from app.tools.tasks import add_task, list_tasks, complete_task, delete_task, Task
+from app.repository import tasks_repo
+from app.tools.tasks import Task
 
 router = APIRouter(prefix="/api/{user_id}", tags=["tasks"])
 
+# Handlers are async and go through the task repository (app/repository.py):
+# reads come from its in-memory cache, writes are awaited DB transactions
+# that also stage the task event, so handlers never publish themselves.
+
+
+PAGE_SIZE = 50
+NEXT_CURSOR_HEADER = "X-Next-After-Id"
+# search results are ranked, so they page by offset; total matches in a header
+SEARCH_PAGE_SIZE = 20
+NEXT_OFFSET_HEADER = "X-Next-Offset"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# Conditional GET: the list ETag is the user's task version (tasks_repo.version_tag:
+# the task_versions row, bumped by every add / toggle / delete from here or
+# from chat, so every replica hands out the same tag) plus the query shape.
+# A matching If-None-Match gets a bare 304 built before any task is read or
+# validated.
+# "no-cache" = the browser may keep the body but must revalidate every time.
+LIST_CACHE_CONTROL = "private, no-cache"
+
 
 class TaskCreate(BaseModel):
     title: str
@@ -29,37 +50,153 @@ class TogglePayload(BaseModel):
     completed: Optional[bool] = None
 
 
+# Bulk endpoints: one repository call (one statement, one commit) per request.
+BULK_MAX = 1000
+
+
+class BulkCreate(BaseModel):
+    tasks: List[TaskCreate] = Field(..., min_length=1, max_length=BULK_MAX)
+
+
+class BulkIds(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX)
+
+
+class BulkComplete(BulkIds):
+    completed: bool = True
+
+
+class BulkResult(BaseModel):
+    # ids that actually changed; unknown ids / no-op toggles are left out
+    ids: List[int]
+    count: int
+
+
+def _bulk_result(tasks: Sequence[Task]) -> BulkResult:
+    return BulkResult(ids=[t["id"] for t in tasks], count=len(tasks))
+
+
+async def _list_etag(user_id: str, status: str, limit: Optional[int], after_id: Optional[int]) -> str:
+    # version only: a 304 costs one task_versions lookup, the tasks are loaded for a 200
+    tag = f"{await tasks_repo.version_tag(user_id)}-{status}"
+    if limit is not None or after_id is not None:
+        tag += f"-{limit or PAGE_SIZE}-{after_id or 0}"
+    return f'"{tag}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]  # weak comparison, as RFC 9110 asks for If-None-Match
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
 @router.get("/tasks", response_model=List[TaskRead])
-def get_tasks(user_id: str, status: Literal["all", "pending", "completed"] = "all"):
-    tasks: List[Task] = list_tasks(user_id, status)
-    return tasks
+async def get_tasks(
+    user_id: str,
+    response: Response,
+    status: Literal["all", "pending", "completed"] = "all",
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after_id: Optional[int] = Query(None, ge=1),
+    if_none_match: Optional[str] = Header(None),
+):
+    # version read BEFORE the tasks: a write racing this request can only make
+    # the tag older than the body (one extra 200 later), never newer
+    etag = await _list_etag(user_id, status, limit, after_id)
+    if _etag_matches(if_none_match, etag):
+        # returning a Response skips response_model validation entirely
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LIST_CACHE_CONTROL
+
+    if limit is None and after_id is None:
+        # read-only view (no copy); pydantic serializes it like a list
+        tasks: Sequence[Task] = await tasks_repo.list(user_id, status)
+        return tasks
+
+    # keyset page: body stays a plain list, the cursor travels in a header
+    page, next_after_id = await tasks_repo.list_page(user_id, status, limit or PAGE_SIZE, after_id)
+    if next_after_id is not None:
+        response.headers[NEXT_CURSOR_HEADER] = str(next_after_id)
+    return page
+
+
+@router.get("/tasks/search", response_model=List[TaskRead])
+async def get_tasks_search(
+    user_id: str,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10_000),
+):
+    # best match first (BM25 over title + description, see app/tools/text_index.py)
+    page, total = await tasks_repo.search(user_id, q, limit, offset)
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
+    if offset + len(page) < total:
+        response.headers[NEXT_OFFSET_HEADER] = str(offset + len(page))
+    return page
 
 
 @router.post("/tasks", response_model=TaskRead)
-def post_task(user_id: str, payload: TaskCreate):
-    t = add_task(
-        user_id=user_id,
-        title=payload.title,
-        description=payload.description,
-        due_date=payload.due_date,
-    )
-    return t
+async def post_task(user_id: str, payload: TaskCreate):
+    try:
+        return await tasks_repo.create(
+            user_id=user_id,
+            title=payload.title,
+            description=payload.description,
+            due_date=payload.due_date,
+        )
+    except ValueError:
+        raise HTTPException(status_code=422, detail="due_date must be an ISO date")
+
+
+@router.post("/tasks/bulk", response_model=List[TaskRead])
+async def post_tasks_bulk(user_id: str, payload: BulkCreate):
+    try:
+        return await tasks_repo.create_many(user_id, [item.model_dump() for item in payload.tasks])
+    except ValueError:
+        raise HTTPException(status_code=422, detail="due_date must be an ISO date")
+
+
+@router.post("/tasks/bulk/complete", response_model=BulkResult)
+async def complete_tasks_bulk(user_id: str, payload: BulkComplete):
+    return _bulk_result(await tasks_repo.set_completed_many(user_id, payload.ids, payload.completed))
+
+
+@router.post("/tasks/complete-all", response_model=BulkResult)
+async def complete_all_pending(user_id: str):
+    return _bulk_result(await tasks_repo.set_completed_many(user_id, None, True))
+
+
+@router.post("/tasks/bulk/delete", response_model=BulkResult)
+async def delete_tasks_bulk(user_id: str, payload: BulkIds):
+    return _bulk_result(await tasks_repo.delete_many(user_id, payload.ids))
+
+
+@router.post("/tasks/clear-completed", response_model=BulkResult)
+async def clear_completed_tasks(user_id: str):
+    return _bulk_result(await tasks_repo.clear_completed(user_id))
 
 
 # ✅ IMPORTANT: frontend calls:
 # PATCH /api/{userId}/tasks/{taskId}
 @router.patch("/tasks/{task_id}", response_model=TaskRead)
-def patch_task(user_id: str, task_id: int, payload: TogglePayload):
+async def patch_task(user_id: str, task_id: int, payload: TogglePayload):
     # completed None => toggle, completed True/False => set
-    t = complete_task(user_id, task_id, payload.completed)
+    t = await tasks_repo.set_completed(user_id, task_id, payload.completed)
     if not t:
         raise HTTPException(status_code=404, detail="Task not found")
     return t
 
 
 @router.delete("/tasks/{task_id}")
-def del_task(user_id: str, task_id: int):
-    removed = delete_task(user_id, task_id)
+async def del_task(user_id: str, task_id: int):
+    removed = await tasks_repo.delete(user_id, task_id)
     if not removed:
         raise HTTPException(status_code=404, detail="Task not found")
     return {"ok": True}
@@ -0,0 +1,151 @@
+"""
+Phase 5 - Full-text task search on the SQL side
+
+- SQLite: contentless FTS5 table `tasks_fts` (owner, title, description),
+  kept in step with `tasks` by triggers (migration 006); ranked with bm25(),
+  title weighted over description
+- Postgres: GIN index on a 'simple' tsvector of title + description, ranked
+  with ts_rank_cd; plus a pg_trgm index on title so ILIKE '%...%' title
+  matching is indexable too (migration 006)
+- other dialects: per-user ILIKE over title / description, unranked
+- queries are AND over words; the last word also matches as a prefix once
+  it has MIN_PREFIX characters, same as the in-memory index
+  (app/tools/text_index.py); FTS5 materializes a prefix's whole doclist, so
+  a one- or two-letter prefix would cost more than the rest of the query
+- one round trip per page: the total rides along as count(*) OVER ()
+
+FTS5 has no per-user partitioning, so each row also carries an `owner`
+token (u + hex(user_id)) and every MATCH is scoped by it before ranking.
+The ranked query stays inside the FTS table: joining `tasks` there lets the
+planner walk the user's rows and probe FTS per row, which is ~100x slower.
+Callers load the returned ids with a user_id check.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, text
+
+from app.models import Task
+from app.tools.text_index import MIN_PREFIX, tokenize
+
+FTS_TABLE = "tasks_fts"
+
+# the tsvector expression the GIN index is built on; queries must repeat it verbatim
+PG_DOCUMENT = "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"
+
+# bm25() column weights: owner (filter only), title, description
+_FTS_WEIGHTS = "0.0, 2.0, 1.0"
+
+
+def owner_token(user_id: str) -> str:
+    # matches the triggers' 'u' || hex(user_id); FTS5 case-folds the hex
+    return "u" + user_id.encode("utf-8").hex()
+
+
+def fts_match(user_id: str, query: str) -> Optional[str]:
+    """FTS5 MATCH expression, or None when the query has no words."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    # every word quoted (no FTS syntax from users); the last one as a prefix
+    quoted = [f'"{t}"' for t in terms]
+    if len(terms[-1]) >= MIN_PREFIX:
+        quoted[-1] += " *"
+    body = " AND ".join(quoted)
+    return f"owner : {owner_token(user_id)} AND {{title description}} : ({body})"
+
+
+def pg_tsquery(query: str) -> Optional[str]:
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    # tokenize() only yields \w+ words, so nothing here is tsquery syntax
+    if len(terms[-1]) >= MIN_PREFIX:
+        terms[-1] += ":*"
+    return " & ".join(terms)
+
+
+def _fts_sql() -> str:
+    return (
+        # bm25() cannot sit next to a window function, so it is computed one level down
+        f"SELECT id, count(*) OVER () FROM ("
+        f"SELECT rowid AS id, bm25({FTS_TABLE}, {_FTS_WEIGHTS}) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        f") ORDER BY score, id DESC LIMIT :limit OFFSET :offset"
+    )
+
+
+def _fts_count_sql() -> str:
+    return f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+
+
+def _pg_sql() -> str:
+    return (
+        f"SELECT id, count(*) OVER () FROM tasks "
+        f"WHERE user_id = :user_id AND {PG_DOCUMENT} @@ to_tsquery('simple', :tsq) "
+        f"ORDER BY ts_rank_cd({PG_DOCUMENT}, to_tsquery('simple', :tsq)) DESC, id DESC "
+        f"LIMIT :limit OFFSET :offset"
+    )
+
+
+def _pg_count_sql() -> str:
+    return f"SELECT count(*) FROM tasks WHERE user_id = :user_id AND {PG_DOCUMENT} @@ to_tsquery('simple', :tsq)"
+
+
+def _fallback_where(user_id: str, query: str):
+    clauses = [Task.user_id == user_id]
+    for term in dict.fromkeys(tokenize(query)):
+        like = f"%{term}%"
+        clauses.append(or_(Task.title.ilike(like), Task.description.ilike(like)))
+    return clauses
+
+
+def search_plan(dialect: str, user_id: str, query: str, limit: int, offset: int) -> Optional[Tuple[Any, Any, Dict[str, Any]]]:
+    """
+    (page statement, count statement, params) for one dialect; None if the
+    query has no words. The page yields (id, total) rows, best match first;
+    the count statement is only needed when an offset ran past the end.
+    """
+    params: Dict[str, Any] = {"user_id": user_id, "limit": limit, "offset": offset}
+    if dialect == "sqlite":
+        match = fts_match(user_id, query)
+        if match is None:
+            return None
+        params["match"] = match
+        return text(_fts_sql()), text(_fts_count_sql()), params
+    if dialect == "postgresql":
+        tsq = pg_tsquery(query)
+        if tsq is None:
+            return None
+        params["tsq"] = tsq
+        return text(_pg_sql()), text(_pg_count_sql()), params
+    if not tokenize(query):
+        return None
+    where = _fallback_where(user_id, query)
+    ids = (
+        select(Task.id, func.count().over())
+        .where(*where)
+        .order_by(Task.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    count = select(Task.id).where(*where).subquery()
+    return ids, select(text("count(*)")).select_from(count), {}
+
+
+def page_result(rows: List[Any]) -> Tuple[List[int], Optional[int]]:
+    """(ids, total) from page rows; total is None for an empty page (run the count if offset > 0)."""
+    if rows:
+        return [r[0] for r in rows], rows[0][1]
+    return [], None
+
+
+def load_stmt(user_id: str, ids: List[int]):
+    """The tasks behind a page of ids, re-checked against the owner."""
+    return select(Task).where(Task.user_id == user_id, Task.id.in_(ids))
+
+
+def order_by_ids(rows: List[Task], ids: List[int]) -> List[Task]:
+    by_id = {t.id: t for t in rows}
+    return [by_id[i] for i in ids if i in by_id]
@@ -3,102 +3,185 @@ DB-backed Task Service (same source as Dashboard)
 
 This file gives the agent a clean way to use the SAME database tasks
 that your /api/{user_id}/tasks endpoints use.
+
+- thin async adapters over the task repository (app/repository.py), so
+  results come from (and writes go through) its per-user cache, and the
+  repository stays the only code that writes the tasks table
+- sync API: thin wrappers that run the async adapters on the app's event
+  loop (from a threadpool worker) or on one private loop (scripts), so the
+  repository's cache and async connections are only used from one loop
 """
 
 from __future__ import annotations
 
-from typing import List, Optional
-
-# ---- DB session import (try common project patterns) ----
-SessionLocal = None
-
-try:
-    from app.db import SessionLocal  # most common in our project
-except Exception:
-    try:
-        from app.database import SessionLocal  # fallback
-    except Exception:
-        SessionLocal = None
-
-if SessionLocal is None:
-    raise ImportError("SessionLocal not found. Check app/db.py or app/database.py")
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Sequence, TypeVar
 
-# ---- Task model import (try common project patterns) ----
-Task = None
+import anyio.from_thread
 
-try:
-    from app.models import Task  # if app/models.py defines Task
-except Exception:
-    try:
-        from app.models.task import Task  # if split module
-    except Exception:
-        Task = None
+from app.repository import tasks_repo
 
-if Task is None:
-    raise ImportError("Task model not found. Check app/models.py")
+T = TypeVar("T")
 
 
-def create_task(user_id: str, title: str) -> dict:
+def _clean_title(title: str) -> str:
     title = (title or "").strip()
     if not title:
         raise ValueError("Title is required")
+    return title
 
-    db = SessionLocal()
-    try:
-        t = Task(user_id=user_id, title=title, completed=False)
-        db.add(t)
-        db.commit()
-        db.refresh(t)
-        return {"id": t.id, "user_id": t.user_id, "title": t.title, "completed": bool(t.completed)}
-    finally:
-        db.close()
 
+# -----------------------------
+# Async API (event loop friendly: routes, agent tools)
+# -----------------------------
 
-def get_tasks(user_id: str, status: str = "all") -> List[dict]:
+
+def _from_repo(t: dict) -> dict:
+    return {"id": t["id"], "user_id": t["user_id"], "title": t["title"], "completed": bool(t["completed"])}
+
+
+async def create_task_async(user_id: str, title: str) -> dict:
+    return _from_repo(await tasks_repo.create(user_id, _clean_title(title)))
+
+
+async def get_tasks_async(
+    user_id: str, status: str = "all", limit: Optional[int] = None, after_id: Optional[int] = None
+) -> List[dict]:
     status = (status or "all").lower().strip()
+    view = await tasks_repo.list(user_id, status)  # type: ignore[arg-type]
+    if limit is None and after_id is None:
+        return [_from_repo(t) for t in view]
+    page, _next = await tasks_repo.list_page(user_id, status, limit or len(view), after_id)  # type: ignore[arg-type]
+    return [_from_repo(t) for t in page]
 
-    db = SessionLocal()
-    try:
-        q = db.query(Task).filter(Task.user_id == user_id).order_by(Task.id.desc())
 
-        if status == "pending":
-            q = q.filter(Task.completed == False)  # noqa: E712
-        elif status == "completed":
-            q = q.filter(Task.completed == True)  # noqa: E712
+async def get_tasks_page_async(
+    user_id: str, status: str = "all", limit: int = 50, after_id: Optional[int] = None
+) -> dict:
+    """{"tasks": [...newest first], "next_after_id": int | None}"""
+    page, next_after_id = await tasks_repo.list_page(user_id, (status or "all").lower().strip(), limit, after_id)  # type: ignore[arg-type]
+    return {"tasks": [_from_repo(t) for t in page], "next_after_id": next_after_id}
 
-        rows = q.all()
-        return [
-            {"id": t.id, "user_id": t.user_id, "title": t.title, "completed": bool(t.completed)}
-            for t in rows
-        ]
-    finally:
-        db.close()
 
+async def toggle_task_complete_async(user_id: str, task_id: int) -> Optional[dict]:
+    t = await tasks_repo.set_completed(user_id, task_id, None)
+    return _from_repo(t) if t else None
 
-def toggle_task_complete(user_id: str, task_id: int) -> Optional[dict]:
-    db = SessionLocal()
+
+async def remove_task_async(user_id: str, task_id: int) -> bool:
+    return await tasks_repo.delete(user_id, task_id) is not None
+
+
+async def search_tasks_async(user_id: str, query: str, limit: int = 20, offset: int = 0) -> dict:
+    """{"tasks": [...best match first], "total": int}; memory index when cached, else FTS5 / tsvector."""
+    found, total = await tasks_repo.search(user_id, query, limit, offset)
+    return {"tasks": [_from_repo(t) for t in found], "total": total}
+
+
+# ---- bulk: one statement and one commit per call ----
+
+
+async def create_tasks_async(user_id: str, titles: Sequence[str]) -> List[dict]:
+    items = [{"title": _clean_title(title)} for title in titles]
+    return [_from_repo(t) for t in await tasks_repo.create_many(user_id, items)]
+
+
+async def set_completed_many_async(
+    user_id: str, task_ids: Optional[Iterable[int]] = None, completed: bool = True
+) -> List[dict]:
+    """task_ids=None: every task in the other state ("complete all pending")."""
+    return [_from_repo(t) for t in await tasks_repo.set_completed_many(user_id, task_ids, completed)]
+
+
+async def remove_tasks_async(user_id: str, task_ids: Iterable[int]) -> List[int]:
+    return [t["id"] for t in await tasks_repo.delete_many(user_id, task_ids)]
+
+
+async def clear_completed_async(user_id: str) -> List[int]:
+    return [t["id"] for t in await tasks_repo.clear_completed(user_id)]
+
+
+# -----------------------------
+# Sync API (thin wrappers for threadpool / script callers)
+# -----------------------------
+
+_script_loop: Optional[asyncio.AbstractEventLoop] = None
+_script_lock = threading.Lock()
+
+
+def _run(fn: Callable[..., Awaitable[T]], *args: Any) -> T:
+    """
+    Run an async adapter from sync code:
+    - threadpool worker of the app (def routes, run_in_threadpool,
+      anyio.to_thread): on the app's loop via anyio.from_thread.run
+    - script (no loop in this process): on one private loop kept for the
+      process; asyncio.run() per call would strand pooled async connections
+    Called on the event loop thread itself it raises: await the _async twin.
+    """
+    started = False
+
+    async def call() -> T:
+        nonlocal started
+        started = True
+        return await fn(*args)
+
+    try:
+        return anyio.from_thread.run(call)
+    except RuntimeError:
+        if started:
+            raise  # the adapter's own error
     try:
-        t = db.query(Task).filter(Task.user_id == user_id, Task.id == task_id).first()
-        if not t:
-            return None
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError(f"{fn.__name__}: called from the event loop thread; await it instead")
+
+    global _script_loop
+    with _script_lock:
+        if _script_loop is None:
+            _script_loop = asyncio.new_event_loop()
+        return _script_loop.run_until_complete(fn(*args))
+
+
+def create_task(user_id: str, title: str) -> dict:
+    return _run(create_task_async, user_id, title)
+
+
+def get_tasks(
+    user_id: str, status: str = "all", limit: Optional[int] = None, after_id: Optional[int] = None
+) -> List[dict]:
+    return _run(get_tasks_async, user_id, status, limit, after_id)
+
 
-        t.completed = not bool(t.completed)
-        db.add(t)
-        db.commit()
-        db.refresh(t)
-        return {"id": t.id, "user_id": t.user_id, "title": t.title, "completed": bool(t.completed)}
-    finally:
-        db.close()
+def get_tasks_page(user_id: str, status: str = "all", limit: int = 50, after_id: Optional[int] = None) -> dict:
+    return _run(get_tasks_page_async, user_id, status, limit, after_id)
+
+
+def toggle_task_complete(user_id: str, task_id: int) -> Optional[dict]:
+    return _run(toggle_task_complete_async, user_id, task_id)
 
 
 def remove_task(user_id: str, task_id: int) -> bool:
-    db = SessionLocal()
-    try:
-        t = db.query(Task).filter(Task.user_id == user_id, Task.id == task_id).first()
-        if not t:
-            return False
-        db.delete(t)
-        db.commit()
-        return True
-    finally:
-        db.close()
+    return _run(remove_task_async, user_id, task_id)
+
+
+def search_tasks(user_id: str, query: str, limit: int = 20, offset: int = 0) -> dict:
+    return _run(search_tasks_async, user_id, query, limit, offset)
+
+
+def create_tasks(user_id: str, titles: Sequence[str]) -> List[dict]:
+    return _run(create_tasks_async, user_id, titles)
+
+
+def set_completed_many(user_id: str, task_ids: Optional[Iterable[int]] = None, completed: bool = True) -> List[dict]:
+    return _run(set_completed_many_async, user_id, task_ids, completed)
+
+
+def remove_tasks(user_id: str, task_ids: Iterable[int]) -> List[int]:
+    return _run(remove_tasks_async, user_id, task_ids)
+
+
+def clear_completed(user_id: str) -> List[int]:
+    return _run(clear_completed_async, user_id)
@@ -0,0 +1,255 @@
+"""
+Phase 5 - Shared state for running more than one backend replica
+
+- StateBackend: async key/value with ETags (optimistic concurrency)
+  - DaprStateBackend: the sidecar's state API (/v1.0/state/{store});
+    component in dapr-components/statestore.yaml
+  - LocalStateBackend: in-process stand-in with the same semantics
+    (conflicts included), for tests and single-process runs
+- STATE_BACKEND=dapr|local; unset = nothing shared (one replica, the old behaviour)
+- SharedHistory: chat transcripts live in the state store; each replica
+  fronts them with the bounded HistoryStore as a near-cache
+- a transcript write is read-modify-write under the key's ETag, retried on
+  conflict, so two replicas answering the same user never lose a message;
+  other replicas drop their near-cached copy via app/cache_bus.py
+
+Tasks are not kept here: since the task repository (app/repository.py) the
+tasks table is their shared source of truth, and the per-replica task cache
+is invalidated over the same bus.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from app.agents.store import HistoryStore
+from app.cache_bus import cache_bus
+from app.dapr_publish import DAPR_HTTP_PORT
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "").strip().lower()
+STATE_STORE_NAME = os.getenv("DAPR_STATE_STORE", "statestore")
+HISTORY_KEY_PREFIX = "chat-history:"
+
+
+class StateError(Exception):
+    """The state store could not be reached or refused the request."""
+
+
+class StateConflict(StateError):
+    """The ETag given to save() is no longer current."""
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+
+
+class StateBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Tuple[Any, Optional[str]]:
+        """(value, etag); (None, None) when the key does not exist."""
+
+    @abstractmethod
+    async def save(self, key: str, value: Any, etag: Optional[str] = None) -> None:
+        """Write `value`; with an etag only if it is still current (StateConflict otherwise)."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove `key`; no error if it does not exist."""
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalStateBackend(StateBackend):
+    """Process-local stand-in for a Dapr state store (first-write-wins ETags)."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[Any, str]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Tuple[Any, Optional[str]]:
+        with self._lock:
+            return self._data.get(key, (None, None))
+
+    async def save(self, key: str, value: Any, etag: Optional[str] = None) -> None:
+        with self._lock:
+            current = self._data.get(key)
+            if etag is not None and (current is None or current[1] != etag):
+                raise StateConflict(key)
+            self._seq += 1
+            self._data[key] = (value, str(self._seq))
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DaprStateBackend(StateBackend):
+    def __init__(self, store: str = STATE_STORE_NAME, base_url: Optional[str] = None, timeout: float = 2.0) -> None:
+        self.store = store
+        self.base_url = base_url or f"http://localhost:{DAPR_HTTP_PORT}"
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # created on first use, inside the running loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=httpx.Timeout(self.timeout))
+        return self._client
+
+    async def get(self, key: str) -> Tuple[Any, Optional[str]]:
+        try:
+            resp = await self._http().get(f"/v1.0/state/{self.store}/{key}")
+        except httpx.HTTPError as exc:
+            raise StateError(f"state get failed: {type(exc).__name__}") from exc
+        if resp.status_code == 204 or not resp.content:
+            return None, None
+        if resp.status_code >= 300:
+            raise StateError(f"state get {resp.status_code}")
+        return resp.json(), resp.headers.get("etag")
+
+    async def save(self, key: str, value: Any, etag: Optional[str] = None) -> None:
+        item: Dict[str, Any] = {"key": key, "value": value}
+        if etag is not None:
+            item["etag"] = etag
+            item["options"] = {"concurrency": "first-write"}
+        try:
+            resp = await self._http().post(f"/v1.0/state/{self.store}", json=[item])
+        except httpx.HTTPError as exc:
+            raise StateError(f"state save failed: {type(exc).__name__}") from exc
+        if resp.status_code == 409:
+            raise StateConflict(key)
+        if resp.status_code >= 300:
+            raise StateError(f"state save {resp.status_code}")
+
+    async def delete(self, key: str) -> None:
+        try:
+            resp = await self._http().delete(f"/v1.0/state/{self.store}/{key}")
+        except httpx.HTTPError as exc:
+            raise StateError(f"state delete failed: {type(exc).__name__}") from exc
+        if resp.status_code >= 300:
+            raise StateError(f"state delete {resp.status_code}")
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+BACKENDS = {
+    "dapr": DaprStateBackend,
+    "local": LocalStateBackend,
+}
+
+
+def build_state_backend(name: str = STATE_BACKEND) -> Optional[StateBackend]:
+    if not name:
+        return None
+    backend = BACKENDS.get(name)
+    if backend is None:
+        logger.warning("unknown STATE_BACKEND=%r, keeping state in process", name)
+        return None
+    return backend()
+
+
+# -----------------------------
+# Chat history
+# -----------------------------
+
+
+class SharedHistory:
+    """
+    user_id -> transcript (oldest first), shared through a StateBackend.
+
+    get() is served from the near-cache when it holds the user; extend() goes
+    to the store. Without a backend this is just the HistoryStore. If the
+    store is unreachable chat keeps working on the near-cache (and counts it).
+    """
+
+    CONFLICT_RETRIES = 3
+
+    def __init__(self, backend: Optional[StateBackend] = None, local: Optional[HistoryStore] = None) -> None:
+        self.backend = backend
+        self.local = local or HistoryStore()
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return HISTORY_KEY_PREFIX + user_id
+
+    async def _load(self, user_id: str) -> Tuple[List[dict], Optional[str]]:
+        assert self.backend is not None
+        value, etag = await self.backend.get(self._key(user_id))
+        messages = list(value or [])[-self.local.max_messages:]
+        self.local.replace(user_id, messages)
+        return messages, etag
+
+    async def get(self, user_id: str) -> List[dict]:
+        if self.backend is None:
+            return self.local.get(user_id)
+        cached = self.local.peek(user_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        try:
+            return (await self._load(user_id))[0]
+        except StateError as exc:
+            self.errors += 1
+            logger.debug("history load failed: %s", exc)
+            return []
+
+    async def extend(self, user_id: str, messages: Iterable[dict]) -> None:
+        messages = list(messages)
+        if self.backend is None:
+            self.local.extend(user_id, messages)
+            return
+        try:
+            for _attempt in range(self.CONFLICT_RETRIES):
+                current, etag = await self._load(user_id)
+                merged = (current + messages)[-self.local.max_messages:]
+                try:
+                    await self.backend.save(self._key(user_id), merged, etag)
+                except StateConflict:
+                    self.conflicts += 1  # another replica wrote this user in between: reload, retry
+                    continue
+                self.local.replace(user_id, merged)
+                cache_bus.publish("history", user_id)
+                return
+            raise StateError("too many conflicts")
+        except StateError as exc:
+            self.errors += 1
+            logger.debug("history save failed: %s", exc)
+            self.local.extend(user_id, messages)
+
+    def forget(self, user_id: str) -> None:
+        """Drop the near-cached copy (another replica changed it)."""
+        self.local.clear(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.local.stats())
+        out.update(
+            backend=type(self.backend).__name__ if self.backend is not None else None,
+            hits=self.hits,
+            misses=self.misses,
+            conflicts=self.conflicts,
+            errors=self.errors,
+        )
+        return out
+
+
+state_backend = build_state_backend()
+chat_history = SharedHistory(state_backend)
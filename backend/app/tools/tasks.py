@@ -1,7 +1,15 @@
 ﻿from __future__ import annotations
 
+import bisect
+import itertools
+import threading
+import time
+from collections.abc import Sequence
 from datetime import datetime
-from typing import Dict, List, Optional, Literal, TypedDict, Union
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Literal, Tuple, TypedDict, Union
+
+from app.tools.text_index import TextIndex
+from app.tools.title_index import TitleIndex
 
 ISODate = Union[str, datetime]
 
@@ -15,12 +23,219 @@ class Task(TypedDict):
     due_date: Optional[str]  # store as ISO string for simplicity
 
 
-_TASKS: Dict[str, List[Task]] = {}
-_NEXT_ID: int = 1
+# -----------------------------
+# Concurrency
+# -----------------------------
+# REST handlers run on FastAPI's threadpool while chat commands run on the
+# event loop, so every mutation takes its user's lock. Locks are striped:
+# users hash onto a fixed pool, so writers for different users almost never
+# contend and memory stays flat no matter how many users exist.
+_STRIPE_COUNT = 64
+_STRIPES: Tuple[threading.Lock, ...] = tuple(threading.Lock() for _ in range(_STRIPE_COUNT))
+
+# itertools.count.__next__ runs in C under the GIL, so ids are allocated
+# atomically without taking any lock.
+_ID_SEQ = itertools.count(1)
+
+# Versions come from one process-wide counter rather than one per user: a
+# store that is dropped and rebuilt (repository cache eviction) can never
+# hand out a version a client still holds in an ETag.
+_VERSION_SEQ = itertools.count(1)
+
+
+def _lock_for(user_id: str) -> threading.Lock:
+    return _STRIPES[hash(user_id) % _STRIPE_COUNT]
+
+
+# -----------------------------
+# Per-user indexed store
+# -----------------------------
+
+class _UserTasks:
+    """
+    One user's tasks, indexed by id.
+
+    - by_id holds every task; pending/completed hold the two subsets
+    - all three are insertion-ordered dicts kept in ascending id order,
+      so newest-first is just reversed iteration (ids are monotonic)
+    - a task moved between subsets (or written through out of id order)
+      may land out of order; that dict is flagged and re-sorted once,
+      lazily, on the next read
+    - titles is a normalized-title index kept in step with by_id
+    - text is the full-text (title + description) index behind search_tasks()
+    - callers must hold `lock` while mutating; readers go through
+      snapshot(), which is built once per version and then shared
+    """
+
+    __slots__ = ("by_id", "pending", "completed", "titles", "text", "lock", "version", "_unsorted", "_snapshots")
+
+    def __init__(self, lock: threading.Lock) -> None:
+        self.by_id: Dict[int, Task] = {}
+        self.pending: Dict[int, Task] = {}
+        self.completed: Dict[int, Task] = {}
+        self.titles = TitleIndex()
+        self.text = TextIndex()
+        self.lock = lock
+        self.version = 0
+        self._unsorted: set = set()
+        self._snapshots: Dict[str, Tuple[int, Tuple[Task, ...]]] = {}
+
+    def _subset(self, completed: bool) -> Dict[int, Task]:
+        return self.completed if completed else self.pending
+
+    def _put(self, name: str, bucket: Dict[int, Task], task: Task) -> None:
+        tid = task["id"]
+        last = next(reversed(bucket), None)
+        if last is not None and last > tid:
+            self._unsorted.add(name)
+        bucket[tid] = task
+
+    def bucket(self, status: str) -> Dict[int, Task]:
+        if status == "pending":
+            bucket = self.pending
+        elif status == "completed":
+            bucket = self.completed
+        else:
+            status, bucket = "all", self.by_id
+
+        if status in self._unsorted:
+            items = sorted(bucket.items())
+            bucket.clear()
+            bucket.update(items)
+            self._unsorted.discard(status)
+        return bucket
+
+    def size(self, status: str) -> int:
+        if status == "pending":
+            return len(self.pending)
+        if status == "completed":
+            return len(self.completed)
+        return len(self.by_id)
+
+    def snapshot(self, status: str) -> Tuple[Task, ...]:
+        """Newest-first tuple of one subset, rebuilt only after a mutation."""
+        cached = self._snapshots.get(status)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        with self.lock:
+            items = tuple(reversed(self.bucket(status).values()))
+            self._snapshots[status] = (self.version, items)
+        return items
+
+    def touch(self) -> None:
+        self.version = next(_VERSION_SEQ)
+
+    def add(self, task: Task) -> None:
+        self.touch()
+        self._put("all", self.by_id, task)
+        self.titles.add(task["id"], task["title"])
+        self.text.add(task["id"], task["title"], task["description"])
+        name = "completed" if task["completed"] else "pending"
+        self._put(name, self._subset(task["completed"]), task)
+
+    def set_completed(self, task: Task, completed: bool) -> None:
+        if task["completed"] == completed:
+            return
+        self.touch()
+        self._subset(task["completed"]).pop(task["id"], None)
+        task["completed"] = completed
+        name = "completed" if completed else "pending"
+        self._put(name, self._subset(completed), task)
 
+    def set_completed_many(self, tasks: Iterable[Task], completed: bool) -> List[Task]:
+        """Move every task not already in that state; one version bump for the batch."""
+        changed = [t for t in tasks if t["completed"] != completed]
+        if not changed:
+            return changed
+        self.touch()
+        source, target = self._subset(not completed), self._subset(completed)
+        name = "completed" if completed else "pending"
+        for t in changed:
+            source.pop(t["id"], None)
+            t["completed"] = completed
+            self._put(name, target, t)
+        return changed
 
-def _ensure_user(user_id: str) -> List[Task]:
-    return _TASKS.setdefault(user_id, [])
+    def rename(self, task: Task, title: str) -> None:
+        self.titles.rename(task["id"], task["title"], title)
+        task["title"] = title
+
+    def upsert(self, task: Task) -> None:
+        """Add `task`, or bring the stored task with its id in line with it (in place)."""
+        current = self.by_id.get(task["id"])
+        if current is None:
+            self.add(task)
+            return
+        self.set_completed(current, task["completed"])
+        indexed = (current["title"], current["description"])
+        if task["title"] != current["title"]:
+            self.rename(current, task["title"])
+        current["description"] = task["description"]
+        current["due_date"] = task["due_date"]
+        self.text.replace(current["id"], indexed, (current["title"], current["description"]))
+        self.touch()
+
+    def remove(self, task_id: int) -> Optional[Task]:
+        task = self.by_id.pop(task_id, None)
+        if task is not None:
+            self.touch()
+            self._subset(task["completed"]).pop(task_id, None)
+            self.titles.remove(task_id, task["title"])
+            self.text.remove(task_id, task["title"], task["description"])
+        return task
+
+    def remove_many(self, task_ids: Iterable[int]) -> List[Task]:
+        removed: List[Task] = []
+        for tid in task_ids:
+            task = self.by_id.pop(tid, None)
+            if task is None:
+                continue
+            self._subset(task["completed"]).pop(tid, None)
+            self.titles.remove(tid, task["title"])
+            self.text.remove(tid, task["title"], task["description"])
+            removed.append(task)
+        if removed:
+            self.touch()
+        return removed
+
+
+class TaskView(Sequence):
+    """
+    Read-only, newest-first view over a user's tasks.
+    len() is O(1); iteration and indexing share one immutable snapshot per
+    store version, so concurrent writers can never break a reader mid-loop.
+    """
+
+    __slots__ = ("_store", "_status")
+
+    def __init__(self, store: _UserTasks, status: str = "all") -> None:
+        self._store = store
+        self._status = status
+
+    def __len__(self) -> int:
+        return self._store.size(self._status)
+
+    def __iter__(self) -> Iterator[Task]:
+        return iter(self._store.snapshot(self._status))
+
+    def __getitem__(self, index):
+        return self._store.snapshot(self._status)[index]
+
+    def __repr__(self) -> str:
+        return f"TaskView(status={self._status!r}, size={len(self)})"
+
+
+_TASKS: Dict[str, _UserTasks] = {}
+
+
+def _ensure_user(user_id: str) -> _UserTasks:
+    store = _TASKS.get(user_id)
+    if store is None:
+        with _lock_for(user_id):
+            store = _TASKS.get(user_id)
+            if store is None:
+                store = _TASKS[user_id] = _UserTasks(_lock_for(user_id))
+    return store
 
 
 def _to_iso(dt: Optional[ISODate]) -> Optional[str]:
@@ -38,30 +253,99 @@ def add_task(
     description: Optional[str] = None,
     due_date: Optional[ISODate] = None,
 ) -> Task:
-    global _NEXT_ID
-    tasks = _ensure_user(user_id)
+    store = _ensure_user(user_id)
 
     task: Task = {
-        "id": _NEXT_ID,
+        "id": 0,
         "user_id": user_id,
         "title": title.strip(),
         "description": (description.strip() if isinstance(description, str) else None),
         "completed": False,
         "due_date": _to_iso(due_date),
     }
-    _NEXT_ID += 1
-    tasks.insert(0, task)
+    with store.lock:
+        # allocate inside the user's lock so per-user insertion order == id order
+        task["id"] = next(_ID_SEQ)
+        store.add(task)
     return task
 
 
-def list_tasks(user_id: str, status: Literal["all", "pending", "completed"] = "all") -> List[Task]:
-    tasks = list(_ensure_user(user_id))
+# Versions restart with the process; anything that hands a version to a
+# client (HTTP ETags) pairs it with this epoch so a restart never reuses one.
+STORE_EPOCH = format(time.time_ns(), "x")
+
+
+def task_version(user_id: str) -> int:
+    """
+    Per-user change counter: bumped by every add / complete / update / delete.
+    Equal versions mean identical task lists, so rendered views can be cached on it.
+    0 = nothing loaded for this user.
+    """
+    store = _TASKS.get(user_id)
+    return store.version if store is not None else 0
 
-    if status == "pending":
-        return [t for t in tasks if not t["completed"]]
-    if status == "completed":
-        return [t for t in tasks if t["completed"]]
-    return tasks
+
+def get_task(user_id: str, task_id: int) -> Optional[Task]:
+    store = _TASKS.get(user_id)
+    return store.by_id.get(task_id) if store is not None else None
+
+
+def find_task_by_title(user_id: str, title: str) -> Optional[Task]:
+    """Newest task whose title equals `title` (case/whitespace-insensitive), O(1)."""
+    store = _TASKS.get(user_id)
+    if store is None:
+        return None
+    with store.lock:
+        tid = store.titles.exact(title)
+        return store.by_id.get(tid) if tid is not None else None
+
+
+def suggest_tasks(user_id: str, title: str, limit: int = 3) -> List[Task]:
+    """Prefix and fuzzy title candidates, for "did you mean" replies."""
+    store = _TASKS.get(user_id)
+    if store is None:
+        return []
+    with store.lock:
+        ids = store.titles.suggest(title, limit)
+        return [store.by_id[tid] for tid in ids if tid in store.by_id]
+
+
+def search_tasks(user_id: str, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[Task], int]:
+    """Ranked full-text search over title + description: (page, total matches)."""
+    store = _TASKS.get(user_id)
+    if store is None:
+        return [], 0
+    with store.lock:
+        ids, total = store.text.search(query, limit, offset)
+        return [store.by_id[tid] for tid in ids], total
+
+
+def list_tasks(user_id: str, status: Literal["all", "pending", "completed"] = "all") -> TaskView:
+    if status not in ("pending", "completed"):
+        status = "all"
+    return TaskView(_ensure_user(user_id), status)
+
+
+def list_tasks_page(
+    user_id: str,
+    status: Literal["all", "pending", "completed"] = "all",
+    limit: int = 50,
+    after_id: Optional[int] = None,
+) -> Tuple[List[Task], Optional[int]]:
+    """
+    Keyset page of the newest-first listing: up to `limit` tasks with
+    id < after_id. Returns (page, next_after_id); next is None on the last page.
+    """
+    if status not in ("pending", "completed"):
+        status = "all"
+    items = _ensure_user(user_id).snapshot(status)
+    start = 0
+    if after_id is not None:
+        # ids are descending, so search on -id
+        start = bisect.bisect_right(items, -after_id, key=lambda t: -t["id"])
+    page = list(items[start:start + limit])
+    next_after_id = page[-1]["id"] if page and start + limit < len(items) else None
+    return page, next_after_id
 
 
 def update_task(
@@ -71,34 +355,147 @@ def update_task(
     description: Optional[str] = None,
     due_date: Optional[ISODate] = None,
 ) -> Optional[Task]:
-    tasks = _ensure_user(user_id)
-    for t in tasks:
-        if t["id"] == task_id:
-            if title is not None:
-                t["title"] = title.strip()
-            if description is not None:
-                t["description"] = description.strip() if isinstance(description, str) else None
-            if due_date is not None:
-                t["due_date"] = _to_iso(due_date)
-            return t
-    return None
+    store = _TASKS.get(user_id)
+    if store is None:
+        return None
+    with store.lock:
+        t = store.by_id.get(task_id)
+        if t is None:
+            return None
+        indexed = (t["title"], t["description"])
+        if title is not None:
+            store.rename(t, title.strip())
+        if description is not None:
+            t["description"] = description.strip() if isinstance(description, str) else None
+        if due_date is not None:
+            t["due_date"] = _to_iso(due_date)
+        store.text.replace(task_id, indexed, (t["title"], t["description"]))
+        store.touch()
+    return t
 
 
 def complete_task(user_id: str, task_id: int, completed: Optional[bool] = None) -> Optional[Task]:
-    tasks = _ensure_user(user_id)
-    for t in tasks:
-        if t["id"] == task_id:
-            if completed is None:
-                t["completed"] = not t["completed"]
-            else:
-                t["completed"] = bool(completed)
-            return t
-    return None
+    store = _TASKS.get(user_id)
+    if store is None:
+        return None
+    with store.lock:
+        t = store.by_id.get(task_id)
+        if t is None:
+            return None
+        # read-modify-write under the lock so concurrent toggles never cancel out
+        value = (not t["completed"]) if completed is None else bool(completed)
+        store.set_completed(t, value)
+    return t
 
 
 def delete_task(user_id: str, task_id: int) -> Optional[Task]:
-    tasks = _ensure_user(user_id)
-    for i, t in enumerate(tasks):
-        if t["id"] == task_id:
-            return tasks.pop(i)
-    return None
+    store = _TASKS.get(user_id)
+    if store is None:
+        return None
+    with store.lock:
+        return store.remove(task_id)
+
+
+# -----------------------------
+# Bulk operations
+# -----------------------------
+# One lock acquisition per call however large the batch, so a concurrent
+# reader sees none or all of it. Ids are de-duplicated; unknown ids and tasks
+# already in the requested state are skipped. Each returns the tasks it
+# actually changed (for events), in request order.
+
+
+def add_tasks(user_id: str, items: Iterable[Mapping[str, Any]]) -> List[Task]:
+    """items: {"title", "description"?, "due_date"?} mappings."""
+    store = _ensure_user(user_id)
+    tasks: List[Task] = [
+        {
+            "id": 0,
+            "user_id": user_id,
+            "title": str(item["title"]).strip(),
+            "description": (item["description"].strip() if isinstance(item.get("description"), str) else None),
+            "completed": False,
+            "due_date": _to_iso(item.get("due_date")),
+        }
+        for item in items
+    ]
+    with store.lock:
+        for task in tasks:
+            task["id"] = next(_ID_SEQ)
+            store.add(task)
+    return tasks
+
+
+def complete_tasks(user_id: str, task_ids: Optional[Iterable[int]] = None, completed: bool = True) -> List[Task]:
+    """Set `completed` on the given ids; task_ids=None means every task in the other state ("complete all pending")."""
+    store = _TASKS.get(user_id)
+    if store is None:
+        return []
+    with store.lock:
+        if task_ids is None:
+            targets = list(store.bucket("pending" if completed else "completed").values())
+        else:
+            targets = [t for t in map(store.by_id.get, dict.fromkeys(task_ids)) if t is not None]
+        return store.set_completed_many(targets, bool(completed))
+
+
+def delete_tasks(user_id: str, task_ids: Iterable[int]) -> List[Task]:
+    store = _TASKS.get(user_id)
+    if store is None:
+        return []
+    with store.lock:
+        return store.remove_many(dict.fromkeys(task_ids))
+
+
+def clear_completed(user_id: str) -> List[Task]:
+    """Delete every completed task."""
+    store = _TASKS.get(user_id)
+    if store is None:
+        return []
+    with store.lock:
+        return store.remove_many(list(store.bucket("completed")))
+
+
+# -----------------------------
+# Cache hooks (app/repository.py)
+# -----------------------------
+# With TASK_STORE=sql the stores above are a cache of the tasks table: the
+# repository loads a user's committed rows, writes every committed change
+# through, and drops whole users when it evicts.
+
+
+def is_loaded(user_id: str) -> bool:
+    return user_id in _TASKS
+
+
+def user_size(user_id: str) -> int:
+    store = _TASKS.get(user_id)
+    return len(store.by_id) if store is not None else 0
+
+
+def load_user(user_id: str, tasks: Iterable[Task]) -> int:
+    """Replace the user's store with `tasks` (ascending id order is cheapest); returns the count."""
+    store = _UserTasks(_lock_for(user_id))
+    for task in tasks:
+        store.add(task)
+    store.touch()  # an empty account gets a fresh version too
+    _TASKS[user_id] = store
+    return len(store.by_id)
+
+
+def put_tasks(user_id: str, tasks: Iterable[Task]) -> None:
+    """Upsert committed rows into a loaded user; no-op when the user is not loaded."""
+    store = _TASKS.get(user_id)
+    if store is None:
+        return
+    with store.lock:
+        for task in tasks:
+            store.upsert(task)
+
+
+def drop_user(user_id: str) -> None:
+    _TASKS.pop(user_id, None)
+
+
+def loaded_users() -> int:
+    return len(_TASKS)
@@ -0,0 +1,153 @@
+"""
+Per-user full-text index for the in-memory task store
+
+- inverted index: term -> {task_id: weighted term frequency}; title terms
+  count double so a title hit outranks a description hit
+- queries are AND over their terms; the last term also matches as a prefix
+  ("buy mil" finds "buy milk") through a sorted vocabulary + bisect, once it
+  has MIN_PREFIX characters (shorter prefixes match half the vocabulary)
+- ranked with BM25, ties newest first; only the requested page is sorted
+  (heapq), so a broad query on a big account stays cheap
+
+Maintained incrementally by app/tools/tasks.py on add/update/delete,
+always under the owning user's lock.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r"\w+")
+
+TITLE_WEIGHT = 2
+_K1 = 1.2
+_B = 0.75
+MIN_PREFIX = 3
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(str(text or "").lower())
+
+
+def _weighted_terms(title: str, description: Optional[str]) -> Dict[str, int]:
+    tf: Dict[str, int] = {}
+    for term in tokenize(title):
+        tf[term] = tf.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(description):
+        tf[term] = tf.get(term, 0) + 1
+    return tf
+
+
+class TextIndex:
+    __slots__ = ("_postings", "_vocab", "_lengths", "_total_length")
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._vocab: List[str] = []  # sorted terms, for prefix expansion
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    # ---- maintenance (callers pass the values that were indexed) ----
+
+    def add(self, task_id: int, title: str, description: Optional[str]) -> None:
+        tf = _weighted_terms(title, description)
+        for term, n in tf.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                insort(self._vocab, term)
+            posting[task_id] = n
+        length = sum(tf.values())
+        self._lengths[task_id] = length
+        self._total_length += length
+
+    def remove(self, task_id: int, title: str, description: Optional[str]) -> None:
+        length = self._lengths.pop(task_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in _weighted_terms(title, description):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(task_id, None)
+            if not posting:
+                del self._postings[term]
+                i = bisect_left(self._vocab, term)
+                if i < len(self._vocab) and self._vocab[i] == term:
+                    del self._vocab[i]
+
+    def replace(
+        self,
+        task_id: int,
+        old: Tuple[str, Optional[str]],
+        new: Tuple[str, Optional[str]],
+    ) -> None:
+        if old == new:
+            return
+        self.remove(task_id, *old)
+        self.add(task_id, *new)
+
+    # ---- search ----
+
+    def _expand(self, prefix: str) -> List[str]:
+        out: List[str] = []
+        i = bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and len(out) < MAX_PREFIX_EXPANSIONS:
+            term = self._vocab[i]
+            if not term.startswith(prefix):
+                break
+            out.append(term)
+            i += 1
+        return out
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[int], int]:
+        """(task ids for the page, best match first; total number of matches)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self._lengths:
+            return [], 0
+
+        # one {task_id: tf} per query term; the last term also matches as a prefix
+        groups: List[Dict[int, int]] = []
+        for i, term in enumerate(terms):
+            if i == len(terms) - 1 and len(term) >= MIN_PREFIX:
+                merged: Dict[int, int] = {}
+                for expanded in self._expand(term):
+                    for tid, n in self._postings[expanded].items():
+                        if n > merged.get(tid, 0):
+                            merged[tid] = n
+                group = merged
+            else:
+                group = self._postings.get(term, {})
+            if not group:
+                return [], 0
+            groups.append(group)
+
+        # AND: walk the rarest term, probe the others
+        groups.sort(key=len)
+        candidates = [tid for tid in groups[0] if all(tid in g for g in groups[1:])]
+        if not candidates:
+            return [], 0
+
+        n_docs = len(self._lengths)
+        avg_len = self._total_length / n_docs
+        idf = [math.log(1.0 + (n_docs - len(g) + 0.5) / (len(g) + 0.5)) for g in groups]
+
+        def score(tid: int) -> Tuple[float, int]:
+            norm = _K1 * (1.0 - _B + _B * self._lengths[tid] / avg_len)
+            s = 0.0
+            for g, w in zip(groups, idf):
+                tf = g[tid]
+                s += w * tf * (_K1 + 1.0) / (tf + norm)
+            return (-s, -tid)
+
+        page = heapq.nsmallest(offset + limit, candidates, key=score)[offset:]
+        return page, len(candidates)
@@ -0,0 +1,141 @@
+"""
+Per-user title index for the in-memory task store
+
+- exact: normalized title -> task ids (O(1) "complete milk")
+- prefix: sorted distinct titles + bisect ("complete mil" -> "milk")
+- fuzzy: per-word trigram postings pick a small candidate pool, which is
+  re-ranked with difflib ("complete mlik" -> "buy milk")
+
+Maintained incrementally by app/tools/tasks.py on add/update/delete,
+always under the owning user's lock.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(str(title or "").split()).lower()
+
+
+def _trigrams(norm: str) -> Set[str]:
+    grams: Set[str] = set()
+    for word in norm.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _similarity(query: str, candidate: str) -> float:
+    # whole-title ratio, or the best single word (typos in one word of a longer title)
+    best = SequenceMatcher(None, query, candidate).ratio()
+    if " " not in query:
+        for word in candidate.split():
+            best = max(best, SequenceMatcher(None, query, word).ratio())
+    return best
+
+
+class TitleIndex:
+    __slots__ = ("_exact", "_sorted", "_grams")
+
+    def __init__(self) -> None:
+        # norm -> {task_id: None}; dict keeps insertion (= id) order
+        self._exact: Dict[str, Dict[int, None]] = {}
+        self._sorted: List[str] = []
+        self._grams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    # ---- maintenance ----
+
+    def add(self, task_id: int, title: str) -> None:
+        norm = normalize_title(title)
+        if not norm:
+            return
+        ids = self._exact.get(norm)
+        if ids is None:
+            ids = self._exact[norm] = {}
+            insort(self._sorted, norm)
+            for g in _trigrams(norm):
+                self._grams.setdefault(g, set()).add(norm)
+        ids[task_id] = None
+
+    def remove(self, task_id: int, title: str) -> None:
+        norm = normalize_title(title)
+        ids = self._exact.get(norm)
+        if ids is None:
+            return
+        ids.pop(task_id, None)
+        if ids:
+            return
+
+        del self._exact[norm]
+        i = bisect_left(self._sorted, norm)
+        if i < len(self._sorted) and self._sorted[i] == norm:
+            del self._sorted[i]
+        for g in _trigrams(norm):
+            bucket = self._grams.get(g)
+            if bucket is not None:
+                bucket.discard(norm)
+                if not bucket:
+                    del self._grams[g]
+
+    def rename(self, task_id: int, old_title: str, new_title: str) -> None:
+        if normalize_title(old_title) == normalize_title(new_title):
+            return
+        self.remove(task_id, old_title)
+        self.add(task_id, new_title)
+
+    # ---- lookups ----
+
+    def exact(self, title: str) -> Optional[int]:
+        """Newest task id whose title matches exactly (case/space-insensitive)."""
+        ids = self._exact.get(normalize_title(title))
+        if not ids:
+            return None
+        return next(reversed(ids))
+
+    def prefix(self, title: str, limit: int = 5) -> List[str]:
+        norm = normalize_title(title)
+        if not norm:
+            return []
+        out: List[str] = []
+        i = bisect_left(self._sorted, norm)
+        while i < len(self._sorted) and len(out) < limit:
+            candidate = self._sorted[i]
+            if not candidate.startswith(norm):
+                break
+            out.append(candidate)
+            i += 1
+        return out
+
+    def fuzzy(self, title: str, limit: int = 3, min_score: float = 0.6, pool: int = 32) -> List[str]:
+        norm = normalize_title(title)
+        if not norm:
+            return []
+        shared: Counter = Counter()
+        for g in _trigrams(norm):
+            shared.update(self._grams.get(g, ()))
+
+        scored = []
+        for candidate, _ in shared.most_common(pool):
+            score = _similarity(norm, candidate)
+            if score >= min_score:
+                scored.append((score, candidate))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [c for _, c in scored[:limit]]
+
+    def suggest(self, title: str, limit: int = 3) -> List[int]:
+        """Task ids for "did you mean": prefix matches first, then fuzzy ones."""
+        seen: List[str] = []
+        for norm in self.prefix(title, limit) + self.fuzzy(title, limit):
+            if norm not in seen:
+                seen.append(norm)
+            if len(seen) >= limit:
+                break
+        return [next(reversed(self._exact[n])) for n in seen]
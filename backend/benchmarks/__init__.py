@@ -0,0 +1,7 @@
+"""
+Benchmarks and stress harnesses for the backend.
+
+Run from the backend/ directory so the `app` package is importable:
+
+    python -m benchmarks.<name> --help
+"""
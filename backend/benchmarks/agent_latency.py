@@ -0,0 +1,96 @@
+"""
+TodoAgent turn latency: shared pooled client vs a fresh client per turn
+
+Drives TodoAgent.run against benchmarks.fake_openai and prints p50/p99.
+Against localhost only the TCP connect is saved per turn; against the real
+API each fresh client also pays DNS + TLS, so the gap is much larger there.
+
+Usage:
+    python -m benchmarks.agent_latency --turns 300 --concurrency 8 --latency 0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import List
+
+from benchmarks.fake_openai import FakeOpenAI
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+async def _run(turns: int, concurrency: int, pooled: bool) -> List[float]:
+    from app.agents import openai_client
+    from app.agents.agent import TodoAgent
+
+    agent = TodoAgent()
+    sem = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+
+    async def one(i: int) -> None:
+        async with sem:
+            start = time.perf_counter()
+            if pooled:
+                await agent.run(f"add task {i}", history=[])
+            else:
+                # what TodoAgent used to do: a brand-new client per turn
+                async with openai_client.build_client() as client:
+                    await openai_client.post_json(
+                        "/chat/completions",
+                        {"model": "fake", "messages": [{"role": "user", "content": f"add task {i}"}]},
+                        api_key="bench",
+                        client=client,
+                    )
+            samples.append((time.perf_counter() - start) * 1000.0)
+
+    await openai_client.startup()
+    try:
+        await asyncio.gather(*(one(i) for i in range(turns)))
+    finally:
+        await openai_client.shutdown()
+    return samples
+
+
+def _report(label: str, samples: List[float]) -> None:
+    print(
+        f"{label:<10} turns={len(samples):<5} "
+        f"mean={statistics.mean(samples):7.2f}ms "
+        f"p50={percentile(samples, 50):7.2f}ms "
+        f"p99={percentile(samples, 99):7.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake server think time (s)")
+    parser.add_argument("--fail-every", type=int, default=0, help="answer 429 every Nth request")
+    args = parser.parse_args()
+
+    with FakeOpenAI(latency=args.latency, fail_every=args.fail_every) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        os.environ.setdefault("OPENAI_BACKOFF_BASE", "0.01")
+
+        # imported after OPENAI_BASE_URL is set
+        unpooled = asyncio.run(_run(args.turns, args.concurrency, pooled=False))
+        pooled = asyncio.run(_run(args.turns, args.concurrency, pooled=True))
+
+        _report("unpooled", unpooled)
+        _report("pooled", pooled)
+        print(f"server requests={fake.requests}")
+
+
+if __name__ == "__main__":
+    main()
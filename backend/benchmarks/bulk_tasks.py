@@ -0,0 +1,98 @@
+"""
+Bulk task operations vs one call per task
+
+SQL path (the task repository, app/repository.py; throwaway SQLite DB):
+- create / complete / delete --tasks tasks one at a time, then with the
+  set-based calls (one statement and one commit each); counts COMMITs
+
+In-memory store (app/tools/tasks):
+- the same three operations per task vs add_tasks / complete_tasks / delete_tasks
+
+Usage:
+    python -m benchmarks.bulk_tasks --tasks 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+
+def _timed(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000)
+    args = parser.parse_args()
+    n = args.tasks
+
+    tmp = tempfile.mkdtemp(prefix="bulk-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+
+    # imported after DATABASE_URL points at the throwaway DB
+    from sqlalchemy import event
+
+    from app import migrate
+    from app.db import engine, get_async_engine
+    from app.repository import SqlTaskRepository
+    from app.tools import tasks as store
+
+    migrate.migrate(engine)
+    repo = SqlTaskRepository()
+    commits = [0]
+
+    @event.listens_for(get_async_engine().sync_engine, "commit")
+    def _count(_conn):
+        commits[0] += 1
+
+    # one loop for the whole run: the async engine's connections belong to it
+    loop = asyncio.new_event_loop()
+    run = loop.run_until_complete
+
+    titles = [f"task {i}" for i in range(n)]
+    items = [{"title": t} for t in titles]
+    rows: List[Tuple[str, str, float, int]] = []
+
+    def sql_run(label: str, fn: Callable[[], object]) -> None:
+        before = commits[0]
+        ms = _timed(fn)
+        rows.append(("sql", label, ms, commits[0] - before))
+
+    ids: Dict[str, List[int]] = {}
+    sql_run("create x1", lambda: ids.__setitem__("one", [run(repo.create("one", t))["id"] for t in titles]))
+    sql_run("create bulk", lambda: ids.__setitem__("bulk", [t["id"] for t in run(repo.create_many("bulk", items))]))
+    sql_run("complete x1", lambda: [run(repo.set_completed("one", i)) for i in ids["one"]])
+    sql_run("complete bulk", lambda: run(repo.set_completed_many("bulk", ids["bulk"])))
+    sql_run("delete x1", lambda: [run(repo.delete("one", i)) for i in ids["one"]])
+    sql_run("delete bulk", lambda: run(repo.delete_many("bulk", ids["bulk"])))
+    sql_left = len(run(repo.list("one"))) + len(run(repo.list("bulk")))
+    repo.clear()  # its cache is the same module store the memory rows go into below
+    loop.close()
+
+    mem: Dict[str, List[int]] = {}
+    rows.append(("memory", "create x1", _timed(lambda: mem.__setitem__("one", [store.add_task("one", t)["id"] for t in titles])), 0))
+    rows.append(("memory", "create bulk", _timed(lambda: mem.__setitem__("bulk", [t["id"] for t in store.add_tasks("bulk", items)])), 0))
+    rows.append(("memory", "complete x1", _timed(lambda: [store.complete_task("one", i, True) for i in mem["one"]]), 0))
+    rows.append(("memory", "complete bulk", _timed(lambda: store.complete_tasks("bulk", mem["bulk"])), 0))
+    rows.append(("memory", "delete x1", _timed(lambda: [store.delete_task("one", i) for i in mem["one"]]), 0))
+    rows.append(("memory", "delete bulk", _timed(lambda: store.delete_tasks("bulk", mem["bulk"])), 0))
+
+    leftovers = sql_left + len(store.list_tasks("one")) + len(store.list_tasks("bulk"))
+    print(f"tasks={n}")
+    for path, label, ms, n_commits in rows:
+        extra = f" commits={n_commits}" if path == "sql" else ""
+        print(f"{path:<7}{label:<15}{ms:10.1f}ms{extra}")
+    if leftovers:
+        raise SystemExit(f"{leftovers} tasks left behind")
+
+
+if __name__ == "__main__":
+    main()
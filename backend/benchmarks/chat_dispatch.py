@@ -0,0 +1,109 @@
+"""
+Micro-benchmark for chat command classification in app/agent_runner.py
+
+- "before": the original chain of up to six re.match(..., re.I) calls
+- "after": the table-driven _classify() (one split + one dict lookup)
+- "end-to-end": full run_user_chat() on the same message mix, store included
+
+Usage:
+    python -m benchmarks.chat_dispatch --messages 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+# measures the in-memory store; set before app.repository picks its backend
+os.environ.setdefault("TASK_STORE", "memory")
+
+from app import agent_runner  # noqa: E402
+
+# Realistic mix from chat logs: lots of list/add, some complete/delete,
+# a tail of stats/help and free text that falls through to the help reply.
+MIX: List[Tuple[str, float]] = [
+    ("list", 0.25),
+    ("list pending", 0.08),
+    ("add buy groceries for the week", 0.22),
+    ("complete 3", 0.12),
+    ("complete buy groceries for the week", 0.05),
+    ("delete 7", 0.06),
+    ("remove call the plumber", 0.02),
+    ("stats", 0.08),
+    ("help", 0.04),
+    ("what should I do today?", 0.08),
+]
+
+
+def legacy_classify(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """The pre-dispatcher regex chain, kept here as the baseline."""
+    if re.match(r"^(help|\?)$", text, re.I):
+        return "help", None
+    m = re.match(r"^add\s+(.+)$", text, re.I)
+    if m:
+        return "add", m.group(1).strip()
+    m = re.match(r"^list(?:\s+(all|pending|completed))?$", text, re.I)
+    if m:
+        return "list", m.group(1)
+    if re.match(r"^stats$", text, re.I):
+        return "stats", None
+    m = re.match(r"^complete\s+(.+)$", text, re.I)
+    if m:
+        return "complete", m.group(1).strip()
+    m = re.match(r"^(delete|remove)\s+(.+)$", text, re.I)
+    if m:
+        return "delete", m.group(2).strip()
+    return None, None
+
+
+def _messages(n: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    texts = [t for t, _ in MIX]
+    weights = [w for _, w in MIX]
+    return rng.choices(texts, weights=weights, k=n)
+
+
+def _rate(fn: Callable[[str], object], messages: List[str]) -> float:
+    start = time.perf_counter()
+    for text in messages:
+        fn(text)
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def _end_to_end(messages: List[str]) -> float:
+    start = time.perf_counter()
+    for text in messages:
+        await agent_runner.run_user_chat("bench-user", text)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    messages = _messages(args.messages)
+
+    # sanity: both classifiers agree on the command for every message in the mix
+    for text, _ in MIX:
+        cmd, _arg = agent_runner._classify(text)
+        legacy, _ = legacy_classify(text)
+        assert (cmd.name if cmd else None) == legacy, text
+
+    before = _rate(legacy_classify, messages)
+    after = _rate(agent_runner._classify, messages)
+    e2e = asyncio.run(_end_to_end(messages[: min(len(messages), 20000)]))
+
+    print(f"messages={len(messages)}")
+    print(f"before (regex chain): {before:>12,.0f} cmds/s")
+    print(f"after  (dispatcher) : {after:>12,.0f} cmds/s  ({after / before:.1f}x)")
+    print(f"end-to-end run_user_chat: {e2e:,.0f} cmds/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Conversation history reads on long conversations (app/conversation_store.py)
+
+- seeds --conversations conversations of --messages messages each into a
+  throwaway SQLite DB (core executemany, so seeding stays quick)
+- "before": the old read path - selectin-loaded Conversation.messages,
+  no conversation_id index, oldest-first load_history
+- "after": get_or_create_conversation + load_history as they are now
+- prints per-call p50/p99 and checks load_history returns the NEWEST messages
+
+Usage:
+    python -m benchmarks.chat_history_load --conversations 3 --messages 100000 --limit 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, List
+
+from benchmarks.agent_latency import percentile
+
+
+def _time(fn: Callable[[], object], reps: int) -> List[float]:
+    samples = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=100000, help="messages per conversation")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--reps", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="history-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+
+    # imported after DATABASE_URL points at the throwaway DB
+    from sqlalchemy import insert, text
+    from sqlalchemy.orm import selectinload
+
+    from app.conversation_store import get_or_create_conversation, load_history
+    from app.db import Base, SessionLocal, engine
+    from app.models import Conversation, Message
+
+    Base.metadata.create_all(bind=engine, tables=[Conversation.__table__, Message.__table__])
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        # interleave users so one conversation's rows are spread over the table
+        conn.execute(insert(Conversation), [{"user_id": f"user-{c}"} for c in range(args.conversations)])
+        chunk = 20000
+        total = args.conversations * args.messages
+        for base in range(0, total, chunk):
+            conn.execute(
+                insert(Message),
+                [
+                    {
+                        "conversation_id": (i % args.conversations) + 1,
+                        "role": "user" if i % 2 == 0 else "assistant",
+                        "content": f"message {i // args.conversations} " + "x" * 80,
+                    }
+                    for i in range(base, min(base + chunk, total))
+                ],
+            )
+    print(f"seeded {args.conversations} x {args.messages:,} messages in {time.perf_counter() - start:.1f}s")
+
+    user, convo_id = "user-0", 1
+
+    def old_turn() -> None:
+        db = SessionLocal()
+        try:
+            convo = (
+                db.query(Conversation)
+                .options(selectinload(Conversation.messages))  # what lazy="selectin" did
+                .filter(Conversation.user_id == user)
+                .order_by(Conversation.created_at.desc())
+                .first()
+            )
+            msgs = (
+                db.query(Message)
+                .filter(Message.conversation_id == convo.id)
+                .order_by(Message.created_at.asc())
+                .limit(args.limit)
+                .all()
+            )
+            [{"role": m.role, "content": m.content} for m in msgs]
+        finally:
+            db.close()
+
+    def new_turn() -> None:
+        db = SessionLocal()
+        try:
+            convo = get_or_create_conversation(db, user)
+            load_history(db, convo.id, args.limit)
+        finally:
+            db.close()
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_messages_conversation_id_id"))
+    before = _time(old_turn, max(1, args.reps // 4))
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_messages_conversation_id_id ON messages (conversation_id, id)"))
+    after = _time(new_turn, args.reps)
+
+    db = SessionLocal()
+    try:
+        newest = load_history(db, convo_id, args.limit)
+    finally:
+        db.close()
+    expected_last = f"message {args.messages - 1} "
+    print(f"limit={args.limit}")
+    print(f"before (selectin + no index + oldest-first) p50={percentile(before, 50):9.2f}ms p99={percentile(before, 99):9.2f}ms")
+    print(f"after  (lazy + index + newest N)           p50={percentile(after, 50):9.2f}ms p99={percentile(after, 99):9.2f}ms")
+    print(f"last message returned: {newest[-1]['content'][:24]!r}")
+    if not newest[-1]["content"].startswith(expected_last):
+        raise SystemExit("load_history did not return the newest messages")
+
+
+if __name__ == "__main__":
+    main()
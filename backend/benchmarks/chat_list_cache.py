@@ -0,0 +1,92 @@
+"""
+Repeated `list` / `stats` on a large account: reply cache on vs off
+
+- seeds one user with --tasks tasks (a share of them completed)
+- times --reps calls of each command through the chat dispatcher
+  (agent_runner._classify + handler, i.e. what run_user_chat does minus history)
+  with app.reply_cache disabled, then enabled
+- every --write-every calls a task is toggled, so the cache also pays for
+  its invalidations; replies are checked against the uncached render
+
+Usage:
+    python -m benchmarks.chat_list_cache --tasks 5000 --reps 2000 --write-every 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+# measures the in-memory path; set before app.repository picks its backend
+os.environ.setdefault("TASK_STORE", "memory")
+
+from app import agent_runner  # noqa: E402
+from app.tools import tasks as store  # noqa: E402
+from benchmarks.agent_latency import percentile  # noqa: E402
+
+
+async def _run(user: str, message: str, reps: int, write_every: int, task_ids: List[int]) -> List[float]:
+    cmd, arg = agent_runner._classify(message)
+    assert cmd is not None
+    samples: List[float] = []
+    for i in range(reps):
+        if write_every and i and i % write_every == 0:
+            store.complete_task(user, task_ids[i % len(task_ids)])  # toggle: bumps the version
+        start = time.perf_counter()
+        await cmd.handler(user, arg)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--reps", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=50, help="toggle a task every N calls (0 = never)")
+    args = parser.parse_args()
+
+    user = "bench-list-cache"
+    ids = [store.add_task(user, f"task number {i}")["id"] for i in range(args.tasks)]
+    for tid in ids[::3]:
+        store.complete_task(user, tid, True)
+
+    cache = agent_runner._REPLY_CACHE
+    results: Dict[str, Dict[str, List[float]]] = {}
+    for label, enabled in (("uncached", False), ("cached", True)):
+        cache.enabled = enabled
+        cache.clear()
+        results[label] = {
+            message: await _run(user, message, args.reps, args.write_every, ids)
+            for message in ("list", "list pending", "stats")
+        }
+
+    # correctness: a cached reply equals a fresh render at the same version
+    cmd, arg = agent_runner._classify("list")
+    cache.enabled = True
+    cached_reply = await cmd.handler(user, arg)
+    cache.enabled = False
+    fresh_reply = await cmd.handler(user, arg)
+    cache.enabled = True
+
+    print(f"tasks={args.tasks} reps={args.reps} write every {args.write_every} calls")
+    for message in ("list", "list pending", "stats"):
+        off, on = results["uncached"][message], results["cached"][message]
+        print(
+            f"{message:<13} uncached p50={percentile(off, 50):7.3f}ms p99={percentile(off, 99):7.3f}ms | "
+            f"cached p50={percentile(on, 50):7.4f}ms p99={percentile(on, 99):7.3f}ms | "
+            f"total {sum(off):8.1f}ms -> {sum(on):7.1f}ms"
+        )
+    print(f"cache stats: {agent_runner.reply_cache_stats()}")
+    if cached_reply != fresh_reply:
+        raise SystemExit("cached reply differs from a fresh render")
+
+
+def main() -> None:
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
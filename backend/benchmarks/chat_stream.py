@@ -0,0 +1,87 @@
+"""
+Time-to-first-token: POST /api/{user_id}/chat/stream vs the blocking agent turn
+
+Starts benchmarks.fake_openai (first token after --latency, then one token
+every --token-delay) and the real backend app on localhost sockets, then
+measures, per free-text chat turn:
+- stream: time until the first SSE delta arrives, and until "event: done"
+- blocking: time for TodoAgent.run() to return the whole reply
+
+Usage:
+    python -m benchmarks.chat_stream --turns 20 --latency 0.3 --token-delay 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import List, Tuple
+
+import httpx
+
+from benchmarks._server import UvicornThread
+from benchmarks.agent_latency import percentile
+from benchmarks.fake_openai import FakeOpenAI
+
+
+async def _stream_turns(base_url: str, turns: int) -> Tuple[List[float], List[float]]:
+    ttft: List[float] = []
+    total: List[float] = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for i in range(turns):
+            start = time.perf_counter()
+            first = None
+            async with client.stream("POST", "/api/bench/chat/stream", json={"message": f"what next {i}?"}) as resp:
+                async for line in resp.aiter_lines():
+                    if first is None and line.startswith("data:"):
+                        first = time.perf_counter()
+            end = time.perf_counter()
+            ttft.append(((first or end) - start) * 1000.0)
+            total.append((end - start) * 1000.0)
+    return ttft, total
+
+
+async def _blocking_turns(turns: int) -> List[float]:
+    from app.agents import openai_client
+    from app.agents.agent import TodoAgent
+
+    agent = TodoAgent()
+    samples: List[float] = []
+    await openai_client.startup()
+    try:
+        for i in range(turns):
+            start = time.perf_counter()
+            await agent.run(f"what next {i}?", history=[])
+            samples.append((time.perf_counter() - start) * 1000.0)
+    finally:
+        await openai_client.shutdown()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="fake time per extra token (s)")
+    args = parser.parse_args()
+
+    with FakeOpenAI(latency=args.latency, token_delay=args.token_delay) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+        from app.main import app  # after OPENAI_BASE_URL is set
+
+        with UvicornThread(app, lifespan="on") as backend:
+            ttft, stream_total = asyncio.run(_stream_turns(backend.url, args.turns))
+        blocking = asyncio.run(_blocking_turns(args.turns))
+
+    print(f"turns={args.turns}")
+    print(f"stream   first token p50={percentile(ttft, 50):8.1f}ms p99={percentile(ttft, 99):8.1f}ms")
+    print(f"stream   full reply  p50={percentile(stream_total, 50):8.1f}ms p99={percentile(stream_total, 99):8.1f}ms")
+    print(f"blocking full reply  p50={percentile(blocking, 50):8.1f}ms p99={percentile(blocking, 99):8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Chat message writes: commit-per-message vs the write-behind buffer
+
+- --users threads each run --turns chat turns against a throwaway SQLite DB:
+  load_history -> save user message -> "model" sleep -> save assistant message
+  -> "user thinking" sleep
+- every history read checks the user's own previous turn is visible
+  (read-your-writes through app.message_writer.ensure_visible)
+- counts COMMITs on the engine and prints turns/s for both modes
+
+Usage:
+    python -m benchmarks.chat_write_behind --users 32 --turns 50 --model-ms 20 --think-ms 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import List
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--model-ms", type=float, default=20.0, help="simulated model latency per turn")
+    parser.add_argument("--think-ms", type=float, default=50.0, help="simulated user pause between turns")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="write-behind-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+
+    # imported after DATABASE_URL points at the throwaway DB
+    from sqlalchemy import event
+
+    from app import message_writer
+    from app.conversation_store import get_or_create_conversation, load_history, save_message
+    from app.db import Base, SessionLocal, engine
+    from app.models import Conversation, Message
+
+    Base.metadata.create_all(bind=engine, tables=[Conversation.__table__, Message.__table__])
+
+    commits = [0]
+
+    @event.listens_for(engine, "commit")
+    def _count(_conn):
+        commits[0] += 1
+
+    def user_loop(user: str, label: str, errors: List[str]) -> None:
+        with SessionLocal() as db:
+            convo_id = get_or_create_conversation(db, user).id
+        for turn in range(args.turns):
+            # one session per turn, like one per request
+            with SessionLocal() as db:
+                history = load_history(db, convo_id, 4)
+                if turn and history[-1]["content"] != f"{label} reply {turn - 1}":
+                    errors.append(f"{user}: turn {turn - 1} not visible")
+                save_message(db, convo_id, "user", f"{label} ask {turn}")
+            time.sleep(args.model_ms / 1000.0)
+            with SessionLocal() as db:
+                save_message(db, convo_id, "assistant", f"{label} reply {turn}")
+            time.sleep(args.think_ms / 1000.0)
+
+    def run(label: str, write_behind: bool) -> None:
+        message_writer.WRITE_BEHIND = write_behind
+        errors: List[str] = []
+        before = commits[0]
+        threads = [
+            threading.Thread(target=user_loop, args=(f"{label}-{u}", label, errors))
+            for u in range(args.users)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        message_writer.close_all()
+        elapsed = time.perf_counter() - start
+
+        turns = args.users * args.turns
+        n_commits = commits[0] - before - args.users  # minus one conversation insert each
+        print(
+            f"{label:<13} {turns / elapsed:8,.0f} turns/s  commits={n_commits:>6} "
+            f"({n_commits / (turns * 2):.2f} per message)  read-your-writes errors={len(errors)}"
+        )
+        if errors:
+            raise SystemExit(errors[0])
+
+    print(f"users={args.users} turns/user={args.turns} model={args.model_ms:.0f}ms think={args.think_ms:.0f}ms")
+    run("per-message", False)
+    run("write-behind", True)
+
+    db = SessionLocal()
+    try:
+        total = db.query(Message).count()
+    finally:
+        db.close()
+    expected = 2 * 2 * args.users * args.turns
+    print(f"rows in messages: {total} (expected {expected})")
+    if total != expected:
+        raise SystemExit("messages were lost")
+
+
+if __name__ == "__main__":
+    main()
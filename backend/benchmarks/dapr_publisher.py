@@ -0,0 +1,72 @@
+"""
+Dapr task-event publishing: one client + one request per event vs DaprPublisher
+
+- "per-event": what publish_task_event used to do (new AsyncClient per event)
+- "batched": app.dapr_publish.DaprPublisher over one pooled connection
+Both run against benchmarks.fake_dapr; the time the caller spends enqueueing
+(what a task write pays) is reported separately from end-to-end delivery.
+
+Usage:
+    python -m benchmarks.dapr_publisher --events 5000 --latency 0.002
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.dapr_publish import DaprPublisher
+from benchmarks.fake_dapr import FakeDapr
+
+TASK = {"id": 1, "user_id": "bench", "title": "buy milk", "description": None, "completed": False, "due_date": None}
+
+
+async def _per_event(url: str, events: int) -> float:
+    start = time.perf_counter()
+    for i in range(events):
+        async with httpx.AsyncClient(timeout=3.0) as client:
+            await client.post(f"{url}/v1.0/publish/kafka-pubsub/task-events", json={"event_type": "created", "task": TASK})
+    return time.perf_counter() - start
+
+
+async def _batched(url: str, events: int, batch_size: int, linger_ms: int) -> tuple:
+    pub = DaprPublisher(base_url=url, batch_size=batch_size, linger_ms=linger_ms, queue_size=events + 1)
+    await pub.start()
+    start = time.perf_counter()
+    for i in range(events):
+        pub.publish("created", TASK)
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # interleave like real request handling
+    enqueue = time.perf_counter() - start
+    while pub.stats()["published"] + pub.stats()["failed"] < events:
+        await asyncio.sleep(0.001)
+    total = time.perf_counter() - start
+    await pub.stop()
+    return enqueue, total, pub.stats()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.002, help="fake sidecar latency per request (s)")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--linger-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    with FakeDapr(latency=args.latency) as fake:
+        per_event = asyncio.run(_per_event(fake.url, args.events))
+        per_event_requests = fake.requests
+        enqueue, total, stats = asyncio.run(_batched(fake.url, args.events, args.batch_size, args.linger_ms))
+        batched_requests = fake.requests - per_event_requests
+
+    print(f"events={args.events} sidecar latency={args.latency * 1000:.1f}ms")
+    print(f"per-event: {args.events / per_event:>10,.0f} events/s  requests={per_event_requests}")
+    print(f"batched  : {args.events / total:>10,.0f} events/s  requests={batched_requests}  {stats}")
+    print(f"batched enqueue cost: {enqueue / args.events * 1e6:.2f}us per event (what a task write waits)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Local stand-in for the Dapr sidecar's pub/sub HTTP API, for benchmarks
+
+- POST /v1.0/publish/{pubsub}/{topic}               (one event)
+- POST /v1.0-alpha1/publish/bulk/{pubsub}/{topic}   (list of entries)
+- optional per-request latency and a failure every `fail_every` requests
+- counts requests and received events; remembers entry ids to spot duplicates
+- state API: GET/DELETE /v1.0/state/{store}/{key}, POST /v1.0/state/{store}
+  (ETag header on reads, first-write concurrency: 409 on a stale etag)
+- broadcast delivery: every app registered with subscribe() gets each
+  published event on the route its GET /dapr/subscribe names for the topic
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from benchmarks._server import UvicornThread
+
+
+def build_app(latency: float = 0.0, fail_every: int = 0) -> FastAPI:
+    app = FastAPI()
+    counter = itertools.count(1)
+    app.state.requests = 0
+    app.state.events = 0
+    app.state.entry_ids = set()
+    app.state.duplicates = 0
+    app.state.store: Dict[Tuple[str, str], Tuple[Any, str]] = {}
+    app.state.subscribers: List[str] = []
+    app.state.delivered = 0
+    etags = itertools.count(1)
+    routes: Dict[str, Dict[Tuple[str, str], str]] = {}  # app url -> (pubsub, topic) -> route
+    client: Dict[str, httpx.AsyncClient] = {}
+
+    async def _deliver(pubsub: str, topic: str, events: List[Any]) -> None:
+        if not app.state.subscribers:
+            return
+        http = client.get("c")
+        if http is None:
+            http = client["c"] = httpx.AsyncClient(timeout=5.0)
+        for url in list(app.state.subscribers):
+            if url not in routes:
+                try:
+                    subs = (await http.get(f"{url}/dapr/subscribe")).json()
+                except httpx.HTTPError:
+                    continue
+                routes[url] = {(s["pubsubname"], s["topic"]): s["route"] for s in subs}
+            route = routes[url].get((pubsub, topic))
+            if route is None:
+                continue
+            for event in events:
+                try:
+                    await http.post(f"{url}{route}", json={"specversion": "1.0", "topic": topic, "data": event})
+                    app.state.delivered += 1
+                except httpx.HTTPError:
+                    pass
+
+    def _failing() -> bool:
+        n = next(counter)
+        app.state.requests = n
+        return bool(fail_every) and n % fail_every == 0
+
+    @app.post("/v1.0/publish/{pubsub}/{topic}")
+    async def publish(pubsub: str, topic: str, request: Request):
+        await request.body()
+        if latency:
+            await asyncio.sleep(latency)
+        if _failing():
+            return JSONResponse({"errorCode": "ERR_PUBSUB_PUBLISH_MESSAGE"}, status_code=500)
+        app.state.events += 1
+        asyncio.create_task(_deliver(pubsub, topic, [await request.json()]))
+        return Response(status_code=204)
+
+    @app.post("/v1.0-alpha1/publish/bulk/{pubsub}/{topic}")
+    async def publish_bulk(pubsub: str, topic: str, request: Request):
+        entries = await request.json()
+        if latency:
+            await asyncio.sleep(latency)
+        if _failing():
+            failed = [{"entryId": e.get("entryId"), "error": "broker unavailable"} for e in entries]
+            return JSONResponse({"failedEntries": failed, "errorCode": "ERR_PUBSUB_PUBLISH_MESSAGE"}, status_code=500)
+        for e in entries:
+            key = e.get("entryId")
+            if key in app.state.entry_ids:
+                app.state.duplicates += 1
+            app.state.entry_ids.add(key)
+        app.state.events += len(entries)
+        asyncio.create_task(_deliver(pubsub, topic, [e.get("event") for e in entries]))
+        return Response(status_code=204)
+
+    @app.get("/v1.0/state/{store}/{key}")
+    async def state_get(store: str, key: str):
+        item = app.state.store.get((store, key))
+        if item is None:
+            return Response(status_code=204)
+        return JSONResponse(item[0], headers={"ETag": item[1]})
+
+    @app.post("/v1.0/state/{store}")
+    async def state_save(store: str, request: Request):
+        items = await request.json()
+        for item in items:
+            current = app.state.store.get((store, item["key"]))
+            etag = item.get("etag")
+            if etag is not None and (current is None or current[1] != etag):
+                return JSONResponse({"errorCode": "ERR_STATE_SAVE", "message": "possible etag mismatch"}, status_code=409)
+        for item in items:
+            app.state.store[(store, item["key"])] = (item["value"], str(next(etags)))
+        return Response(status_code=204)
+
+    @app.delete("/v1.0/state/{store}/{key}")
+    async def state_delete(store: str, key: str):
+        app.state.store.pop((store, key), None)
+        return Response(status_code=204)
+
+    return app
+
+
+class FakeDapr(UvicornThread):
+    def __init__(self, latency: float = 0.0, fail_every: int = 0, port: Optional[int] = None) -> None:
+        super().__init__(build_app(latency=latency, fail_every=fail_every), port=port)
+
+    @property
+    def events(self) -> int:
+        return self.app.state.events
+
+    @property
+    def requests(self) -> int:
+        return self.app.state.requests
+
+    @property
+    def duplicates(self) -> int:
+        return self.app.state.duplicates
+
+    @property
+    def delivered(self) -> int:
+        return self.app.state.delivered
+
+    def subscribe(self, app_url: str) -> None:
+        """Deliver published events to the app at `app_url` (as its sidecar would)."""
+        self.app.state.subscribers.append(app_url)
@@ -0,0 +1,84 @@
+"""
+Local fake of the OpenAI Chat Completions API, for benchmarks
+
+- POST /v1/chat/completions with a fixed reply: first token after `latency`
+  seconds, then one token every `token_delay` seconds
+- "stream": true answers with SSE chunks like the real API
+- every `fail_every`-th request answers 429 (exercises retry/backoff)
+- runs uvicorn on a free localhost port in a background thread
+
+    with FakeOpenAI(latency=0.02) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks._server import UvicornThread
+
+REPLY = "Sure - I added that to your list. Anything else you want me to track today?"
+
+
+def build_app(latency: float = 0.02, fail_every: int = 0, token_delay: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    counter = itertools.count(1)
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        n = next(counter)
+        app.state.requests = n
+        body = await request.json()
+        if fail_every and n % fail_every == 0:
+            return JSONResponse({"error": {"message": "rate limited"}}, status_code=429, headers={"retry-after": "0"})
+        tokens = [w + " " for w in REPLY.split(" ")]
+
+        if body.get("stream"):
+            async def chunks():
+                await asyncio.sleep(latency)
+                for i, tok in enumerate(tokens):
+                    if i:
+                        await asyncio.sleep(token_delay)
+                    chunk = {"id": f"chatcmpl-{n}", "choices": [{"index": 0, "delta": {"content": tok}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency + token_delay * (len(tokens) - 1))
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        return {
+            "id": f"chatcmpl-{n}",
+            "object": "chat.completion",
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(REPLY.split())},
+        }
+
+    return app
+
+
+class FakeOpenAI(UvicornThread):
+    def __init__(
+        self,
+        latency: float = 0.02,
+        fail_every: int = 0,
+        token_delay: float = 0.0,
+        port: Optional[int] = None,
+    ) -> None:
+        super().__init__(build_app(latency=latency, fail_every=fail_every, token_delay=token_delay), port=port)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    @property
+    def requests(self) -> int:
+        return self.app.state.requests
@@ -0,0 +1,357 @@
+"""
+Load suite: task REST, chat commands and MCP tools, in-process or over a socket
+
+- the real app (app.main) on a throwaway migrated SQLite DB, with
+  benchmarks/fake_openai.py and benchmarks/fake_dapr.py standing in for
+  OpenAI and the Dapr sidecar (nothing leaves localhost)
+- transports: "inprocess" (httpx ASGITransport, no network: the app's own
+  cost) and "socket" (uvicorn on a localhost port: adds HTTP parsing and
+  the socket round trip); MCP tools are Python calls, so in-process only
+- scenarios, each a fixed op mix spread over --users users, --concurrency
+  workers, --ops operations; every user starts with --tasks-per-user tasks
+  - tasks: list / create / toggle / delete / search on /api/{user_id}/tasks
+  - chat:  list / add / complete / stats / search commands on
+           /api/{user_id}/chat, free text to the fake model on /chat/stream
+  - mcp:   list_tasks / add_task / search_tasks / complete_task /
+           complete_tasks through FunctionTool.on_invoke_tool, as the agent
+           runtime calls them
+- prints throughput and p50/p95/p99 (overall and per op); --out saves JSON,
+  --baseline compares a previous JSON and flags slower runs
+
+Usage:
+    python -m benchmarks.load --users 20 --tasks-per-user 50 --ops 2000
+    python -m benchmarks.load --transport both --out load.json
+    python -m benchmarks.load --baseline load.json --max-regression 0.2 --fail-on-regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks._server import UvicornThread
+from benchmarks.agent_latency import percentile
+from benchmarks.fake_dapr import FakeDapr
+from benchmarks.fake_openai import FakeOpenAI
+
+SCENARIOS = ("tasks", "chat", "mcp")
+TRANSPORTS = ("inprocess", "socket")
+
+# op -> weight; picked per op with a seeded RNG so runs are comparable
+MIXES: Dict[str, Dict[str, int]] = {
+    "tasks": {"list": 50, "create": 15, "toggle": 15, "delete": 10, "search": 10},
+    "chat": {"list": 40, "add": 20, "complete": 10, "stats": 10, "search": 10, "free_text": 10},
+    "mcp": {"list_tasks": 40, "add_task": 20, "search_tasks": 20, "complete_task": 10, "complete_tasks": 10},
+}
+
+WORDS = ("milk", "report", "call", "invoice", "garden", "review", "train", "dentist", "taxes", "laundry")
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+    }
+
+
+class _Run:
+    """Shared state of one scenario run: per-user ids and per-op latencies."""
+
+    def __init__(self, users: List[str], ids: Dict[str, List[int]], seed: int) -> None:
+        self.users = users
+        self.ids = ids
+        self.rng = random.Random(seed)
+        self.samples: Dict[str, List[float]] = {}
+        self.errors = 0
+
+    def title(self) -> str:
+        return f"{self.rng.choice(WORDS)} {self.rng.choice(WORDS)} {self.rng.randrange(10000)}"
+
+    def some_id(self, user: str) -> Optional[int]:
+        ids = self.ids[user]
+        return self.rng.choice(ids) if ids else None
+
+
+Op = Callable[[_Run, str], Awaitable[bool]]
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+
+
+def _task_ops(http: httpx.AsyncClient) -> Dict[str, Op]:
+    async def list_(run: _Run, user: str) -> bool:
+        return (await http.get(f"/api/{user}/tasks")).status_code == 200
+
+    async def create(run: _Run, user: str) -> bool:
+        resp = await http.post(f"/api/{user}/tasks", json={"title": run.title()})
+        if resp.status_code == 200:
+            run.ids[user].append(resp.json()["id"])
+        return resp.status_code == 200
+
+    async def toggle(run: _Run, user: str) -> bool:
+        task_id = run.some_id(user)
+        return task_id is None or (await http.patch(f"/api/{user}/tasks/{task_id}", json={})).status_code == 200
+
+    async def delete(run: _Run, user: str) -> bool:
+        ids = run.ids[user]
+        if not ids:
+            return True
+        task_id = ids.pop()  # newest first, so the seeded tasks mostly stay
+        return (await http.delete(f"/api/{user}/tasks/{task_id}")).status_code in (200, 404)
+
+    async def search(run: _Run, user: str) -> bool:
+        return (await http.get(f"/api/{user}/tasks/search", params={"q": run.rng.choice(WORDS)})).status_code == 200
+
+    return {"list": list_, "create": create, "toggle": toggle, "delete": delete, "search": search}
+
+
+def _chat_ops(http: httpx.AsyncClient) -> Dict[str, Op]:
+    async def say(user: str, message: str) -> bool:
+        return (await http.post(f"/api/{user}/chat", json={"message": message})).status_code == 200
+
+    async def complete(run: _Run, user: str) -> bool:
+        task_id = run.some_id(user)
+        return await say(user, f"complete {task_id}" if task_id is not None else "list")
+
+    async def free_text(run: _Run, user: str) -> bool:
+        # only the streaming endpoint hands free text to the model
+        async with http.stream("POST", f"/api/{user}/chat/stream", json={"message": "what should I focus on today?"}) as resp:
+            body = await resp.aread()
+        return resp.status_code == 200 and b"event: done" in body
+
+    return {
+        "list": lambda run, user: say(user, "list"),
+        "add": lambda run, user: say(user, f"add {run.title()}"),
+        "complete": complete,
+        "stats": lambda run, user: say(user, "stats"),
+        "search": lambda run, user: say(user, f"search {run.rng.choice(WORDS)}"),
+        "free_text": free_text,
+    }
+
+
+def _mcp_ops() -> Dict[str, Op]:
+    from agents.tool_context import ToolContext
+
+    from app import mcp_tools
+
+    calls = itertools.count(1)
+
+    async def invoke(name: str, args: Dict[str, Any]) -> bool:
+        tool = getattr(mcp_tools, name)
+        raw = json.dumps(args)
+        ctx = ToolContext(context=None, tool_name=tool.name, tool_call_id=f"call-{next(calls)}", tool_arguments=raw)
+        out = await tool.on_invoke_tool(ctx, raw)
+        return isinstance(out, str)
+
+    async def complete_tasks(run: _Run, user: str) -> bool:
+        ids = run.rng.sample(run.ids[user], min(3, len(run.ids[user])))
+        return await invoke("complete_tasks", {"user_id": user, "task_ids": ids})
+
+    return {
+        "list_tasks": lambda run, user: invoke("list_tasks", {"user_id": user}),
+        "add_task": lambda run, user: invoke("add_task", {"user_id": user, "title": run.title()}),
+        "search_tasks": lambda run, user: invoke("search_tasks", {"user_id": user, "query": run.rng.choice(WORDS)}),
+        "complete_task": lambda run, user: invoke("complete_task", {"user_id": user, "title": run.rng.choice(WORDS)}),
+        "complete_tasks": complete_tasks,
+    }
+
+
+async def _drive(run: _Run, ops: Dict[str, Op], mix: Dict[str, int], n_ops: int, concurrency: int) -> Dict[str, Any]:
+    names = list(mix)
+    plan = run.rng.choices(names, weights=[mix[n] for n in names], k=n_ops)
+    todo = iter(enumerate(plan))
+
+    async def worker(w: int) -> None:
+        for i, name in todo:
+            user = run.users[(w + i) % len(run.users)]
+            start = time.perf_counter()
+            try:
+                ok = await ops[name](run, user)
+            except Exception:
+                ok = False
+            run.samples.setdefault(name, []).append((time.perf_counter() - start) * 1000.0)
+            if not ok:
+                run.errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    every = [s for samples in run.samples.values() for s in samples]
+    out: Dict[str, Any] = {"ops": len(every), "seconds": round(seconds, 3), "throughput": round(len(every) / seconds, 1)}
+    out.update(_summary(every))
+    out["errors"] = run.errors
+    out["by_op"] = {name: _summary(s) for name, s in sorted(run.samples.items())}
+    return out
+
+
+# -----------------------------
+# Transports
+# -----------------------------
+
+
+async def _seed(http: httpx.AsyncClient, users: List[str], per_user: int) -> Dict[str, List[int]]:
+    rng = random.Random(1)
+    ids: Dict[str, List[int]] = {}
+    for user in users:
+        ids[user] = []
+        for chunk in range(0, per_user, 1000):
+            n = min(1000, per_user - chunk)
+            tasks = [{"title": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {chunk + k}"} for k in range(n)]
+            resp = await http.post(f"/api/{user}/tasks/bulk", json={"tasks": tasks})
+            resp.raise_for_status()
+            ids[user].extend(t["id"] for t in resp.json())
+    return ids
+
+
+async def _scenarios(http: httpx.AsyncClient, args: argparse.Namespace, transport: str, prefix: str) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for scenario in args.scenarios:
+        if scenario == "mcp" and transport != "inprocess":
+            continue  # tools are Python calls; no socket in between
+        users = [f"{prefix}-{scenario}-{u}" for u in range(args.users)]
+        ids = await _seed(http, users, args.tasks_per_user)
+        run = _Run(users, ids, seed=args.seed)
+        ops = _mcp_ops() if scenario == "mcp" else (_task_ops(http) if scenario == "tasks" else _chat_ops(http))
+        results[f"{transport}/{scenario}"] = await _drive(run, ops, MIXES[scenario], args.ops, args.concurrency or args.users)
+    return results
+
+
+async def _inprocess(app: Any, args: argparse.Namespace) -> Dict[str, Any]:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=30) as http:
+            return await _scenarios(http, args, "inprocess", "ip")
+
+
+async def _socket(url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=(args.concurrency or args.users) + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=limits) as http:
+        return await _scenarios(http, args, "socket", "so")
+
+
+# -----------------------------
+# Report / baseline
+# -----------------------------
+
+
+def _meta(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "git": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "users": args.users,
+        "tasks_per_user": args.tasks_per_user,
+        "ops": args.ops,
+        "concurrency": args.concurrency or args.users,
+        "task_store": args.store,
+        "openai_latency": args.openai_latency,
+    }
+
+
+def _print(results: Dict[str, Any]) -> None:
+    for key, r in results.items():
+        print(
+            f"{key:<18} {r['throughput']:>9,.1f} ops/s  p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms "
+            f"p99={r['p99_ms']:8.2f}ms errors={r['errors']}"
+        )
+        for op, s in r["by_op"].items():
+            print(f"    {op:<15} n={s['count']:<6} p50={s['p50_ms']:8.2f}ms p95={s['p95_ms']:8.2f}ms p99={s['p99_ms']:8.2f}ms")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Print current vs baseline per scenario; returns the scenarios that got slower than allowed."""
+    regressions: List[str] = []
+    print(f"vs baseline {baseline.get('meta', {}).get('git') or '?'} (allowed: {max_regression:.0%})")
+    for key, cur in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            print(f"{key:<18} (not in baseline)")
+            continue
+        tput = cur["throughput"] / base["throughput"] - 1 if base["throughput"] else 0.0
+        p95 = cur["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        slower = tput < -max_regression or p95 > max_regression
+        if slower:
+            regressions.append(key)
+        print(f"{key:<18} throughput {tput:+7.1%}  p95 {p95:+7.1%}  {'REGRESSION' if slower else 'ok'}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default=",".join(SCENARIOS), help="comma list of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--transport", default="inprocess", choices=TRANSPORTS + ("both",))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=2000, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=0, help="workers (default: one per user)")
+    parser.add_argument("--store", default="sql", choices=("sql", "memory"), help="TASK_STORE for the run")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="fake model response time (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against a JSON written by --out")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed throughput / p95 change")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when --baseline shows a regression")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenario.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    tmp = tempfile.mkdtemp(prefix="load-")
+    with FakeOpenAI(latency=args.openai_latency) as openai, FakeDapr() as dapr:
+        # all before the app is imported: these are read at import time
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{tmp}/load.db",
+            TASK_STORE=args.store,
+            OPENAI_BASE_URL=openai.base_url,
+            OPENAI_API_KEY="bench",
+            DAPR_HTTP_PORT=str(dapr.port),
+        )
+        subprocess.run([sys.executable, "-m", "app.migrate"], check=True, stdout=subprocess.DEVNULL)
+
+        from app.main import app
+
+        results: Dict[str, Any] = {}
+        if args.transport in ("inprocess", "both"):
+            results.update(asyncio.run(_inprocess(app, args)))
+        if args.transport in ("socket", "both"):
+            with UvicornThread(app, lifespan="on") as server:
+                results.update(asyncio.run(_socket(server.url, args)))
+
+    report = {"meta": _meta(args), "results": results}
+    _print(results)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+What /metrics instrumentation costs on the hot path
+
+- primitives: histogram observe (cached child), labels() lookup + observe,
+  counter inc
+- middleware: in-process ASGI requests against a trivial route, with and
+  without MetricsMiddleware (the difference is the per-request overhead)
+- then one blocking + one streaming agent turn against benchmarks.fake_openai
+  and a render of the registry, to show the OpenAI series and scrape cost
+
+Usage:
+    python -m benchmarks.metrics_overhead --n 200000 --requests 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.agent_latency import percentile
+from benchmarks.fake_openai import FakeOpenAI
+
+
+def _per_op_ns(fn: Callable[[], Any], n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+async def _requests(app: Any, n: int) -> List[float]:
+    scope: Dict[str, Any] = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/bench/ping",
+        "raw_path": b"/api/bench/ping",
+        "query_string": b"",
+        "headers": [],
+        "root_path": "",
+        "scheme": "http",
+        "server": ("127.0.0.1", 80),
+        "http_version": "1.1",
+    }
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        pass
+
+    samples: List[float] = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await app(dict(scope), receive, send)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def _build_app(instrumented: bool) -> Any:
+    from fastapi import FastAPI
+
+    from app.metrics import MetricsMiddleware
+
+    app = FastAPI()
+
+    @app.get("/api/{user_id}/ping")
+    async def ping(user_id: str):
+        return {"ok": True}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def _agent_turns() -> None:
+    from app.agents import openai_client
+    from app.agents.agent import TodoAgent
+
+    agent = TodoAgent()
+    await openai_client.startup()
+    try:
+        await agent.run("what next?", history=[])
+        async for _delta in agent.run_stream("and then?", history=[]):
+            pass
+    finally:
+        await openai_client.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200000, help="primitive operations")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    from app.metrics import Counter, Histogram, registry
+
+    h = Histogram("bench_seconds", "bench", ("route",))
+    child = h.labels("/x")
+    c = Counter("bench_total", "bench")
+    print(f"histogram observe (child)   {_per_op_ns(lambda: child.observe(0.003), args.n):7.0f} ns/op")
+    print(f"labels() + observe          {_per_op_ns(lambda: h.labels('/x').observe(0.003), args.n):7.0f} ns/op")
+    print(f"counter inc                 {_per_op_ns(c.inc, args.n):7.0f} ns/op")
+
+    for label, instrumented in (("plain", False), ("instrumented", True)):
+        app = _build_app(instrumented)
+        asyncio.run(_requests(app, 200))  # warm up
+        s = asyncio.run(_requests(app, args.requests))
+        print(f"{label:<13} request p50={percentile(s, 50):7.1f}us p99={percentile(s, 99):7.1f}us")
+
+    with FakeOpenAI(latency=0.05, token_delay=0.005) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        asyncio.run(_agent_turns())
+
+    start = time.perf_counter()
+    text = registry.render()
+    ms = (time.perf_counter() - start) * 1000.0
+    print(f"render: {len(text.splitlines())} lines in {ms:.2f}ms")
+    for line in text.splitlines():
+        if line.startswith(("todo_openai", "todo_http")) and ("_count" in line or "_total" in line):
+            print("  " + line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Outbox relay throughput against a local Dapr sidecar stand-in
+
+- writes N tasks + their outbox events into a throwaway SQLite DB
+  (same transaction per task, like tasks_service does)
+- drains them with app.outbox.OutboxRelay into benchmarks.fake_dapr
+- then simulates a restart: a second relay must finish the backlog with
+  every event delivered (duplicates are reported, never losses)
+
+Usage:
+    python -m benchmarks.outbox_relay --events 20000 --batch-size 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.fake_dapr import FakeDapr
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002, help="fake sidecar latency per request (s)")
+    parser.add_argument("--fail-every", type=int, default=0, help="sidecar rejects every Nth bulk call")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="outbox-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+
+    # imported after DATABASE_URL points at the throwaway DB
+    from app.db import Base, SessionLocal, engine
+    from app.models import OutboxCheckpoint, OutboxEvent, Task
+    from app.outbox import OutboxRelay, add_event
+
+    Base.metadata.create_all(bind=engine, tables=[Task.__table__, OutboxEvent.__table__, OutboxCheckpoint.__table__])
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        for i in range(args.events):
+            t = Task(user_id=f"user-{i % 50}", title=f"task {i}", completed=False)
+            db.add(t)
+            add_event(db, "created", t)
+            db.commit()
+    finally:
+        db.close()
+    write_s = time.perf_counter() - start
+
+    async def drain(relay: OutboxRelay, limit: int) -> float:
+        await relay.start()
+        relay._task.cancel()  # drive run_once() directly, no polling sleeps
+        t0 = time.perf_counter()
+        while relay.published < limit:
+            if await relay.run_once() == 0 and relay.failed == 0:
+                break
+        elapsed = time.perf_counter() - t0
+        await relay.stop()
+        return elapsed
+
+    with FakeDapr(latency=args.latency, fail_every=args.fail_every) as fake:
+        half = args.events // 2
+        first = OutboxRelay(base_url=fake.url, batch_size=args.batch_size, name="bench")
+        t1 = asyncio.run(drain(first, half))
+
+        # "restart": new relay object, same DB, same checkpoint name
+        second = OutboxRelay(base_url=fake.url, batch_size=args.batch_size, name="bench")
+        t2 = asyncio.run(drain(second, args.events - first.published))
+
+        delivered = len(fake.app.state.entry_ids)
+        duplicates = fake.duplicates
+        requests = fake.requests
+
+    db = SessionLocal()
+    try:
+        pending = db.query(OutboxEvent).filter(OutboxEvent.published_at.is_(None)).count()
+        cp = db.get(OutboxCheckpoint, "bench")
+    finally:
+        db.close()
+
+    relay_s = t1 + t2
+    print(f"events={args.events} batch={args.batch_size} sidecar latency={args.latency * 1000:.1f}ms")
+    print(f"write (task + outbox row, 1 commit each): {args.events / write_s:,.0f} tx/s")
+    print(f"relay: {first.published + second.published:,} events in {relay_s:.2f}s = {(first.published + second.published) / relay_s:,.0f} events/s over {requests} bulk calls")
+    print(f"delivered unique={delivered} duplicates={duplicates} still pending={pending} checkpoint={cp.last_event_id if cp else None}")
+    if delivered != args.events or pending:
+        raise SystemExit("events were lost")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+What the profiling hooks cost (app/profiling.py)
+
+- in-process ASGI requests against a trivial route: no middleware, the
+  middleware idle (nothing asks for a profile), and every request profiled
+  (the stack sampler thread runs for the request's lifetime)
+- a tracemalloc snapshot + component attribution with --tasks task dicts
+  held in the in-memory store, and the per-request cost while tracing
+
+Usage:
+    python -m benchmarks.profiling_overhead --requests 3000 --tasks 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+from benchmarks.agent_latency import percentile
+
+os.environ.setdefault("TASK_STORE", "memory")
+
+
+async def _requests(app: Any, n: int, headers: List[tuple]) -> List[float]:
+    scope: Dict[str, Any] = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/bench/ping",
+        "raw_path": b"/api/bench/ping",
+        "query_string": b"",
+        "headers": headers,
+        "root_path": "",
+        "scheme": "http",
+        "server": ("127.0.0.1", 80),
+        "http_version": "1.1",
+    }
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        pass
+
+    samples: List[float] = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await app(dict(scope), receive, send)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def _build_app(profiled: bool, sample_rate: float = 0.0) -> Any:
+    from fastapi import FastAPI
+
+    from app.profiling import ProfilingMiddleware
+
+    app = FastAPI()
+
+    @app.get("/api/{user_id}/ping")
+    async def ping(user_id: str):
+        await asyncio.sleep(0)
+        return {"ok": True}
+
+    if profiled:
+        app.add_middleware(ProfilingMiddleware, sample_rate=sample_rate)
+    return app
+
+
+def _report(label: str, s: List[float]) -> None:
+    print(f"{label:<22} p50={percentile(s, 50):8.1f}us p95={percentile(s, 95):8.1f}us p99={percentile(s, 99):8.1f}us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--frames", type=int, default=10, help="tracemalloc traceback depth")
+    args = parser.parse_args()
+
+    from app.profiling import memory, profiles
+    from app.tools import tasks as store
+
+    runs = (("no middleware", False, 0.0), ("middleware, idle", True, 0.0), ("every request profiled", True, 1.0))
+    for label, profiled, rate in runs:
+        app = _build_app(profiled, rate)
+        asyncio.run(_requests(app, 100, []))
+        _report(label, asyncio.run(_requests(app, args.requests, [])))
+    print(f"profiles kept: {len(profiles.list())}")
+
+    memory.start(args.frames)
+    plain = _build_app(False)
+    _report("tracemalloc on", asyncio.run(_requests(plain, args.requests, [])))
+    start = time.perf_counter()
+    for i in range(args.tasks):
+        store.add_task(f"user{i % 100}", f"task {i} with a few words")
+    print(f"add_task while tracing: {(time.perf_counter() - start) / args.tasks * 1e6:.1f}us each")
+
+    start = time.perf_counter()
+    snap = memory.snapshot(limit=5)
+    took = (time.perf_counter() - start) * 1000.0
+    print(f"snapshot: {took:.1f}ms, traced {snap['total_bytes'] / 1e6:.1f} MB")
+    for name, c in snap["components"].items():
+        print(f"  {name:<24} {c['bytes'] / 1e6:8.2f} MB {c['blocks']:>9,} blocks")
+    memory.stop()
+
+
+if __name__ == "__main__":
+    main()
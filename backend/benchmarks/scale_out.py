@@ -0,0 +1,148 @@
+"""
+Several backend replicas behind one (fake) Dapr sidecar
+
+- starts --replicas uvicorn processes on one throwaway SQLite DB, with
+  TASK_STORE=sql, STATE_BACKEND=dapr and CACHE_INVALIDATION=dapr (or off,
+  with --no-bus) against benchmarks/fake_dapr.py, which also delivers the
+  invalidation topic to every replica
+- visibility: create a task on one replica, poll the list on another until
+  it shows up; prints the lag percentiles and how many never showed up
+  within --timeout (without the bus a replica catches up at its next
+  revalidation, TASK_CACHE_MAX_AGE_MS)
+- ETags: the list ETag from one replica must get a 304 from every other
+- history: --turns chat messages for one user, round-robin over the
+  replicas; the shared transcript must hold every turn, in order
+
+Usage:
+    python -m benchmarks.scale_out --replicas 3 --writes 100
+    python -m benchmarks.scale_out --replicas 3 --writes 100 --no-bus
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+
+from benchmarks._server import free_port
+from benchmarks.agent_latency import percentile
+from benchmarks.fake_dapr import FakeDapr
+
+
+def _spawn(port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+def _wait_ready(urls: List[str], deadline: float) -> None:
+    for url in urls:
+        while True:
+            try:
+                if httpx.get(f"{url}/dapr/subscribe", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f"replica {url} did not start")
+            time.sleep(0.1)
+
+
+def run(args: argparse.Namespace) -> None:
+    tmp = tempfile.mkdtemp(prefix="scale-out-")
+    db_url = f"sqlite:///{tmp}/bench.db"
+
+    with FakeDapr() as dapr:
+        env = dict(os.environ)
+        env.pop("OPENAI_API_KEY", None)  # command replies only: no model in the loop
+        env.update(
+            DATABASE_URL=db_url,
+            DAPR_HTTP_PORT=str(dapr.port),
+            TASK_STORE="sql",
+            STATE_BACKEND="dapr",
+            CACHE_INVALIDATION="" if args.no_bus else "dapr",
+        )
+        subprocess.run([sys.executable, "-m", "app.migrate"], env=env, check=True, stdout=subprocess.DEVNULL)
+
+        ports = [free_port() for _ in range(args.replicas)]
+        procs = []
+        for i, port in enumerate(ports):
+            procs.append(_spawn(port, dict(env, HOSTNAME=f"replica-{i}")))
+        urls = [f"http://127.0.0.1:{p}" for p in ports]
+        try:
+            _wait_ready(urls, time.monotonic() + 30)
+            for url in urls:
+                dapr.subscribe(url)
+
+            with httpx.Client(timeout=5.0) as http:
+                # every replica caches the user before the writes start
+                for url in urls:
+                    http.get(f"{url}/api/bench/tasks")
+
+                lags: List[float] = []
+                stale = 0
+                for i in range(args.writes):
+                    writer, reader = urls[i % len(urls)], urls[(i + 1) % len(urls)]
+                    created = http.post(f"{writer}/api/bench/tasks", json={"title": f"scale task {i}"}).json()
+                    start = time.perf_counter()
+                    while True:
+                        ids = {t["id"] for t in http.get(f"{reader}/api/bench/tasks").json()}
+                        if created["id"] in ids:
+                            lags.append((time.perf_counter() - start) * 1000.0)
+                            break
+                        if time.perf_counter() - start > args.timeout:
+                            stale += 1
+                            break
+                        time.sleep(0.002)
+
+                # after a settle, every replica must hand out the same list ETag
+                time.sleep(args.timeout)
+                etag = http.get(f"{urls[0]}/api/bench/tasks").headers["ETag"]
+                not_modified = sum(
+                    http.get(f"{url}/api/bench/tasks", headers={"If-None-Match": etag}).status_code == 304
+                    for url in urls
+                )
+
+                for i in range(args.turns):
+                    http.post(f"{urls[i % len(urls)]}/api/chat-user/chat", json={"message": f"add turn {i}"})
+        finally:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                p.wait(timeout=10)
+
+        transcript = dapr.app.state.store.get(("statestore", "chat-history:chat-user"), (None, None))[0] or []
+        said = [m["content"] for m in transcript if m.get("role") == "user"]
+        expected = [f"add turn {i}" for i in range(args.turns)]
+
+    print(f"replicas={args.replicas} writes={args.writes} bus={'off' if args.no_bus else 'on'}")
+    if lags:
+        print(
+            f"visibility lag p50={percentile(lags, 50):7.2f}ms p95={percentile(lags, 95):7.2f}ms "
+            f"p99={percentile(lags, 99):7.2f}ms"
+        )
+    print(f"stale after {args.timeout:.1f}s: {stale}/{args.writes}")
+    print(f"etag {etag}: 304 from {not_modified}/{len(urls)} replicas")
+    print(f"invalidations delivered: {dapr.delivered}")
+    print(f"history: {len(said)}/{args.turns} turns kept, in order: {said == expected[-len(said):] if said else False}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--writes", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=1.0, help="seconds to wait for a write to show up elsewhere")
+    parser.add_argument("--no-bus", action="store_true", help="replicas share SQL and history but never invalidate")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
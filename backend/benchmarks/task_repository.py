@@ -0,0 +1,142 @@
+"""
+Task repository reads: SQL on every read vs the write-through cache
+
+- throwaway SQLite DB (migrated), --users users with --tasks-per-user tasks
+- "sql": what tasks_service used to do per read: a session, SELECT the
+  user's tasks, build dicts
+- "cold": first repository read of each user (loads the user into the cache)
+- "warm": repository reads once cached (list + get)
+- "zipf": skewed access over all users with a cache that holds only
+  --cache-share of the tasks; prints hit ratio and evictions
+- "write": toggles through the repository (transaction + outbox + write-through)
+
+Usage:
+    python -m benchmarks.task_repository --users 200 --tasks-per-user 200 --reads 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.agent_latency import percentile
+
+
+async def _timed(fn: Callable[[int], Awaitable[object]], n: int) -> List[float]:
+    samples: List[float] = []
+    for i in range(n):
+        start = time.perf_counter()
+        await fn(i)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+async def _main(args: argparse.Namespace) -> None:
+    tmp = tempfile.mkdtemp(prefix="repo-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    os.environ["TASK_STORE"] = "sql"
+
+    # imported after DATABASE_URL points at the throwaway DB
+    from sqlalchemy import select, text
+
+    from app import migrate
+    from app.db import async_session, engine
+    from app.models import Task
+    from app.outbox import task_payload
+    from app.repository import SqlTaskRepository
+
+    migrate.migrate(engine)
+    users = [f"user{i}" for i in range(args.users)]
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO tasks (user_id, title, completed, created_at, updated_at) "
+                "VALUES (:u, :t, :c, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+            ),
+            [{"u": u, "t": f"task {i} for {u}", "c": i % 3 == 0} for u in users for i in range(args.tasks_per_user)],
+        )
+
+    rng = random.Random(7)
+
+    async def sql_read(i: int) -> object:
+        async with async_session() as db:
+            rows = (await db.scalars(select(Task).where(Task.user_id == users[i % len(users)]).order_by(Task.id.desc()))).all()
+            return [task_payload(t) for t in rows]
+
+    repo = SqlTaskRepository(max_tasks=args.users * args.tasks_per_user)
+
+    async def repo_read(i: int) -> object:
+        return list(await repo.list(users[i % len(users)]))
+
+    async def repo_get(i: int) -> object:
+        user = users[i % len(users)]
+        view = await repo.list(user)
+        return await repo.get(user, view[len(view) // 2]["id"])
+
+    results: Dict[str, List[float]] = {
+        "sql": await _timed(sql_read, args.reads),
+        "cold": await _timed(repo_read, len(users)),
+        "warm list": await _timed(repo_read, args.reads),
+        "warm get": await _timed(repo_get, args.reads),
+    }
+    full = repo.stats()
+
+    async def write(i: int) -> object:
+        user = users[i % len(users)]
+        view = await repo.list(user)
+        return await repo.set_completed(user, view[i % len(view)]["id"])
+
+    results["write"] = await _timed(write, min(args.reads, 1000))
+
+    # the cache must agree with the table after all those writes
+    for user in users[:20]:
+        cached = [t["id"] for t in await repo.list(user, "completed")]
+        async with async_session() as db:
+            stored = list(
+                (
+                    await db.scalars(
+                        select(Task.id).where(Task.user_id == user, Task.completed == True).order_by(Task.id.desc())  # noqa: E712
+                    )
+                ).all()
+            )
+        if cached != stored:
+            raise SystemExit(f"{user}: cache and table disagree")
+
+    # zipf-ish: user k is picked with weight 1/(k+1); the cache now fits only part of the data
+    repo.clear()
+    repo.max_tasks = max(1, int(args.users * args.tasks_per_user * args.cache_share))
+    before = repo.stats()
+    weights = [1.0 / (k + 1) for k in range(len(users))]
+    picks = rng.choices(users, weights=weights, k=args.reads)
+
+    async def zipf_read(i: int) -> object:
+        return len(await repo.list(picks[i]))
+
+    results["zipf"] = await _timed(zipf_read, args.reads)
+    after = repo.stats()
+    zipf = {k: after[k] - before[k] for k in ("hits", "misses", "loads", "evictions")}
+    zipf["hit_ratio"] = round(zipf["hits"] / args.reads, 4)
+
+    print(f"users={args.users} tasks/user={args.tasks_per_user} reads={args.reads}")
+    for label, s in results.items():
+        print(f"{label:<10} p50={percentile(s, 50):8.3f}ms p95={percentile(s, 95):8.3f}ms p99={percentile(s, 99):8.3f}ms")
+    print(f"full cache: {full}")
+    print(f"zipf cache ({args.cache_share:.0%} of tasks): {zipf}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks-per-user", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--cache-share", type=float, default=0.2, help="zipf run: cache bound as a share of all tasks")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Task search at scale: indexed full-text search vs substring scans
+
+- --tasks tasks (default 1M) with zipf-distributed words in titles and some
+  descriptions; one "hot" user owns --hot-share of them, the rest are spread
+  over --users users
+- SQL (throwaway SQLite DB, migrated so the FTS5 table + triggers exist):
+  ILIKE '%word%' per user (what mcp_tools did) vs app/search.py (FTS5, bm25);
+  the ILIKE query is unranked and stops at 20 hits, so it is cheap for common
+  words and degrades to a scan of the user's rows for rare / absent ones
+- in-memory store: substring scan over list_tasks() vs search_tasks()
+  (app/tools/text_index.py, BM25)
+- queries: one common word, one rare word, two words, a prefix; on the hot
+  user and on random small users; prints p50 / p95 per query kind
+
+Usage:
+    python -m benchmarks.task_search --tasks 1000000 --users 1000 --hot-share 0.1
+    python -m benchmarks.task_search --tasks 100000 --skip-memory
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.agent_latency import percentile
+
+_VOCAB = [f"w{i}" for i in range(5000)]
+_WEIGHTS = [1.0 / (i + 1) for i in range(len(_VOCAB))]
+
+
+def _text(rng: random.Random, lo: int, hi: int) -> str:
+    return " ".join(rng.choices(_VOCAB, weights=_WEIGHTS, k=rng.randint(lo, hi)))
+
+
+def _rows(n: int, users: int, hot_share: float, seed: int) -> List[Tuple[str, str, str]]:
+    rng = random.Random(seed)
+    hot = int(n * hot_share)
+    out = []
+    for i in range(n):
+        user = "hot" if i < hot else f"user{rng.randrange(users)}"
+        description = _text(rng, 2, 8) if rng.random() < 0.3 else ""
+        out.append((user, _text(rng, 2, 6), description))
+    rng.shuffle(out)
+    return out
+
+
+QUERIES = {
+    "common": "w1",
+    "rare": "w3999",
+    "two words": "w2 w7",
+    "prefix": "w12",  # last word is a prefix: w12, w120..w129, w1200..
+}
+
+
+def _measure(fn: Callable[[str, str], object], users: List[str], reps: int) -> Dict[str, List[float]]:
+    out: Dict[str, List[float]] = {}
+    for kind, query in QUERIES.items():
+        samples = []
+        for i in range(reps):
+            user = users[i % len(users)]
+            start = time.perf_counter()
+            fn(user, query)
+            samples.append((time.perf_counter() - start) * 1000.0)
+        out[kind] = samples
+    return out
+
+
+def _report(title: str, results: Dict[str, Dict[str, List[float]]]) -> None:
+    print(title)
+    for label, by_kind in results.items():
+        cells = "  ".join(
+            f"{kind}: p50={percentile(s, 50):8.3f} p95={percentile(s, 95):8.3f}" for kind, s in by_kind.items()
+        )
+        print(f"  {label:<16} {cells}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--hot-share", type=float, default=0.1)
+    parser.add_argument("--reps", type=int, default=50)
+    parser.add_argument("--skip-sql", action="store_true")
+    parser.add_argument("--skip-memory", action="store_true")
+    args = parser.parse_args()
+
+    rows = _rows(args.tasks, args.users, args.hot_share, seed=7)
+    small_users = [f"user{i}" for i in range(0, args.users, max(1, args.users // 50))]
+    print(f"tasks={args.tasks} hot user={int(args.tasks * args.hot_share)} tasks, others over {args.users} users")
+
+    if not args.skip_sql:
+        tmp = tempfile.mkdtemp(prefix="search-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+
+        # imported after DATABASE_URL points at the throwaway DB
+        from sqlalchemy import select, text
+
+        from app import migrate
+        from app.db import SessionLocal, engine
+        from app.models import Task
+        from app.repository import SqlTaskRepository
+
+        migrate.migrate(engine)
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO tasks (user_id, title, description, completed, created_at, updated_at) "
+                    "VALUES (:u, :t, :d, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+                ),
+                [{"u": u, "t": t, "d": d or None} for u, t, d in rows],
+            )
+        print(f"sql: inserted + FTS-indexed {args.tasks} rows in {time.perf_counter() - start:.1f}s")
+
+        def sql_like(user: str, query: str) -> object:
+            with SessionLocal() as db:
+                stmt = select(Task).where(Task.user_id == user)
+                for word in query.split():
+                    stmt = stmt.where(Task.title.ilike(f"%{word}%") | Task.description.ilike(f"%{word}%"))
+                return db.scalars(stmt.order_by(Task.id.desc()).limit(20)).all()
+
+        # nobody is cached, so the repository answers from the FTS index
+        repo = SqlTaskRepository()
+        loop = asyncio.new_event_loop()
+
+        def sql_fts(user: str, query: str) -> object:
+            return loop.run_until_complete(repo.search(user, query, 20))
+
+        _report("sql (ms)", {
+            "like hot": _measure(sql_like, ["hot"], args.reps),
+            "fts hot": _measure(sql_fts, ["hot"], args.reps),
+            "like small": _measure(sql_like, small_users, args.reps),
+            "fts small": _measure(sql_fts, small_users, args.reps),
+        })
+        loop.close()
+
+    if not args.skip_memory:
+        from app.tools import tasks as store
+
+        start = time.perf_counter()
+        by_user: Dict[str, List[Dict[str, str]]] = {}
+        for u, t, d in rows:
+            by_user.setdefault(u, []).append({"title": t, "description": d or None})
+        for u, items in by_user.items():
+            store.add_tasks(u, items)
+        print(f"memory: loaded + indexed {args.tasks} tasks in {time.perf_counter() - start:.1f}s")
+
+        def mem_scan(user: str, query: str) -> object:
+            words = query.split()
+            hits = [
+                t for t in store.list_tasks(user)
+                if all(w in t["title"] or w in (t["description"] or "") for w in words)
+            ]
+            return hits[:20]
+
+        def mem_index(user: str, query: str) -> object:
+            return store.search_tasks(user, query, 20)
+
+        _report("memory (ms)", {
+            "scan hot": _measure(mem_scan, ["hot"], args.reps),
+            "index hot": _measure(mem_index, ["hot"], args.reps),
+            "scan small": _measure(mem_scan, small_users, args.reps),
+            "index small": _measure(mem_index, small_users, args.reps),
+        })
+
+
+if __name__ == "__main__":
+    main()
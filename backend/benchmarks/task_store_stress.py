@@ -0,0 +1,159 @@
+"""
+Stress test for the in-memory task store (app/tools/tasks.py)
+
+- N worker threads (like FastAPI's threadpool) add/toggle/update/delete
+- the asyncio event loop drives chat commands through agent_runner at the same time
+- users are shared between threads so the same stripe is contended on purpose
+- afterwards the store invariants are checked and ops/sec is printed
+
+Usage:
+    python -m benchmarks.task_store_stress --threads 16 --ops 20000 --users 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# measures the in-memory store; set before app.repository picks its backend
+os.environ.setdefault("TASK_STORE", "memory")
+
+from app import agent_runner  # noqa: E402
+from app.tools import tasks as store  # noqa: E402
+
+
+def _worker(seed: int, users: List[str], ops: int, added: Dict[int, str], deleted: List[int], lock: threading.Lock) -> None:
+    rng = random.Random(seed)
+    mine: List[Tuple[str, int]] = []
+    local_added: Dict[int, str] = {}
+    local_deleted: List[int] = []
+
+    for i in range(ops):
+        user_id = rng.choice(users)
+        roll = rng.random()
+        if roll < 0.45 or not mine:
+            t = store.add_task(user_id, f"task {seed}-{i}")
+            mine.append((user_id, t["id"]))
+            local_added[t["id"]] = user_id
+        elif roll < 0.75:
+            uid, tid = rng.choice(mine)
+            store.complete_task(uid, tid)
+        elif roll < 0.85:
+            uid, tid = rng.choice(mine)
+            store.update_task(uid, tid, title=f"renamed {seed}-{i}")
+        elif roll < 0.95:
+            uid, tid = mine.pop(rng.randrange(len(mine)))
+            if store.delete_task(uid, tid) is not None:
+                local_deleted.append(tid)
+        else:
+            # readers iterate while others write
+            sum(1 for _ in store.list_tasks(user_id, rng.choice(["all", "pending", "completed"])))
+
+    with lock:
+        added.update(local_added)
+        deleted.extend(local_deleted)
+
+
+async def _chat_load(users: List[str], ops: int, added: Dict[int, str], lock: threading.Lock) -> int:
+    done = 0
+    for i in range(ops):
+        user_id = users[i % len(users)]
+        reply = await agent_runner.run_user_chat(user_id, f"add chat {i}")
+        # "Added task (<id>): ..."
+        tid = int(reply.split("(", 1)[1].split(")", 1)[0])
+        with lock:
+            added[tid] = user_id
+        await agent_runner.run_user_chat(user_id, "list pending")
+        await agent_runner.run_user_chat(user_id, f"complete {tid}")
+        done += 3
+        if i % 50 == 0:
+            await asyncio.sleep(0)  # let other coroutines/threads interleave
+    return done
+
+
+def check_invariants(added: Dict[int, str], deleted: List[int]) -> List[str]:
+    errors: List[str] = []
+
+    if len(deleted) != len(set(deleted)):
+        errors.append("a task was deleted twice")
+
+    expected = {tid: uid for tid, uid in added.items() if tid not in set(deleted)}
+    seen: Dict[int, str] = {}
+
+    for user_id, user_store in list(store._TASKS.items()):
+        with user_store.lock:
+            by_id = dict(user_store.by_id)
+            pending = dict(user_store.pending)
+            completed = dict(user_store.completed)
+
+        if set(pending) & set(completed):
+            errors.append(f"{user_id}: task in both pending and completed")
+        if set(pending) | set(completed) != set(by_id):
+            errors.append(f"{user_id}: subsets do not partition all tasks")
+        for tid, t in by_id.items():
+            if t["id"] != tid or t["user_id"] != user_id:
+                errors.append(f"{user_id}: task {tid} filed under the wrong key")
+            if bool(t["completed"]) != (tid in completed):
+                errors.append(f"{user_id}: task {tid} in the wrong subset")
+            if tid in seen:
+                errors.append(f"duplicate id {tid} across users")
+            seen[tid] = user_id
+
+        for status in ("all", "pending", "completed"):
+            ids = [t["id"] for t in store.list_tasks(user_id, status)]  # type: ignore[arg-type]
+            if ids != sorted(ids, reverse=True):
+                errors.append(f"{user_id}: {status} view not newest-first")
+
+    if seen != expected:
+        missing = set(expected) - set(seen)
+        extra = set(seen) - set(expected)
+        errors.append(f"lost or phantom tasks: missing={len(missing)} extra={len(extra)}")
+
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=20000, help="operations per thread")
+    parser.add_argument("--chat-ops", type=int, default=2000, help="chat command rounds on the event loop")
+    parser.add_argument("--users", type=int, default=64)
+    args = parser.parse_args()
+
+    users = [f"user-{i}" for i in range(args.users)]
+    added: Dict[int, str] = {}
+    deleted: List[int] = []
+    lock = threading.Lock()
+
+    threads = [
+        threading.Thread(target=_worker, args=(seed, users, args.ops, added, deleted, lock))
+        for seed in range(args.threads)
+    ]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    chat_ops = asyncio.run(_chat_load(users, args.chat_ops, added, lock))
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = args.threads * args.ops + chat_ops
+    print(f"threads={args.threads} users={args.users} ops={total} elapsed={elapsed:.2f}s")
+    print(f"throughput={total / elapsed:,.0f} ops/s")
+
+    errors = check_invariants(added, deleted)
+    if errors:
+        for e in errors[:20]:
+            print("INVARIANT FAILED:", e)
+        raise SystemExit(1)
+    print("invariants OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Dashboard polling of GET /api/{user_id}/tasks: plain vs conditional (ETag)
+
+- seeds one user with --tasks tasks and serves the app over uvicorn
+- "plain" polls without If-None-Match (every poll serializes the full list)
+- "etag" polls like a browser: it sends the last ETag back and keeps its body on 304
+- every --write-every polls a chat command completes a task, so the etag run also
+  pays for the 200s after a change; each body is checked against the store
+
+Usage:
+    python -m benchmarks.tasks_etag --tasks 5000 --polls 1000 --write-every 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+# measures the in-memory store; set before app.repository picks its backend
+os.environ.setdefault("TASK_STORE", "memory")
+
+from app import agent_runner  # noqa: E402
+from app.main import app  # noqa: E402
+from app.tools import tasks as store  # noqa: E402
+from benchmarks._server import UvicornThread  # noqa: E402
+from benchmarks.agent_latency import percentile  # noqa: E402
+
+
+def _poll(client: httpx.Client, url: str, user: str, polls: int, write_every: int, ids: List[int], conditional: bool) -> Dict[str, object]:
+    # "complete" on an already-completed task is a no-op, so each run takes fresh ids
+    samples: List[float] = []
+    not_modified = 0
+    etag: Optional[str] = None
+    body: Optional[list] = None
+    for i in range(polls):
+        if write_every and i and i % write_every == 0:
+            # the chat path must invalidate the ETag exactly like the REST one
+            asyncio.run(agent_runner.run_user_chat(user, f"complete {ids.pop()}"))
+        headers = {"If-None-Match": etag} if conditional and etag else {}
+        start = time.perf_counter()
+        r = client.get(url, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        if r.status_code == 304:
+            not_modified += 1
+        else:
+            r.raise_for_status()
+            body = r.json()
+            etag = r.headers.get("etag")
+        if conditional and len(body or []) != len(store.list_tasks(user)):
+            raise SystemExit("stale body served after a 304")
+    done = sum(1 for t in body or [] if t["completed"])
+    if done != len(store.list_tasks(user, "completed")):
+        raise SystemExit("cached body does not match the store")
+    return {"samples": samples, "not_modified": not_modified}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--polls", type=int, default=1000)
+    parser.add_argument("--write-every", type=int, default=20, help="complete a task via chat every N polls (0 = never)")
+    args = parser.parse_args()
+
+    user = "bench-etag"
+    ids = [store.add_task(user, f"task number {i}")["id"] for i in range(args.tasks)]
+
+    with UvicornThread(app) as server, httpx.Client(timeout=30) as client:
+        url = f"{server.url}/api/{user}/tasks"
+        client.get(url)  # warm up
+        results = {
+            label: _poll(client, url, user, args.polls, args.write_every, ids, conditional)
+            for label, conditional in (("plain", False), ("etag", True))
+        }
+
+    print(f"tasks={args.tasks} polls={args.polls} chat write every {args.write_every} polls")
+    for label, res in results.items():
+        s = res["samples"]
+        print(
+            f"{label:<6} p50={percentile(s, 50):7.3f}ms p95={percentile(s, 95):7.3f}ms "
+            f"p99={percentile(s, 99):7.3f}ms total={sum(s):8.1f}ms 304s={res['not_modified']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
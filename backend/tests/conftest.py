@@ -0,0 +1,62 @@
+"""
+Test setup: one throwaway SQLite DB for the whole run, migrated once
+
+The app reads DATABASE_URL and friends at import time, so they are set here,
+before any test module imports app.*. Async tests share one event loop
+(`run`): pooled aiosqlite connections belong to the loop that opened them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import uuid
+
+_TMP = tempfile.mkdtemp(prefix="todo-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ["TASK_STORE"] = "sql"
+os.environ["CACHE_INVALIDATION"] = ""
+os.environ["STATE_BACKEND"] = ""
+# the write-behind thread never flushes on its own: reads must force it
+os.environ["CHAT_WRITE_LINGER_MS"] = "600000"
+os.environ.pop("OPENAI_API_KEY", None)
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    from app.migrate import migrate
+
+    migrate()
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    from app.db import dispose_async_engine
+
+    loop.run_until_complete(dispose_async_engine())
+    loop.close()
+
+
+@pytest.fixture
+def run(loop):
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def user_id():
+    return f"user-{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def fresh_engine(tmp_path):
+    """An empty SQLite DB of its own (migration and outbox tests)."""
+    from sqlalchemy import create_engine
+
+    engine = create_engine(f"sqlite:///{tmp_path}/fresh.db")
+    yield engine
+    engine.dispose()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import pytest
+
+from app.agent_runner import _COMMANDS, reply_cache_stats
+from app.repository import tasks_repo
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    yield
+    tasks_repo.clear()
+
+
+def test_help_does_not_touch_the_database(run, user_id, monkeypatch):
+    async def down(*args, **kwargs):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(tasks_repo, "version", down)
+    assert run(_COMMANDS["help"].handler(user_id, "")).startswith("Commands:")
+
+
+def test_search_of_a_cold_user_does_not_load_their_tasks(run, user_id):
+    run(tasks_repo.create(user_id, "buy oat milk"))
+    tasks_repo.clear()
+    loads = tasks_repo.stats()["loads"]
+
+    search = _COMMANDS["search"].handler
+    assert "oat milk" in run(search(user_id, "milk"))
+    hits = reply_cache_stats()["hits"]
+    assert "oat milk" in run(search(user_id, "milk"))
+    assert reply_cache_stats()["hits"] == hits + 1  # keyed on the version row alone
+    assert tasks_repo.stats()["loads"] == loads
+
+
+def test_due_rejects_a_bad_date_before_the_repository_sees_it(run, user_id):
+    task = run(tasks_repo.create(user_id, "rent"))
+    due = _COMMANDS["due"].handler
+
+    assert run(due(user_id, f"{task['id']} next tuesday")).startswith("Usage: due <id> <date>")
+    assert run(tasks_repo.get(user_id, task["id"]))["due_date"] is None
+    assert run(due(user_id, f"{task['id']} 2025-01-31")) == f"Task ({task['id']}) due 2025-01-31T00:00:00."
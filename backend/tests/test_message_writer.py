@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from sqlalchemy import func, select
+
+from app import conversation_store
+from app.db import SessionLocal, engine
+from app.message_writer import MessageWriter
+from app.models import Message
+
+
+def _conversation(user_id: str) -> int:
+    with SessionLocal() as db:
+        return conversation_store.get_or_create_conversation(db, user_id).id
+
+
+def _stored(conversation_id: int) -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(Message).where(Message.conversation_id == conversation_id))
+
+
+def test_history_reads_see_buffered_messages(user_id):
+    # CHAT_WRITE_LINGER_MS is set far out (conftest): only the read can flush
+    cid = _conversation(user_id)
+    with SessionLocal() as db:
+        conversation_store.save_message(db, cid, "user", "add milk")
+        conversation_store.save_message(db, cid, "assistant", "Added: milk")
+    assert _stored(cid) == 0
+
+    with SessionLocal() as db:
+        history = conversation_store.load_history(db, cid)
+    assert history == [{"role": "user", "content": "add milk"}, {"role": "assistant", "content": "Added: milk"}]
+
+
+def test_ensure_visible_flushes_only_when_that_conversation_is_behind(user_id):
+    writer = MessageWriter(engine, linger_ms=600_000)
+    try:
+        ours, other = _conversation(user_id), _conversation(f"{user_id}-other")
+        writer.add(Message.__table__, {"conversation_id": ours, "role": "user", "content": "hi"})
+
+        writer.ensure_visible(other)  # nothing of theirs is buffered
+        assert writer.stats()["flushes"] == 0 and _stored(ours) == 0
+
+        writer.ensure_visible(ours)
+        assert _stored(ours) == 1
+        writer.ensure_visible(ours)  # already committed: no second flush
+        assert writer.stats()["flushes"] == 1
+    finally:
+        writer.close()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app import migrate
+from app.db import SchemaError, init_db
+from app.search import FTS_TABLE
+
+# what the old create_all left behind: no schema_migrations, no outbox,
+# single-column indexes, conversations without message_count
+BASELINE_DDL = [
+    "CREATE TABLE tasks (id INTEGER NOT NULL PRIMARY KEY, user_id VARCHAR NOT NULL, title VARCHAR NOT NULL, "
+    "description TEXT, completed BOOLEAN NOT NULL, due_date DATETIME, created_at DATETIME NOT NULL, "
+    "updated_at DATETIME NOT NULL)",
+    "CREATE INDEX ix_tasks_id ON tasks (id)",
+    "CREATE INDEX ix_tasks_user_id ON tasks (user_id)",
+    "CREATE TABLE conversations (id INTEGER NOT NULL PRIMARY KEY, user_id VARCHAR NOT NULL, "
+    "created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)",
+    "CREATE INDEX ix_conversations_user_id ON conversations (user_id)",
+    "CREATE TABLE messages (id INTEGER NOT NULL PRIMARY KEY, conversation_id INTEGER NOT NULL "
+    "REFERENCES conversations (id) ON DELETE CASCADE, role VARCHAR NOT NULL, content TEXT NOT NULL, "
+    "created_at DATETIME NOT NULL)",
+]
+
+BASELINE_ROWS = [
+    "INSERT INTO tasks VALUES (1, 'alice', 'buy milk', NULL, 0, NULL, '2025-01-01', '2025-01-01')",
+    "INSERT INTO tasks VALUES (2, 'bob', 'walk dog', 'twice', 1, NULL, '2025-01-01', '2025-01-01')",
+    "INSERT INTO conversations VALUES (1, 'alice', '2025-01-01', '2025-01-02')",
+    "INSERT INTO messages VALUES (1, 1, 'user', 'hi', '2025-01-01')",
+    "INSERT INTO messages VALUES (2, 1, 'assistant', 'hello', '2025-01-01')",
+]
+
+ALL_STEPS = [s.version for s in migrate.STEPS]
+
+
+def _indexes(engine, table):
+    return {ix["name"] for ix in inspect(engine).get_indexes(table)}
+
+
+def test_fresh_database_gets_every_step(fresh_engine):
+    assert migrate.migrate(fresh_engine) == ALL_STEPS
+    assert migrate.pending(fresh_engine) == []
+    assert migrate.migrate(fresh_engine) == []  # idempotent
+
+    tables = set(inspect(fresh_engine).get_table_names())
+    assert {"tasks", "conversations", "messages", "outbox_events", "outbox_checkpoints", "task_versions"} <= tables
+    assert "ix_tasks_user_completed_id" in _indexes(fresh_engine, "tasks")
+    cols = {c["name"] for c in inspect(fresh_engine).get_columns("outbox_checkpoints")}
+    assert {"owner", "lease_until"} <= cols
+
+
+def test_baseline_database_is_brought_up_to_date(fresh_engine):
+    with fresh_engine.begin() as conn:
+        for stmt in BASELINE_DDL + BASELINE_ROWS:
+            conn.execute(text(stmt))
+    assert migrate.applied_versions(fresh_engine) == []
+
+    assert migrate.migrate(fresh_engine) == ALL_STEPS
+
+    with fresh_engine.connect() as conn:
+        # 004 backfill
+        assert conn.execute(text("SELECT message_count FROM conversations WHERE id = 1")).scalar() == 2
+        # 005 backfill: rows written before the triggers are searchable
+        hits = conn.execute(text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'milk'")).scalars().all()
+        assert hits == [1]
+        # old rows are untouched
+        assert conn.execute(text("SELECT count(*) FROM tasks")).scalar() == 2
+    assert "ix_conversations_user_id" not in _indexes(fresh_engine, "conversations")  # 003 dropped it
+    assert {"failed_at", "last_error"} <= {c["name"] for c in inspect(fresh_engine).get_columns("outbox_events")}
+
+
+def test_startup_migrates_an_empty_database(fresh_engine, monkeypatch):
+    monkeypatch.delenv("DB_AUTO_MIGRATE", raising=False)
+    init_db(fresh_engine)
+    assert migrate.pending(fresh_engine) == []
+
+
+def test_startup_refuses_a_database_that_is_behind(fresh_engine, monkeypatch):
+    monkeypatch.delenv("DB_AUTO_MIGRATE", raising=False)
+    with fresh_engine.begin() as conn:
+        for stmt in BASELINE_DDL:
+            conn.execute(text(stmt))
+    with pytest.raises(SchemaError, match="python -m app.migrate"):
+        init_db(fresh_engine)
+
+    monkeypatch.setenv("DB_AUTO_MIGRATE", "1")
+    init_db(fresh_engine)
+    assert migrate.pending(fresh_engine) == []
+
+
+def test_deployments_never_migrate_on_boot(fresh_engine, monkeypatch):
+    monkeypatch.setenv("DB_AUTO_MIGRATE", "0")
+    with pytest.raises(SchemaError):
+        init_db(fresh_engine)
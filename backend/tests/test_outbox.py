@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+from collections import defaultdict
+from typing import Dict, List, Set
+
+import httpx
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.models import OutboxCheckpoint, OutboxEvent, Task
+from app.outbox import OutboxRelay, add_event
+
+
+class FakeSidecar:
+    """Dapr bulk publish endpoint: records what it accepts, rejects the ids in `reject`."""
+
+    def __init__(self) -> None:
+        self.reject: Dict[int, int] = {}  # outbox id -> rejections left
+        self.accepted: Dict[str, List[int]] = defaultdict(list)  # user -> outbox ids, delivery order
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        failed = []
+        for entry in json.loads(request.content):
+            event = entry["event"]
+            if self.reject.get(event["outbox_id"], 0) > 0:
+                self.reject[event["outbox_id"]] -= 1
+                failed.append({"entryId": entry["entryId"], "error": "broker said no"})
+            else:
+                self.accepted[event["task"]["user_id"]].append(event["outbox_id"])
+        if failed:
+            return httpx.Response(500, json={"failedEntries": failed})
+        return httpx.Response(204)
+
+
+@pytest.fixture
+def sessions(fresh_engine):
+    Base.metadata.create_all(fresh_engine)
+    return sessionmaker(bind=fresh_engine)
+
+
+def _seed(sessions, users: List[str], n: int) -> Dict[str, List[int]]:
+    """n tasks round-robin over users, one commit each; user -> outbox ids in commit order."""
+    ids: Dict[str, List[int]] = defaultdict(list)
+    with sessions() as db:
+        for i in range(n):
+            task = Task(user_id=users[i % len(users)], title=f"t{i}", completed=False)
+            db.add(task)
+            ev = add_event(db, "created", task)
+            db.commit()
+            ids[task.user_id].append(ev.id)
+    return ids
+
+
+def _relay(sessions, sidecar: FakeSidecar, **kwargs) -> OutboxRelay:
+    relay = OutboxRelay(session_factory=sessions, base_url="http://dapr", **kwargs)
+    relay._client = httpx.AsyncClient(base_url="http://dapr", transport=httpx.MockTransport(sidecar))
+    return relay
+
+
+def _unpublished(sessions) -> Set[int]:
+    with sessions() as db:
+        return {e.id for e in db.query(OutboxEvent).filter(OutboxEvent.published_at.is_(None))}
+
+
+def _attempts(sessions, event_id: int) -> int:
+    with sessions() as db:
+        return db.get(OutboxEvent, event_id).attempts
+
+
+def test_failure_mid_batch_keeps_per_user_order(sessions, run):
+    ids = _seed(sessions, ["alice", "bob"], 8)
+    sidecar = FakeSidecar()
+    sidecar.reject[ids["alice"][1]] = 1  # alice's second event fails once
+    relay = _relay(sessions, sidecar)
+
+    # bob is not held up; alice's events after the failed one are not sent yet
+    assert run(relay.run_once()) == 4 + 1
+    assert _unpublished(sessions) == set(ids["alice"][1:])
+    assert sidecar.accepted["alice"] == ids["alice"][:1]
+
+    assert run(relay.run_once()) == 3
+    assert _unpublished(sessions) == set()
+    # each event delivered once, in commit order
+    assert sidecar.accepted["alice"] == ids["alice"]
+    assert sidecar.accepted["bob"] == ids["bob"]
+
+    with sessions() as db:
+        cp = db.get(OutboxCheckpoint, relay.name)
+        assert (cp.last_event_id, cp.published_total) == (max(ids["alice"] + ids["bob"]), 8)
+    run(relay.stop())
+
+
+def test_poison_event_is_dead_lettered_and_unblocks_the_user(sessions, run, monkeypatch):
+    monkeypatch.setenv("OUTBOX_MAX_ATTEMPTS", "2")
+    ids = _seed(sessions, ["alice"], 3)
+    poison = ids["alice"][0]
+    sidecar = FakeSidecar()
+    sidecar.reject[poison] = 99
+    relay = _relay(sessions, sidecar)
+
+    # nothing else accepted: could be an outage, so it is not an attempt
+    assert run(relay.run_once()) == 0
+    assert _attempts(sessions, poison) == 0
+
+    _seed(sessions, ["bob"], 1)
+    assert run(relay.run_once()) == 1  # bob's went out: the rejection counts
+    _seed(sessions, ["bob"], 1)
+    assert run(relay.run_once()) == 1  # second rejection is the last
+    with sessions() as db:
+        dead = db.get(OutboxEvent, poison)
+        assert dead.failed_at is not None and dead.attempts == 2 and dead.last_error == "broker said no"
+
+    assert run(relay.run_once()) == 2  # the rest of alice's go out, in order
+    assert sidecar.accepted["alice"] == ids["alice"][1:]
+    run(relay.stop())
+
+
+def test_only_the_lease_holder_relays(sessions, run, monkeypatch):
+    _seed(sessions, ["alice"], 4)
+    sidecar = FakeSidecar()
+    first, second = _relay(sessions, sidecar), _relay(sessions, sidecar)
+
+    assert run(first.run_once()) == 4
+    _seed(sessions, ["alice"], 2)
+    assert run(second.run_once()) == 0  # standby
+
+    asked: List[int] = []
+    monkeypatch.setattr(second, "_acquire", lambda: asked.append(1) or False)
+    assert run(second.run_once()) == 0 and asked == []  # not asked again within the lease period
+    monkeypatch.undo()
+
+    run(first.stop())  # releases the lease
+    second._lease_retry_at = 0.0  # skip the rest of the period
+    assert run(second.run_once()) == 2
+    assert len(sidecar.accepted["alice"]) == 6
+    run(second.stop())
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import select, update
+
+from app.db import SessionLocal
+from app.models import Task as TaskRow
+from app.models import TaskVersion
+from app.repository import SqlTaskRepository, bump_version_stmt
+
+
+@pytest.fixture
+def repo():
+    # one minute max-age: only the tests that want a revalidation get one
+    r = SqlTaskRepository(max_age_ms=60_000)
+    yield r
+    r.clear()
+
+
+def _db_version(user_id: str) -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(TaskVersion.version).where(TaskVersion.user_id == user_id)) or 0
+
+
+def _foreign_write(user_id: str, task_id: int, title: str) -> None:
+    """What another replica's write looks like from here: row + version, no invalidation."""
+    with SessionLocal() as db:
+        db.execute(update(TaskRow).where(TaskRow.id == task_id).values(title=title))
+        db.execute(bump_version_stmt("sqlite", user_id))
+        db.commit()
+
+
+def test_writes_go_through_to_the_cache(repo, run, user_id):
+    assert list(run(repo.list(user_id))) == []
+    assert repo.stats()["loads"] == 1
+
+    milk = run(repo.create(user_id, "milk"))
+    bread, eggs = run(repo.create_many(user_id, [{"title": "bread"}, {"title": "eggs", "description": " x "}]))
+    assert [t["title"] for t in run(repo.list(user_id))] == ["eggs", "bread", "milk"]  # newest first
+    assert eggs["description"] == "x"
+
+    assert run(repo.set_completed(user_id, milk["id"]))["completed"] is True
+    assert [t["id"] for t in run(repo.list(user_id, "completed"))] == [milk["id"]]
+    assert run(repo.update(user_id, bread["id"], title=" rye "))["title"] == "rye"
+    assert run(repo.delete(user_id, eggs["id"]))["id"] == eggs["id"]
+    assert run(repo.get(user_id, eggs["id"])) is None
+
+    # every read above came from memory, and memory matches the table
+    stats = repo.stats()
+    assert stats["loads"] == 1 and stats["misses"] == 1
+    with SessionLocal() as db:
+        rows = db.scalars(select(TaskRow).where(TaskRow.user_id == user_id).order_by(TaskRow.id)).all()
+        assert [(r.title, r.completed) for r in rows] == [("milk", True), ("rye", False)]
+
+
+def test_each_write_bumps_the_db_version_once(repo, run, user_id):
+    run(repo.create_many(user_id, [{"title": "a"}, {"title": "b"}]))
+    assert run(repo.version(user_id)) == _db_version(user_id) == 1
+    run(repo.set_completed_many(user_id, None, True))
+    assert run(repo.version(user_id)) == _db_version(user_id) == 2
+    # nothing changed: no new version
+    assert run(repo.set_completed_many(user_id, None, True)) == []
+    assert run(repo.version(user_id)) == 2
+
+
+def test_invalidate_reloads_a_change_made_behind_the_repository(repo, run, user_id):
+    run(repo.list(user_id))
+    task = run(repo.create(user_id, "old"))
+    with SessionLocal() as db:
+        db.execute(update(TaskRow).where(TaskRow.id == task["id"]).values(title="new"))
+        db.commit()
+    assert run(repo.get(user_id, task["id"]))["title"] == "old"  # cached
+
+    repo.invalidate(user_id, broadcast=False)
+    assert run(repo.get(user_id, task["id"]))["title"] == "new"
+    assert repo.stats()["loads"] == 2
+
+
+def test_revalidation_picks_up_another_replicas_write(run, user_id):
+    repo = SqlTaskRepository(max_age_ms=0)  # check the version on every read
+    try:
+        task = run(repo.create(user_id, "old"))
+        run(repo.list(user_id))
+        _foreign_write(user_id, task["id"], "new")
+        assert run(repo.get(user_id, task["id"]))["title"] == "new"
+        assert repo.stats()["refreshed"] == 1
+        # version unchanged since: served from memory after the check
+        run(repo.get(user_id, task["id"]))
+        assert repo.stats()["loads"] == 2
+    finally:
+        repo.clear()
+
+
+def test_local_write_after_a_foreign_one_does_not_hide_it(repo, run, user_id):
+    run(repo.list(user_id))
+    task = run(repo.create(user_id, "old"))
+    _foreign_write(user_id, task["id"], "theirs")
+    run(repo.create(user_id, "ours"))  # version jumps by 2: the cache is marked stale
+    assert [t["title"] for t in run(repo.list(user_id))] == ["ours", "theirs"]
+    assert run(repo.version(user_id)) == _db_version(user_id) == 3
+
+
+def test_ids_of_deleted_tasks_are_not_reused(repo, run, user_id):
+    newest = run(repo.create(user_id, "newest"))
+    run(repo.delete(user_id, newest["id"]))
+    assert run(repo.create(user_id, "next"))["id"] > newest["id"]
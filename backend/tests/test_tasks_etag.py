@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from app.repository import tasks_repo
+from app.routers.tasks import router
+
+
+@pytest.fixture
+def api(run):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    app.include_router(router)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield lambda method, url, **kw: run(client.request(method, url, **kw))
+    run(client.aclose())
+    tasks_repo.clear()
+
+
+def test_unchanged_list_gets_304(api, user_id):
+    url = f"/api/{user_id}/tasks"
+    api("POST", url, json={"title": "milk"})
+    first = api("GET", url)
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+    etag = first.headers["ETag"]
+
+    again = api("GET", url, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert api("GET", url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    # another query shape is another representation
+    assert api("GET", url + "?status=pending", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_any_write_changes_the_etag(api, user_id):
+    url = f"/api/{user_id}/tasks"
+    task = api("POST", url, json={"title": "milk"}).json()
+    etag = api("GET", url).headers["ETag"]
+
+    api("PATCH", f"{url}/{task['id']}", json={"completed": True})
+    fresh = api("GET", url, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.json()[0]["completed"] is True
+    assert fresh.headers["ETag"] != etag
+
+
+def test_etag_survives_a_cold_cache(api, user_id):
+    # a replica that never saw the user (or a restarted one) hands out the same tag
+    url = f"/api/{user_id}/tasks"
+    api("POST", url, json={"title": "milk"})
+    etag = api("GET", url).headers["ETag"]
+
+    tasks_repo.clear()
+    loads = tasks_repo.stats()["loads"]
+    assert api("GET", url, headers={"If-None-Match": etag}).status_code == 304
+    assert tasks_repo.stats()["loads"] == loads  # the 304 read the version row only
+    assert api("GET", url).status_code == 200
+    assert tasks_repo.stats()["loads"] == loads + 1
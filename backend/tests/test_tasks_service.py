@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import anyio.to_thread
+import pytest
+
+from app.repository import tasks_repo
+from app.services import tasks_service
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    yield
+    tasks_repo.clear()
+
+
+def test_sync_api_from_a_worker_thread_runs_on_the_app_loop(run, user_id):
+    loads = tasks_repo.stats()["loads"]
+
+    async def in_threadpool():
+        milk = await anyio.to_thread.run_sync(tasks_service.create_task, user_id, " milk ")
+        await anyio.to_thread.run_sync(tasks_service.toggle_task_complete, user_id, milk["id"])
+        return milk, await anyio.to_thread.run_sync(tasks_service.get_tasks, user_id, "completed")
+
+    milk, done = run(in_threadpool())
+    assert done == [{**milk, "completed": True}]
+    # the writes went through the repository: its cache already has them
+    assert [t["title"] for t in run(tasks_repo.list(user_id, "completed"))] == ["milk"]
+    assert tasks_repo.stats()["loads"] == loads + 1
+
+    with pytest.raises(ValueError):
+        run(anyio.to_thread.run_sync(tasks_service.create_task, user_id, "  "))
+
+
+def test_sync_api_refuses_to_block_the_event_loop(run, user_id):
+    async def on_the_loop():
+        tasks_service.get_tasks(user_id)
+
+    with pytest.raises(RuntimeError, match="await it instead"):
+        run(on_the_loop())
+
+
+def test_sync_api_in_a_script(user_id):
+    # no event loop anywhere: the wrappers bring their own (one per process)
+    script = (
+        "from app.services import tasks_service as s\n"
+        f"a = s.create_task({user_id!r}, 'milk')\n"
+        f"s.create_tasks({user_id!r}, ['bread', 'eggs'])\n"
+        f"assert s.remove_task({user_id!r}, a['id'])\n"
+        f"print(','.join(t['title'] for t in s.get_tasks({user_id!r})))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, env=dict(os.environ), check=True
+    )
+    assert out.stdout.strip() == "eggs,bread"
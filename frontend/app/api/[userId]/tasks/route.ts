@@ -19,7 +19,7 @@ function apiUrl(path: string) {
 }
 
 export async function GET(
-  _req: NextRequest,
+  req: NextRequest,
   ctx: { params: Promise<{ userId: string }> }
 ) {
   try {
@@ -29,14 +29,28 @@ export async function GET(
       return NextResponse.json({ error: "Missing userId" }, { status: 400 });
     }
 
+    // pass the browser's conditional GET through so an unchanged list is a 304
+    const ifNoneMatch = req.headers.get("if-none-match");
     const upstream = await fetch(apiUrl(`/${encodeURIComponent(userId)}/tasks`), {
       cache: "no-store",
+      headers: ifNoneMatch ? { "If-None-Match": ifNoneMatch } : undefined,
     });
 
+    const cacheHeaders: Record<string, string> = {};
+    for (const name of ["etag", "cache-control"]) {
+      const value = upstream.headers.get(name);
+      if (value) cacheHeaders[name] = value;
+    }
+
+    if (upstream.status === 304) {
+      return new NextResponse(null, { status: 304, headers: cacheHeaders });
+    }
+
     const text = await upstream.text();
     return new NextResponse(text, {
       status: upstream.status,
       headers: {
+        ...cacheHeaders,
         "Content-Type":
           upstream.headers.get("content-type") || "application/json",
       },